@@ -0,0 +1,54 @@
+# COPY text format: backslash escapes for the characters that delimit fields and rows
+_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+NULL = '\\N'
+
+
+def format_row(values):
+    return '\t'.join(
+        NULL if value is None else value.translate(_ESCAPES) if isinstance(value, str) else str(value)
+        for value in values
+    ) + '\n'
+
+
+class CopyStream:
+    """Read-only file object feeding ``COPY ... FROM STDIN`` from an iterable of row tuples"""
+
+    def __init__(self, rows):
+        self._lines = (format_row(row).encode() for row in rows)
+        self._pending = b''
+        self.rows = 0
+
+    def read(self, size=-1):
+        chunks, length = [self._pending], len(self._pending)
+        for line in self._lines:
+            chunks.append(line)
+            length += len(line)
+            self.rows += 1
+            if 0 <= size <= length:
+                break
+        data = b''.join(chunks)
+        if size < 0:
+            self._pending = b''
+            return data
+        self._pending = data[size:]
+        return data[:size]
+
+
+def copy_rows(cursor, table, columns, rows):
+    """Stream ``rows`` into ``table`` with COPY; returns how many were sent"""
+    stream = CopyStream(rows)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", stream, 1 << 16)
+    return stream.rows
+
+
+def reserve_ids(cursor, table, count):
+    """
+    Reserve ``count`` consecutive primary keys of ``table`` and return the
+    first one. The table is locked against other writers until the
+    transaction ends, so nobody else can draw ids from the range meanwhile.
+    """
+    cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+    sequence = cursor.fetchone()[0]
+    cursor.execute("SELECT setval(%s, nextval(%s) + %s - 1)", [sequence, sequence, max(count, 1)])
+    return cursor.fetchone()[0] - max(count, 1) + 1
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+
+from benchmarks.stats import summarize_latencies
+from core.channel_layers import PostgresChannelLayer
+
+
+class Command(BaseCommand):
+    help = "Compare group_send throughput and latency of the Postgres and in-memory channel layers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000, help="Messages per throughput run")
+        parser.add_argument('--receivers', type=int, default=10, help="Channels subscribed to the group")
+        parser.add_argument('--payload', type=int, default=256, help="Payload size in bytes")
+        parser.add_argument('--latency-samples', type=int, default=200)
+        parser.add_argument('--layers', default='inmemory,postgres')
+
+    def handle(self, *args, **options):
+        results = []
+        for name in options['layers'].split(','):
+            results.append(asyncio.run(self.run_layer(name.strip(), options)))
+        self.stdout.write(json.dumps({'benchmark': 'channel_layer', 'results': results}, indent=2))
+
+    def make_layers(self, name, capacity):
+        if name == 'inmemory':
+            layer = InMemoryChannelLayer(capacity=capacity)
+            return layer, layer
+        if name == 'postgres':
+            # Separate instances = separate "processes": delivery has to go through NOTIFY
+            return PostgresChannelLayer(capacity=capacity), PostgresChannelLayer(capacity=capacity)
+        raise ValueError(f"Unknown layer {name!r}")
+
+    async def run_layer(self, name, options):
+        messages, receivers = options['messages'], options['receivers']
+        sender, receiver_layer = self.make_layers(name, capacity=messages + options['latency_samples'])
+        group = 'bench'
+        channels = [await receiver_layer.new_channel() for _ in range(receivers)]
+        for channel in channels:
+            await receiver_layer.group_add(group, channel)
+        if name == 'postgres':
+            await asyncio.get_running_loop().run_in_executor(None, receiver_layer._listening.wait, 10)
+
+        payload = 'x' * options['payload']
+
+        # Throughput: blast messages, wait until every receiver has drained them
+        async def drain(channel, expected):
+            for _ in range(expected):
+                await receiver_layer.receive(channel)
+
+        started = time.perf_counter()
+        drains = [asyncio.create_task(drain(channel, messages)) for channel in channels]
+        for number in range(messages):
+            await sender.group_send(group, {'type': 'bench', 'n': number, 'payload': payload})
+        await asyncio.wait_for(asyncio.gather(*drains), timeout=120)
+        elapsed = time.perf_counter() - started
+
+        # Latency: one message in flight at a time, timed to the first receiver
+        latencies = []
+        for number in range(options['latency_samples']):
+            sent_at = time.perf_counter()
+            await sender.group_send(group, {'type': 'bench', 'n': number, 'payload': payload})
+            await asyncio.gather(*(receiver_layer.receive(channel) for channel in channels))
+            latencies.append((time.perf_counter() - sent_at) * 1000)
+
+        for channel in channels:
+            await receiver_layer.group_discard(group, channel)
+        await sender.close()
+        await receiver_layer.close()
+
+        return {
+            'layer': name,
+            'messages': messages,
+            'receivers': receivers,
+            'payload_bytes': options['payload'],
+            'elapsed_s': round(elapsed, 3),
+            'messages_per_s': round(messages / elapsed, 1),
+            'deliveries_per_s': round(messages * receivers / elapsed, 1),
+            'latency': summarize_latencies(latencies),
+        }
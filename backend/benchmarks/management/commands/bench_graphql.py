@@ -0,0 +1,274 @@
+import asyncio
+import json
+import random
+import subprocess
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from graphql_jwt.shortcuts import get_token
+
+from benchmarks.operations import READ, load_operations
+from benchmarks.seed import delete_dataset, load_dataset, seed_dataset
+from benchmarks.stats import summarize_latencies
+from core import result_cache
+from core.documents import query_hash
+from users.models import User
+
+# SQL statements run for the request being measured. Resolvers run on the
+# GraphQL executor threads; sync_to_async copies the context over, so the
+# counter list is shared with them.
+_query_count = ContextVar('bench_query_count', default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    counter = _query_count.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def _install_counter(sender, connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a reproducible dataset and replay the frontend's GraphQL operations against /graphql/ "
+        "concurrently, reporting latency percentiles, throughput and SQL queries per operation as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='loadtest', help="Slug/email prefix of the seeded dataset")
+        parser.add_argument('--orgs', type=int, default=2)
+        parser.add_argument('--users', type=int, default=20, help="Members per organization")
+        parser.add_argument('--projects', type=int, default=10, help="Projects per organization")
+        parser.add_argument('--tasks', type=int, default=200, help="Tasks per project")
+        parser.add_argument('--comments', type=int, default=2, help="Comments per task")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--reseed', action='store_true', help="Drop and recreate the dataset")
+        parser.add_argument('--queries-file', default=None, help="Defaults to the first GRAPHQL_DOCUMENTS['PRELOAD'] file")
+        parser.add_argument('--operations', default='', help="Comma-separated operation names (default: all replayable)")
+        parser.add_argument('--reads-only', action='store_true')
+        parser.add_argument('--requests', type=int, default=200, help="Measured requests per operation")
+        parser.add_argument('--warmup', type=int, default=10, help="Unmeasured requests per operation")
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--no-persisted-queries', action='store_true', help="Send full query text instead of hashes")
+        parser.add_argument('--no-result-cache', action='store_true')
+        parser.add_argument('--baseline', help="JSON output of an earlier run to compare against")
+        parser.add_argument('--output', help="Also write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if options['reseed']:
+            delete_dataset(prefix)
+        dataset = load_dataset(prefix)
+        seed_s = None
+        if not dataset:
+            started = time.perf_counter()
+            dataset = seed_dataset(
+                prefix, options['orgs'], options['users'], options['projects'],
+                options['tasks'], options['comments'], options['seed'],
+            )
+            seed_s = round(time.perf_counter() - started, 1)
+
+        queries_file = options['queries_file'] or next(iter(settings.GRAPHQL_DOCUMENTS.get('PRELOAD', [])), None)
+        if queries_file is None:
+            raise CommandError("No queries file; pass --queries-file")
+        operations, skipped = load_operations(queries_file)
+        if options['operations']:
+            wanted = {name.strip() for name in options['operations'].split(',')}
+            operations = [operation for operation in operations if operation.name in wanted]
+        if options['reads_only']:
+            operations = [operation for operation in operations if operation.kind == READ]
+        if not operations:
+            raise CommandError("No operations to replay")
+
+        if options['no_result_cache']:
+            result_cache.CACHEABLE_FIELDS = frozenset()
+
+        # A handful of members per organization send the requests
+        tokens = {
+            org.slug: [get_token(user) for user in User.objects.filter(email__in=org.emails[:10])]
+            for org in dataset
+        }
+
+        connection_created.connect(_install_counter)
+        for connection in connections.all():
+            if connection.connection is not None:
+                _install_counter(None, connection)
+        try:
+            results = asyncio.run(self.replay(operations, dataset, tokens, options))
+        finally:
+            connection_created.disconnect(_install_counter)
+
+        report = {
+            'benchmark': 'graphql',
+            'commit': _git_commit(),
+            'dataset': {
+                'prefix': prefix,
+                'orgs': len(dataset),
+                'projects': sum(len(org.project_slugs) for org in dataset),
+                'tasks': sum(len(org.task_ids) for org in dataset),
+                'seed_s': seed_s,
+            },
+            'concurrency': options['concurrency'],
+            'persisted_queries': not options['no_persisted_queries'],
+            'result_cache': not options['no_result_cache'],
+            'skipped_operations': skipped,
+            'results': results,
+        }
+        if options['baseline']:
+            self.compare(report, options['baseline'])
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        self.stdout.write(output)
+
+    async def replay(self, operations, dataset, tokens, options):
+        results = []
+        for operation in operations:
+            rng = random.Random(f"{options['seed']}:{operation.name}")
+            await self.run_batch(operation, dataset, tokens, rng, options['warmup'], options)
+            started = time.perf_counter()
+            samples = await self.run_batch(operation, dataset, tokens, rng, options['requests'], options)
+            elapsed = time.perf_counter() - started
+
+            latencies = [latency for latency, _, _ in samples]
+            queries = [count for _, count, _ in samples]
+            errors = [error for _, _, error in samples if error]
+            results.append({
+                'operation': operation.name,
+                'kind': operation.kind,
+                'requests': len(samples),
+                'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else None,
+                **summarize_latencies(latencies),
+                'sql_queries': {
+                    'mean': round(sum(queries) / len(queries), 2) if queries else None,
+                    'max': max(queries, default=None),
+                },
+                'errors': len(errors),
+                'error_sample': errors[0] if errors else None,
+            })
+        return results
+
+    async def run_batch(self, operation, dataset, tokens, rng, count, options):
+        # The requests are drawn up front, so the sequence only depends on the seed
+        requests = []
+        for _ in range(count):
+            org = rng.choice(dataset)
+            requests.append((operation.variables(rng, org), rng.choice(tokens[org.slug])))
+        pending = iter(requests)
+        samples = []
+
+        async def worker():
+            for variables, token in pending:
+                samples.append(await self.send(operation, variables, token, options))
+
+        await asyncio.gather(*(worker() for _ in range(min(options['concurrency'], count))))
+        return samples
+
+    async def send(self, operation, variables, token, options):
+        """One request as Apollo sends it: the hash first, the text if the server asks for it"""
+        counter = [0]
+        _query_count.set(counter)
+        body = {'operationName': operation.name, 'variables': variables}
+        if options['no_persisted_queries']:
+            body['query'] = operation.text
+        else:
+            body['extensions'] = {'persistedQuery': {'version': 1, 'sha256Hash': query_hash(operation.text)}}
+
+        started = time.perf_counter()
+        data = await self.post(body, token)
+        if 'query' not in body and any(
+            error.get('extensions', {}).get('code') == 'PERSISTED_QUERY_NOT_FOUND' for error in data.get('errors', [])
+        ):
+            data = await self.post({**body, 'query': operation.text}, token)
+        latency = (time.perf_counter() - started) * 1000
+        _query_count.set(None)
+        return latency, counter[0], self.error_of(data)
+
+    async def post(self, body, token):
+        """POST ``body`` through the project's ASGI application, as uvicorn would"""
+        from core.asgi import application
+
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'POST',
+            'scheme': 'http',
+            'path': '/graphql/',
+            'raw_path': b'/graphql/',
+            'query_string': b'',
+            'root_path': '',
+            'headers': [
+                (b'host', b'localhost'),
+                (b'content-type', b'application/json'),
+                (b'authorization', f'JWT {token}'.encode()),
+            ],
+            'client': ('127.0.0.1', 0),
+            'server': ('localhost', 80),
+        }
+        messages = [{'type': 'http.request', 'body': json.dumps(body).encode(), 'more_body': False}]
+        disconnected = asyncio.Event()
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        status, chunks = None, []
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+
+        await application(scope, receive, send)
+        disconnected.set()
+        try:
+            return json.loads(b''.join(chunks))
+        except ValueError:
+            return {'errors': [{'message': f'HTTP {status}'}]}
+
+    @staticmethod
+    def error_of(data):
+        if data.get('errors'):
+            return data['errors'][0].get('message')
+        # Mutations report failures in their payload
+        for payload in (data.get('data') or {}).values():
+            if isinstance(payload, dict) and payload.get('success') is False:
+                return '; '.join(payload.get('errors') or ['success: false'])
+        return None
+
+    def compare(self, report, baseline_path):
+        with open(baseline_path) as f:
+            baseline_report = json.load(f)
+        report['baseline_commit'] = baseline_report.get('commit')
+        baseline = {result['operation']: result for result in baseline_report.get('results', [])}
+        for result in report['results']:
+            before = baseline.get(result['operation'])
+            if before is None or not before.get('p95_ms'):
+                continue
+            result['baseline_p95_ms'] = before['p95_ms']
+            result['p95_change_pct'] = round((result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100, 1)
+            result['baseline_sql_queries'] = before.get('sql_queries', {}).get('mean')
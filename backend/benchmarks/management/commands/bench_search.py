@@ -0,0 +1,141 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from benchmarks.stats import summarize_latencies
+from organizations.models import Organization
+from projects.models import Project, Task
+from projects.search import search_tasks
+
+ORG_SLUG = 'bench-search'
+
+# Frequent words, each drawn for a few percent of all words
+COMMON_WORDS = [
+    'deploy', 'invoice', 'login', 'payment', 'report', 'search', 'dashboard', 'export',
+    'import', 'migration', 'timeout', 'crash', 'upload', 'email', 'notification', 'cache',
+    'latency', 'billing', 'refund', 'checkout', 'signup', 'password', 'profile', 'settings',
+    'mobile', 'android', 'browser', 'layout', 'button', 'modal', 'sidebar', 'table',
+    'review', 'release', 'hotfix', 'backend', 'frontend', 'database', 'index', 'query',
+]
+# The rest follow a skewed distribution, like identifiers and product names do
+RARE_WORDS = 20000
+COMMON_SHARE = 0.25
+
+
+class Command(BaseCommand):
+    help = "Seed a large organization and measure searchTasks latency against the GIN indexes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=1_000_000)
+        parser.add_argument('--projects', type=int, default=100)
+        parser.add_argument('--comment-every', type=int, default=5, help="One comment per N tasks")
+        parser.add_argument('--queries', type=int, default=200, help="Searches per query shape")
+        parser.add_argument('--first', type=int, default=20)
+        parser.add_argument('--reseed', action='store_true', help="Drop and recreate the benchmark organization")
+
+    def handle(self, *args, **options):
+        organization = Organization.objects.filter(slug=ORG_SLUG).first()
+        if organization is not None and options['reseed']:
+            organization.delete()
+            organization = None
+        if organization is None:
+            started = time.perf_counter()
+            organization = self.seed(options)
+            seed_s = round(time.perf_counter() - started, 1)
+        else:
+            seed_s = None
+
+        tasks = Task.objects.filter(project__organization=organization)
+        rng = random.Random(42)
+        shapes = {
+            'common_word': lambda: rng.choice(COMMON_WORDS),
+            'rare_word': lambda: f'zq{int(RARE_WORDS * rng.random() ** 3)}',
+            'two_words': lambda: f'{rng.choice(COMMON_WORDS)} {rng.choice(COMMON_WORDS)}',
+            'phrase': lambda: f'"{rng.choice(COMMON_WORDS)} {rng.choice(COMMON_WORDS)}"',
+        }
+
+        results = {}
+        for shape, make_query in shapes.items():
+            latencies = []
+            hits = 0
+            for _ in range(options['queries']):
+                text = make_query()
+                started = time.perf_counter()
+                rows, _, _ = search_tasks(organization, text, first=options['first'])
+                latencies.append((time.perf_counter() - started) * 1000)
+                hits += bool(rows)
+            results[shape] = {**summarize_latencies(latencies), 'queries_with_hits': hits}
+
+        self.stdout.write(json.dumps({
+            'benchmark': 'search_tasks',
+            'tasks': tasks.count(),
+            'seed_s': seed_s,
+            'page_size': options['first'],
+            'results': results,
+        }, indent=2))
+
+    def seed(self, options):
+        organization = Organization.objects.create(
+            name='Search Benchmark', slug=ORG_SLUG, contact_email='bench@example.com'
+        )
+        projects = Project.objects.bulk_create([
+            Project(organization=organization, name=f'Bench {n}', slug=f'{ORG_SLUG}-{n}')
+            for n in range(options['projects'])
+        ])
+        per_project = max(1, options['tasks'] // len(projects))
+        project_ids = [project.pk for project in projects]
+
+        # Random words are generated in SQL; the correlated "WHERE n > 0"
+        # makes Postgres draw them per row instead of once per statement
+        def words(count):
+            return f"""array_to_string(ARRAY(
+                SELECT CASE WHEN random() < %(common_share)s
+                    THEN (%(common)s::text[])[1 + floor(random() * %(common_count)s)::int]
+                    ELSE 'zq' || floor(%(rare)s * power(random(), 3))::int
+                END
+                FROM generate_series(1, {count}) WHERE g.n > 0
+            ), ' ')"""
+
+        params = {
+            'common': COMMON_WORDS,
+            'common_count': len(COMMON_WORDS),
+            'common_share': COMMON_SHARE,
+            'rare': RARE_WORDS,
+            'per_project': per_project,
+            'project_ids': project_ids,
+            'comment_every': options['comment_every'],
+        }
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO projects_task (project_id, task_id, title, description, status, due_date, created_at)
+                SELECT p.id, upper(p.slug) || '-' || g.n, {words(4)}, {words(12)},
+                       (ARRAY['TODO', 'IN_PROGRESS', 'DONE'])[1 + g.n %% 3], NULL,
+                       now() - g.n * interval '1 minute'
+                FROM projects_project p CROSS JOIN generate_series(1, %(per_project)s) g(n)
+                WHERE p.id = ANY(%(project_ids)s)
+            """, params)
+            cursor.execute("""
+                INSERT INTO projects_tasksequence (project_id, last_number)
+                SELECT id, %(per_project)s FROM projects_project WHERE id = ANY(%(project_ids)s)
+            """, params)
+            cursor.execute(f"""
+                INSERT INTO projects_taskcomment (task_id, seq, content, author_id, timestamp)
+                SELECT t.id, 1, {words(10).replace('g.n', 't.id')}, NULL, now()
+                FROM projects_task t
+                WHERE t.project_id = ANY(%(project_ids)s) AND t.id %% %(comment_every)s = 0
+            """, params)
+            cursor.execute("""
+                INSERT INTO projects_commentsequence (task_id, last_number)
+                SELECT c.task_id, 1 FROM projects_taskcomment c
+                JOIN projects_task t ON t.id = c.task_id
+                WHERE t.project_id = ANY(%(project_ids)s)
+            """, params)
+        # Tasks were inserted behind the ORM's back
+        Project.objects.filter(organization=organization).reconcile_task_counts()
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE projects_task")
+            cursor.execute("ANALYZE projects_taskcomment")
+        return organization
@@ -0,0 +1,279 @@
+import multiprocessing
+import random
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from psycopg2.extras import execute_values
+
+from benchmarks.copy import copy_rows, reserve_ids
+from benchmarks.seed import PASSWORD
+from organizations.models import Organization
+
+WORDS = [
+    'deploy', 'invoice', 'login', 'payment', 'report', 'search', 'dashboard', 'export',
+    'import', 'migration', 'timeout', 'crash', 'upload', 'email', 'notification', 'cache',
+    'latency', 'billing', 'refund', 'checkout', 'signup', 'password', 'profile', 'settings',
+    'mobile', 'android', 'browser', 'layout', 'button', 'modal', 'sidebar', 'table',
+    'review', 'release', 'hotfix', 'backend', 'frontend', 'database', 'index', 'query',
+    'the', 'on', 'when', 'after', 'fails', 'slow', 'broken', 'missing', 'add', 'fix',
+]
+PROJECT_STATUSES = ['ACTIVE'] * 7 + ['ON_HOLD'] * 1 + ['COMPLETED'] * 2
+UNASSIGNED_SHARE = 0.15
+DUE_DATE_SHARE = 0.6
+MAX_COMMENTS = 50
+# Cheaper to build once after the load than to maintain row by row during it
+DEFERRABLE_INDEXES = ['task_search_idx', 'comment_search_idx']
+
+# A project to fill: its tasks get primary keys first_task, first_task + 1, ...
+ProjectPlan = namedtuple('ProjectPlan', ['id', 'slug', 'started_at', 'tasks', 'first_task', 'seed'])
+
+
+def _words(rng, low, high):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high)))
+
+
+def _pick_user(rng, user_ids):
+    # A few members carry most of the work
+    return user_ids[int(len(user_ids) * rng.random() ** 2)]
+
+
+class ProjectGenerator:
+    """
+    Rows of one project, drawn from generators seeded per project so the
+    output doesn't depend on how projects are split between workers.
+    """
+
+    def __init__(self, plan, user_ids, mean_comments, now):
+        self.plan = plan
+        self.user_ids = user_ids
+        self.mean_comments = mean_comments
+        self.now = now
+        self.status_counts = {'TODO': 0, 'IN_PROGRESS': 0, 'DONE': 0}
+
+    def created_at(self, number):
+        # Task numbers follow creation order across the project's lifetime
+        started_at = self.plan.started_at
+        return started_at + (self.now - started_at) * (number / (self.plan.tasks + 1))
+
+    def tasks(self):
+        rng = random.Random(f'{self.plan.seed}:tasks')
+        prefix = self.plan.slug.upper()
+        count = self.plan.tasks
+        for number in range(1, count + 1):
+            created_at = self.created_at(number)
+            # Older tasks are more likely to be finished
+            age = 1 - number / count
+            draw = rng.random()
+            status = 'DONE' if draw < 0.1 + 0.8 * age else 'IN_PROGRESS' if draw < 0.25 + 0.8 * age else 'TODO'
+            self.status_counts[status] += 1
+            assignee = None if not self.user_ids or rng.random() < UNASSIGNED_SHARE else _pick_user(rng, self.user_ids)
+            due_date = created_at + timedelta(days=rng.randint(1, 45)) if rng.random() < DUE_DATE_SHARE else None
+            yield (
+                self.plan.first_task + number - 1, self.plan.id, f'{prefix}-{number}',
+                _words(rng, 3, 8), _words(rng, 8, 40), status, assignee, due_date, created_at,
+            )
+
+    def comment_counts(self):
+        # Own generator, so the sequence rows can replay the counts without keeping them
+        rng = random.Random(f'{self.plan.seed}:comment-counts')
+        for number in range(1, self.plan.tasks + 1):
+            count = min(int(rng.expovariate(1 / self.mean_comments)), MAX_COMMENTS) if self.mean_comments > 0 else 0
+            yield self.plan.first_task + number - 1, number, count
+
+    def comments(self):
+        rng = random.Random(f'{self.plan.seed}:comments')
+        for task_pk, number, count in self.comment_counts():
+            timestamp = self.created_at(number)
+            for seq in range(1, count + 1):
+                author = _pick_user(rng, self.user_ids) if self.user_ids else None
+                timestamp = min(timestamp + timedelta(minutes=rng.randint(5, 60 * 24 * 7)), self.now)
+                yield task_pk, seq, _words(rng, 5, 30), author, timestamp
+
+
+def seed_projects(plans, user_ids, mean_comments, now):
+    """
+    COPY the tasks, comments and comment sequences of ``plans`` in one
+    transaction and set the projects' task counters. Returns the number of
+    comments written.
+    """
+    comments = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        counters = []
+        for plan in plans:
+            generator = ProjectGenerator(plan, user_ids, mean_comments, now)
+            copy_rows(cursor, 'projects_task', [
+                'id', 'project_id', 'task_id', 'title', 'description', 'status', 'assignee_id', 'due_date', 'created_at',
+            ], generator.tasks())
+            comments += copy_rows(
+                cursor, 'projects_taskcomment', ['task_id', 'seq', 'content', 'author_id', 'timestamp'], generator.comments()
+            )
+            copy_rows(cursor, 'projects_commentsequence', ['task_id', 'last_number'], (
+                (task_pk, count) for task_pk, _, count in generator.comment_counts() if count
+            ))
+            counts = generator.status_counts
+            counters.append((plan.id, counts['TODO'], counts['IN_PROGRESS'], counts['DONE']))
+        execute_values(cursor, """
+            UPDATE projects_project AS project
+            SET todo_count = counts.todo, in_progress_count = counts.in_progress, done_count = counts.done
+            FROM (VALUES %s) AS counts (id, todo, in_progress, done)
+            WHERE project.id = counts.id
+        """, counters)
+    return comments
+
+
+def _seed_projects_in_worker(args):
+    # Runs in a forked process: never reuse the parent's connection
+    connections.close_all()
+    return seed_projects(*args)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate organizations, users, projects, tasks and comments at production scale "
+        "by streaming rows into Postgres with COPY"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='bulk', help="Slug/email prefix; must not be in use yet")
+        parser.add_argument('--orgs', type=int, default=1)
+        parser.add_argument('--users', type=int, default=200, help="Members per organization")
+        parser.add_argument('--projects', type=int, default=100, help="Projects per organization")
+        parser.add_argument('--tasks', type=int, default=1_000_000, help="Tasks per organization")
+        parser.add_argument('--comments', type=float, default=1.5, help="Mean comments per task")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--workers', type=int, default=1, help="Processes (and connections) loading projects in parallel")
+        parser.add_argument(
+            '--defer-indexes', action='store_true',
+            help="Drop the full-text GIN indexes during the load and rebuild them at the end",
+        )
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if Organization.objects.filter(slug__startswith=f'{prefix}-').exists():
+            raise CommandError(f"Organizations with prefix {prefix!r} already exist; pick another --prefix")
+        if options['projects'] < 1 or options['tasks'] < 0:
+            raise CommandError("--projects must be positive and --tasks non-negative")
+
+        self.password = make_password(PASSWORD)
+        self.now = timezone.now()
+        started = time.perf_counter()
+        totals = {'users': 0, 'projects': 0, 'tasks': 0, 'comments': 0}
+
+        indexes = self.drop_indexes() if options['defer_indexes'] else {}
+        try:
+            for org_number in range(options['orgs']):
+                org_started = time.perf_counter()
+                counts = self.seed_org(f'{prefix}-{org_number}', f"{options['seed']}:{org_number}", options)
+                for key, value in counts.items():
+                    totals[key] += value
+                self.stdout.write(
+                    f"{prefix}-{org_number}: {counts['tasks']} tasks, {counts['comments']} comments "
+                    f"in {time.perf_counter() - org_started:.1f}s"
+                )
+        finally:
+            if indexes:
+                self.rebuild_indexes(indexes)
+
+        with connection.cursor() as cursor:
+            for table in ('users_user', 'projects_project', 'projects_task', 'projects_taskcomment'):
+                cursor.execute(f"ANALYZE {table}")
+
+        elapsed = time.perf_counter() - started
+        rows = sum(totals.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {totals['users']} users, {totals['projects']} projects, {totals['tasks']} tasks and "
+            f"{totals['comments']} comments in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)"
+        ))
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT indexname, indexdef FROM pg_indexes WHERE indexname = ANY(%s)", [DEFERRABLE_INDEXES])
+            indexes = dict(cursor.fetchall())
+            for name in indexes:
+                cursor.execute(f"DROP INDEX IF EXISTS {name}")
+        return indexes
+
+    def rebuild_indexes(self, indexes):
+        with connection.cursor() as cursor:
+            cursor.execute("SET maintenance_work_mem = '512MB'")
+            for name, definition in indexes.items():
+                started = time.perf_counter()
+                # A partitioned table's index is listed ON ONLY the parent; build it on the partitions too
+                cursor.execute(definition.replace(' ON ONLY ', ' ON ', 1))
+                self.stdout.write(f"Rebuilt {name} in {time.perf_counter() - started:.1f}s")
+            cursor.execute("RESET maintenance_work_mem")
+
+    def seed_org(self, slug, seed, options):
+        """
+        Members, projects and task sequences are created in one transaction;
+        the projects' tasks and comments are then loaded in batches (in
+        parallel with --workers), each batch in its own transaction.
+        """
+        rng = random.Random(seed)
+        now = self.now
+        with transaction.atomic(), connection.cursor() as cursor:
+            organization = Organization.objects.create(name=slug, slug=slug, contact_email=f'{slug}@example.com')
+
+            first_user = reserve_ids(cursor, 'users_user', options['users'])
+            user_ids = list(range(first_user, first_user + options['users']))
+            copy_rows(cursor, 'users_user', ['id', 'password', 'email', 'name', 'is_active', 'created_at'], (
+                (user_id, self.password, f'{slug}-user{n}@example.com', f'{slug} user {n}', 't', now)
+                for n, user_id in enumerate(user_ids)
+            ))
+            copy_rows(cursor, 'users_organizationmember', ['user_id', 'organization_id', 'role'], (
+                (user_id, organization.pk, 'ADMIN' if n == 0 else 'MEMBER') for n, user_id in enumerate(user_ids)
+            ))
+
+            # Projects started some time in the last two years, tasks spread evenly over them
+            project_count, task_count = options['projects'], options['tasks']
+            first_project = reserve_ids(cursor, 'projects_project', project_count)
+            first_task = reserve_ids(cursor, 'projects_task', task_count)
+            plans = []
+            for n in range(project_count):
+                tasks = task_count // project_count + (1 if n < task_count % project_count else 0)
+                plans.append(ProjectPlan(
+                    id=first_project + n,
+                    slug=f'{slug}-p{n}',
+                    started_at=now - timedelta(days=rng.randint(30, 730)),
+                    tasks=tasks,
+                    first_task=first_task,
+                    seed=f'{seed}:{n}',
+                ))
+                first_task += tasks
+            copy_rows(cursor, 'projects_project', [
+                'id', 'organization_id', 'name', 'slug', 'description', 'status', 'due_date', 'created_at',
+                'todo_count', 'in_progress_count', 'done_count',
+            ], (
+                (plan.id, organization.pk, f'{slug} project {n}', plan.slug, _words(rng, 8, 20),
+                 rng.choice(PROJECT_STATUSES), None, plan.started_at, 0, 0, 0)
+                for n, plan in enumerate(plans)
+            ))
+            copy_rows(cursor, 'projects_tasksequence', ['project_id', 'last_number'], (
+                (plan.id, plan.tasks) for plan in plans
+            ))
+
+        # Batches of roughly 100k tasks
+        batches, batch, batch_tasks = [], [], 0
+        for plan in plans:
+            batch.append(plan)
+            batch_tasks += plan.tasks
+            if batch_tasks >= 100_000:
+                batches.append(batch)
+                batch, batch_tasks = [], 0
+        if batch:
+            batches.append(batch)
+        jobs = [(batch, user_ids, options['comments'], now) for batch in batches]
+
+        if options['workers'] > 1 and len(jobs) > 1:
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(options['workers']) as pool:
+                comments = sum(pool.imap_unordered(_seed_projects_in_worker, jobs))
+        else:
+            comments = sum(seed_projects(*job) for job in jobs)
+
+        return {'users': len(user_ids), 'projects': len(plans), 'tasks': task_count, 'comments': comments}
@@ -0,0 +1,79 @@
+from collections import namedtuple
+
+from graphql import OperationDefinitionNode, parse
+
+from core.documents import GQL_TEMPLATE, apollo_text
+from .seed import STATUSES, WORDS
+
+READ = 'read'
+WRITE = 'write'
+
+# One replayable operation of the frontend: ``variables(rng, org)`` draws
+# the variables of a request against a SeededOrg
+Operation = namedtuple('Operation', ['name', 'kind', 'text', 'variables'])
+
+
+def _sentence(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+
+# Operations that create organizations or users, log in (password hashing
+# dominates) or delete data are not replayed, so runs keep the dataset's shape
+VARIABLES = {
+    'GetOrganizations': (READ, lambda rng, org: {}),
+    'GetMyOrganizations': (READ, lambda rng, org: {}),
+    'GetProjects': (READ, lambda rng, org: {'orgSlug': org.slug}),
+    'GetProject': (READ, lambda rng, org: {'orgSlug': org.slug, 'projectSlug': rng.choice(org.project_slugs)}),
+    'GetOrgDashboard': (READ, lambda rng, org: {'orgSlug': org.slug}),
+    'GetTasks': (READ, lambda rng, org: {'orgSlug': org.slug, 'projectSlug': rng.choice(org.project_slugs)}),
+    'GetTask': (READ, lambda rng, org: {'orgSlug': org.slug, 'taskId': rng.choice(org.task_ids)}),
+    'GetOrganizationMembers': (READ, lambda rng, org: {'orgSlug': org.slug}),
+    'GetTaskComments': (READ, lambda rng, org: {'orgSlug': org.slug, 'taskId': rng.choice(org.task_ids)}),
+    'UpdateProject': (WRITE, lambda rng, org: {
+        'organizationSlug': org.slug,
+        'projectSlug': rng.choice(org.project_slugs),
+        'input': {'description': _sentence(rng, 8)},
+    }),
+    'CreateTask': (WRITE, lambda rng, org: {
+        'input': {
+            'organizationSlug': org.slug,
+            'projectSlug': rng.choice(org.project_slugs),
+            'title': _sentence(rng, 4),
+            'description': _sentence(rng, 16),
+            'status': rng.choice(STATUSES),
+        },
+    }),
+    'UpdateTask': (WRITE, lambda rng, org: {
+        'orgSlug': org.slug,
+        'taskId': rng.choice(org.task_ids),
+        'input': {'status': rng.choice(STATUSES)},
+    }),
+    'CreateTaskComment': (WRITE, lambda rng, org: {
+        'orgSlug': org.slug,
+        'taskId': rng.choice(org.task_ids),
+        'content': _sentence(rng, 12),
+    }),
+}
+
+
+def load_operations(path):
+    """
+    The operations of ``path`` (e.g. the frontend's queries.ts) that can be
+    replayed, as Apollo sends them, and the names of those that can't.
+    """
+    with open(path) as f:
+        source = f.read()
+    operations, skipped = [], []
+    for text in GQL_TEMPLATE.findall(source):
+        if '${' in text:
+            continue
+        for definition in parse(text).definitions:
+            if not isinstance(definition, OperationDefinitionNode) or definition.name is None:
+                continue
+            name = definition.name.value
+            if name not in VARIABLES:
+                skipped.append(name)
+                continue
+            kind, variables = VARIABLES[name]
+            operations.append(Operation(name, kind, apollo_text(text), variables))
+    return operations, skipped
@@ -0,0 +1,121 @@
+import random
+from collections import namedtuple
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from organizations.models import Organization
+from projects.models import CommentSequence, Project, Task, TaskComment, TaskSequence
+from users.models import OrganizationMember, User
+
+PASSWORD = 'bench-password'
+STATUSES = ['TODO', 'IN_PROGRESS', 'DONE']
+WORDS = [
+    'deploy', 'invoice', 'login', 'payment', 'report', 'search', 'dashboard', 'export',
+    'import', 'migration', 'timeout', 'crash', 'upload', 'email', 'notification', 'cache',
+    'latency', 'billing', 'refund', 'checkout', 'signup', 'password', 'profile', 'settings',
+]
+BATCH_SIZE = 2000
+
+# Slugs and emails of one seeded organization, for building request variables
+SeededOrg = namedtuple('SeededOrg', ['slug', 'emails', 'project_slugs', 'task_ids'])
+
+
+def seed_dataset(prefix='loadtest', orgs=2, users=20, projects=10, tasks=200, comments=2, seed=42):
+    """
+    Create ``orgs`` organizations named after ``prefix``, each with ``users``
+    members (the first one ADMIN), ``projects`` projects, ``tasks`` tasks per
+    project and ``comments`` comments per task.
+
+    Content is drawn from ``random.Random(seed)``, so the same arguments give
+    the same dataset. Every user's password is PASSWORD. Task IDs, sequences
+    and project counters are filled in as the application would.
+    """
+    rng = random.Random(seed)
+    password = make_password(PASSWORD)
+    now = timezone.now()
+    seeded = []
+    for org_number in range(orgs):
+        with transaction.atomic():
+            seeded.append(_seed_org(rng, f'{prefix}-{org_number}', password, now, users, projects, tasks, comments))
+    return seeded
+
+
+def _sentence(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+
+def _seed_org(rng, slug, password, now, users, projects, tasks, comments):
+    organization = Organization.objects.create(name=slug, slug=slug, contact_email=f'{slug}@example.com')
+    members = User.objects.bulk_create([
+        User(email=f'{slug}-user{n}@example.com', name=f'{slug} user {n}', password=password)
+        for n in range(users)
+    ], batch_size=BATCH_SIZE)
+    OrganizationMember.objects.bulk_create([
+        OrganizationMember(user=user, organization=organization, role='ADMIN' if n == 0 else 'MEMBER')
+        for n, user in enumerate(members)
+    ], batch_size=BATCH_SIZE)
+
+    org_projects = Project.objects.bulk_create([
+        Project(organization=organization, name=f'{slug} project {n}', slug=f'{slug}-p{n}', description=_sentence(rng, 8))
+        for n in range(projects)
+    ])
+    TaskSequence.objects.bulk_create([TaskSequence(project=project, last_number=tasks) for project in org_projects])
+
+    new_tasks = [
+        Task(
+            project=project,
+            task_id=project.make_task_id(number),
+            title=_sentence(rng, 4),
+            description=_sentence(rng, 16),
+            status=rng.choice(STATUSES),
+            assignee=rng.choice(members + [None]) if members else None,
+            due_date=now + timedelta(days=rng.randint(-30, 60)) if rng.random() < 0.7 else None,
+        )
+        for project in org_projects
+        for number in range(1, tasks + 1)
+    ]
+    Task.objects.bulk_create(new_tasks, batch_size=BATCH_SIZE)
+
+    if comments:
+        CommentSequence.objects.bulk_create(
+            [CommentSequence(task=task, last_number=comments) for task in new_tasks], batch_size=BATCH_SIZE
+        )
+        TaskComment.objects.bulk_create([
+            TaskComment(task=task, seq=seq, content=_sentence(rng, 12), author=rng.choice(members) if members else None)
+            for task in new_tasks
+            for seq in range(1, comments + 1)
+        ], batch_size=BATCH_SIZE)
+
+    return SeededOrg(
+        slug=slug,
+        emails=[user.email for user in members],
+        project_slugs=[project.slug for project in org_projects],
+        task_ids=[task.task_id for task in new_tasks],
+    )
+
+
+def delete_dataset(prefix='loadtest'):
+    """Remove organizations and users created by seed_dataset(prefix)"""
+    Organization.objects.filter(slug__startswith=f'{prefix}-').delete()
+    User.objects.filter(email__startswith=f'{prefix}-', email__endswith='@example.com').delete()
+
+
+def load_dataset(prefix='loadtest'):
+    """SeededOrg entries of a dataset created earlier"""
+    seeded = []
+    for organization in Organization.objects.filter(slug__startswith=f'{prefix}-').order_by('slug'):
+        seeded.append(SeededOrg(
+            slug=organization.slug,
+            emails=list(
+                OrganizationMember.objects.filter(organization=organization)
+                .order_by('pk').values_list('user__email', flat=True)
+            ),
+            project_slugs=list(Project.objects.filter(organization=organization).order_by('pk').values_list('slug', flat=True)),
+            task_ids=list(
+                Task.objects.filter(project__organization=organization).order_by('pk').values_list('task_id', flat=True)
+            ),
+        ))
+    return seeded
@@ -0,0 +1,22 @@
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize_latencies(samples_ms):
+    """p50/p95/p99/max of a list of latencies in milliseconds"""
+    values = sorted(samples_ms)
+    return {
+        'count': len(values),
+        'p50_ms': _round(percentile(values, 0.50)),
+        'p95_ms': _round(percentile(values, 0.95)),
+        'p99_ms': _round(percentile(values, 0.99)),
+        'max_ms': _round(values[-1] if values else None),
+    }
+
+
+def _round(value):
+    return None if value is None else round(value, 3)
@@ -15,6 +15,11 @@ from projects.routing import websocket_urlpatterns
 
 
 from projects.websocket_auth import JWTAuthMiddlewareStack  
+from core.documents import preload_persisted_queries
+from core.schema import schema
+
+# Register the frontend's persisted queries now rather than on the first request
+preload_persisted_queries(schema.graphql_schema)
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
@@ -0,0 +1,329 @@
+import asyncio
+import json
+import logging
+import random
+import select
+import string
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY payloads are capped at 8000 bytes; leave room for the envelope
+NOTIFY_PAYLOAD_LIMIT = 7800
+
+
+class _Inbox:
+    """Messages waiting for one local channel, fed from any thread"""
+
+    def __init__(self):
+        self.messages = deque()
+        self.waiter = None
+        self.loop = None
+
+
+class PostgresChannelLayer(BaseChannelLayer):
+    """
+    Channel layer that fans messages out between processes with Postgres
+    LISTEN/NOTIFY, so no separate broker is needed.
+
+    Group membership is kept per process. ``group_send`` delivers to local
+    members directly and publishes one NOTIFY; every other process's
+    listener thread hands the message to its own members. Messages for a
+    process-specific channel (``new_channel()``) are routed the same way.
+    Payloads over the NOTIFY limit are written to an unlogged spillover
+    table (``channels_spillover``, created by migration projects.0013) and
+    only their id is sent.
+
+    Delivery is at-most-once: anything published while a listener is
+    reconnecting is lost, which matches the other channel layers.
+    """
+
+    extensions = ["groups", "flush"]
+
+    def __init__(
+        self,
+        database='default',
+        prefix='channels',
+        expiry=60,
+        group_expiry=86400,
+        capacity=100,
+        channel_capacity=None,
+        spillover_table='channels_spillover',
+        spillover_ttl=300,
+        reconnect_delay=0.5,
+        max_reconnect_delay=30,
+        poll_interval=1.0,
+        **kwargs
+    ):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.channel_capacity = self.compile_capacities(self.channel_capacity)
+        # Members not re-added for this many seconds are dropped, like the
+        # in-memory layer does with consumers that died without group_discard
+        self.group_expiry = group_expiry
+        self.database = database
+        self.notify_channel = prefix
+        self.spillover_table = spillover_table
+        self.spillover_ttl = spillover_ttl
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.poll_interval = poll_interval
+
+        self.process_id = uuid.uuid4().hex[:12]
+        self._inboxes = {}
+        self._groups = {}
+        self._lock = threading.Lock()
+
+        self._publisher = None
+        self._publish_lock = threading.Lock()
+        # A single thread keeps publishes ordered and shares one connection
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pg-channel-publish')
+        self._spilled = 0
+
+        self._listener = None
+        self._listening = threading.Event()
+        self._closed = False
+
+    # Connections
+
+    def _connect(self):
+        config = settings.DATABASES[self.database]
+        connection = psycopg2.connect(
+            dbname=config['NAME'],
+            user=config.get('USER') or None,
+            password=config.get('PASSWORD') or None,
+            host=config.get('HOST') or None,
+            port=config.get('PORT') or None,
+            application_name='channels-layer',
+        )
+        connection.autocommit = True
+        return connection
+
+    # Publishing (runs on the publisher thread)
+
+    def _publish(self, envelope):
+        payload = json.dumps(envelope, separators=(',', ':'))
+        with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publisher is None or self._publisher.closed:
+                        self._publisher = self._connect()
+                    with self._publisher.cursor() as cursor:
+                        if len(payload.encode()) > NOTIFY_PAYLOAD_LIMIT:
+                            payload = self._spill(cursor, envelope, payload)
+                        cursor.execute("SELECT pg_notify(%s, %s)", [self.notify_channel, payload])
+                    return
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    # Stale connection, e.g. after a database restart: reconnect once
+                    self._publisher = None
+                    if attempt:
+                        raise
+
+    def _spill(self, cursor, envelope, payload):
+        cursor.execute(
+            f"INSERT INTO {self.spillover_table} (payload) VALUES (%s) RETURNING id",
+            [payload]
+        )
+        ref = cursor.fetchone()[0]
+        self._spilled += 1
+        if self._spilled % 100 == 0:
+            cursor.execute(
+                f"DELETE FROM {self.spillover_table} WHERE created_at < now() - %s * interval '1 second'",
+                [self.spillover_ttl]
+            )
+        return json.dumps({'o': envelope['o'], 'ref': ref}, separators=(',', ':'))
+
+    async def _notify(self, envelope):
+        envelope['o'] = self.process_id
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._publish, envelope)
+
+    # Listening (runs on the listener thread)
+
+    def _ensure_listener(self):
+        if self._listener is None or not self._listener.is_alive():
+            self._closed = False
+            self._listener = threading.Thread(
+                target=self._listen_forever, name='pg-channel-listen', daemon=True
+            )
+            self._listener.start()
+
+    def _listen_forever(self):
+        delay = self.reconnect_delay
+        while not self._closed:
+            connection = None
+            try:
+                connection = self._connect()
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.notify_channel}"')
+                self._listening.set()
+                delay = self.reconnect_delay
+                while not self._closed:
+                    if select.select([connection], [], [], self.poll_interval) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        self._dispatch(connection, connection.notifies.pop(0).payload)
+            except psycopg2.Error as e:
+                self._listening.clear()
+                if self._closed:
+                    break
+                # Exponential backoff with jitter so workers don't reconnect in lockstep
+                logger.warning(f"Channel layer listener lost its connection ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay * random.uniform(0.5, 1.5))
+                delay = min(delay * 2, self.max_reconnect_delay)
+            finally:
+                if connection is not None:
+                    connection.close()
+        self._listening.clear()
+
+    def _dispatch(self, connection, payload):
+        envelope = json.loads(payload)
+        if envelope.get('o') == self.process_id:
+            return  # Already delivered locally by the sender
+        if 'ref' in envelope:
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT payload FROM {self.spillover_table} WHERE id = %s", [envelope['ref']])
+                row = cursor.fetchone()
+            if row is None:
+                logger.warning(f"Spilled channel message {envelope['ref']} expired before delivery")
+                return
+            envelope = json.loads(row[0])
+
+        if 'g' in envelope:
+            self._deliver_to_group(envelope['g'], envelope['m'])
+        else:
+            self._deliver(envelope['c'], envelope['m'], raise_when_full=False)
+
+    # Local delivery (any thread)
+
+    def _deliver(self, channel, message, raise_when_full=True):
+        with self._lock:
+            inbox = self._inboxes.setdefault(channel, _Inbox())
+            if len(inbox.messages) >= self.get_capacity(channel):
+                if raise_when_full:
+                    raise ChannelFull(channel)
+                return
+            inbox.messages.append((time.time() + self.expiry, message))
+            waiter, loop = inbox.waiter, inbox.loop
+            inbox.waiter = None
+        if waiter is not None:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                pass  # The receiving loop has shut down
+
+    def _deliver_to_group(self, group, message):
+        with self._lock:
+            self._expire_members(group)
+            channels = list(self._groups.get(group, ()))
+        for channel in channels:
+            # Each member gets its own copy, as with the in-memory layer
+            self._deliver(channel, json.loads(json.dumps(message)), raise_when_full=False)
+
+    def _expire_members(self, group):
+        # Called with self._lock held
+        members = self._groups.get(group)
+        if not members:
+            return
+        cutoff = time.time() - self.group_expiry
+        for channel in [channel for channel, added in members.items() if added < cutoff]:
+            del members[channel]
+            inbox = self._inboxes.get(channel)
+            if inbox is not None and inbox.waiter is None:
+                del self._inboxes[channel]
+        if not members:
+            del self._groups[group]
+
+    def _is_local(self, channel):
+        return '!' in channel and self.non_local_name(channel).endswith(f".{self.process_id}!")
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        assert "__asgi_channel__" not in message
+        # Plain (non-specific) channels stay process-local
+        if self._is_local(channel) or '!' not in channel:
+            self._deliver(channel, json.loads(json.dumps(message)))
+        else:
+            await self._notify({'c': channel, 'm': message})
+
+    async def receive(self, channel):
+        assert self.valid_channel_name(channel)
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                inbox = self._inboxes.setdefault(channel, _Inbox())
+                now = time.time()
+                while inbox.messages and inbox.messages[0][0] < now:
+                    inbox.messages.popleft()
+                if inbox.messages:
+                    return inbox.messages.popleft()[1]
+                waiter = loop.create_future()
+                inbox.waiter, inbox.loop = waiter, loop
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._lock:
+                    if inbox.waiter is waiter:
+                        inbox.waiter = None
+                    if not inbox.messages and channel in self._inboxes:
+                        del self._inboxes[channel]
+                raise
+
+    async def new_channel(self, prefix="specific"):
+        self._ensure_listener()
+        suffix = "".join(random.choice(string.ascii_letters) for _ in range(12))
+        return f"{prefix}.{self.process_id}!{suffix}"
+
+    async def group_add(self, group, channel):
+        assert self.valid_group_name(group), "Group name not valid"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        self._ensure_listener()
+        with self._lock:
+            self._groups.setdefault(group, {})[channel] = time.time()
+
+    async def group_discard(self, group, channel):
+        assert self.valid_channel_name(channel), "Invalid channel name"
+        assert self.valid_group_name(group), "Invalid group name"
+        with self._lock:
+            members = self._groups.get(group)
+            if members is not None:
+                members.pop(channel, None)
+                if not members:
+                    del self._groups[group]
+            inbox = self._inboxes.get(channel)
+            if inbox is not None and not inbox.messages and inbox.waiter is None:
+                del self._inboxes[channel]
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        assert self.valid_group_name(group), "Invalid group name"
+        self._deliver_to_group(group, message)
+        await self._notify({'g': group, 'm': message})
+
+    async def flush(self):
+        with self._lock:
+            self._inboxes = {}
+            self._groups = {}
+
+    async def close(self):
+        self._closed = True
+        if self._publisher is not None:
+            self._publisher.close()
+            self._publisher = None
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
@@ -0,0 +1,174 @@
+from django.conf import settings
+from graphql import (
+    FieldNode, FragmentDefinitionNode, FragmentSpreadNode, GraphQLError, GraphQLInt, GraphQLString,
+    InlineFragmentNode, ObjectValueNode, ValidationRule, VariableNode, get_named_type, get_nullable_type,
+    is_composite_type, is_list_type, value_from_ast,
+)
+
+_settings = getattr(settings, 'GRAPHQL_QUERY_COST', {})
+MAX_DEPTH = _settings.get('MAX_DEPTH')
+# Lists without a first/last argument are assumed to hold this many items
+DEFAULT_LIST_SIZE = _settings.get('DEFAULT_LIST_SIZE', 50)
+MAX_LIST_SIZE = _settings.get('MAX_LIST_SIZE', 200)
+# 'Type.field' -> cost of resolving it once; objects cost 1 and scalars 0 by default
+WEIGHTS = _settings.get('WEIGHTS', {})
+# Role -> maximum cost of one operation, None for unlimited. DEFAULT applies
+# to operations naming no organization the caller is a member of.
+BUDGETS = _settings.get('BUDGETS', {})
+DEFAULT = 'DEFAULT'
+
+PAGE_ARGUMENTS = ('first', 'last')
+ORG_ARGUMENTS = ('orgSlug', 'organizationSlug')
+
+
+def _is_introspection(node):
+    return node.name.value.startswith('__')
+
+
+def selection_depth(selection_set, get_fragment, seen=frozenset()):
+    """Levels of fields below ``selection_set``, through fragments and not counting introspection"""
+    if selection_set is None:
+        return 0
+    depth = 0
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            if not _is_introspection(selection):
+                depth = max(depth, 1 + selection_depth(selection.selection_set, get_fragment, seen))
+        elif isinstance(selection, InlineFragmentNode):
+            depth = max(depth, selection_depth(selection.selection_set, get_fragment, seen))
+        elif isinstance(selection, FragmentSpreadNode):
+            name = selection.name.value
+            fragment = get_fragment(name)
+            if fragment is not None and name not in seen:
+                depth = max(depth, selection_depth(fragment.selection_set, get_fragment, seen | {name}))
+    return depth
+
+
+class DepthLimitRule(ValidationRule):
+    """Reject operations nesting fields deeper than ``GRAPHQL_QUERY_COST['MAX_DEPTH']``"""
+
+    def enter_operation_definition(self, node, *args):
+        if MAX_DEPTH is None:
+            return
+        depth = selection_depth(node.selection_set, self.context.get_fragment)
+        if depth > MAX_DEPTH:
+            name = f"'{node.name.value}'" if node.name else 'Anonymous operation'
+            self.report_error(GraphQLError(
+                f"{name} is nested {depth} levels deep; the maximum is {MAX_DEPTH}",
+                node, extensions={'code': 'QUERY_TOO_DEEP'},
+            ))
+
+
+class QueryCost:
+    """
+    Static cost of an operation: every field resolved costs its weight times
+    the number of parents it is resolved for. Lists multiply what is below
+    them by their ``first``/``last`` argument, or by the one of the
+    connection holding them, capped at MAX_LIST_SIZE.
+    """
+
+    def __init__(self, schema, fragments, variables):
+        self.schema = schema
+        self.fragments = fragments
+        self.variables = variables or {}
+
+    def page_size(self, node):
+        for argument in node.arguments:
+            if argument.name.value in PAGE_ARGUMENTS:
+                value = value_from_ast(argument.value, GraphQLInt, self.variables)
+                if isinstance(value, int) and value >= 0:
+                    return value
+        return None
+
+    def selection_set(self, selection_set, parent_type, multiplier, page_size, seen=frozenset()):
+        total = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                total += self.field(selection, parent_type, multiplier, page_size, seen)
+            elif isinstance(selection, InlineFragmentNode):
+                condition = selection.type_condition
+                fragment_type = self.schema.get_type(condition.name.value) if condition else parent_type
+                total += self.selection_set(selection.selection_set, fragment_type, multiplier, page_size, seen)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                if fragment is not None and name not in seen:
+                    fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+                    total += self.selection_set(
+                        fragment.selection_set, fragment_type, multiplier, page_size, seen | {name}
+                    )
+        return total
+
+    def field(self, node, parent_type, multiplier, page_size, seen):
+        fields = getattr(parent_type, 'fields', {})
+        definition = fields.get(node.name.value)
+        if definition is None or _is_introspection(node):
+            return 0
+        named_type = get_named_type(definition.type)
+        default_weight = 1 if is_composite_type(named_type) else 0
+        cost = multiplier * WEIGHTS.get(f'{parent_type.name}.{node.name.value}', default_weight)
+        if node.selection_set is None:
+            return cost
+
+        size = self.page_size(node)
+        if is_list_type(get_nullable_type(definition.type)):
+            if size is None:
+                size = DEFAULT_LIST_SIZE if page_size is None else page_size
+            multiplier *= min(size, MAX_LIST_SIZE)
+            return cost + self.selection_set(node.selection_set, named_type, multiplier, None, seen)
+        # A connection's first/last sizes the edges list below it
+        return cost + self.selection_set(node.selection_set, named_type, multiplier, size, seen)
+
+
+def operation_cost(schema, document, operation, variables):
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+    root_type = schema.get_root_type(operation.operation)
+    return QueryCost(schema, fragments, variables).selection_set(operation.selection_set, root_type, 1, None)
+
+
+def _org_slugs(value, variables):
+    """Organization slugs in the input object ``value`` (a literal or a variable's value)"""
+    if isinstance(value, VariableNode):
+        value = variables.get(value.name.value)
+    if isinstance(value, ObjectValueNode):
+        for field in value.fields:
+            if field.name.value in ORG_ARGUMENTS:
+                slug = value_from_ast(field.value, GraphQLString, variables)
+                if isinstance(slug, str):
+                    yield slug
+    elif isinstance(value, dict):
+        for name in ORG_ARGUMENTS:
+            if isinstance(value.get(name), str):
+                yield value[name]
+
+
+def operation_org_slugs(operation, variables):
+    """Organizations the root fields of ``operation`` name, as an argument or in their input"""
+    variables = variables or {}
+    slugs = set()
+    for selection in operation.selection_set.selections:
+        if not isinstance(selection, FieldNode):
+            continue
+        for argument in selection.arguments:
+            if argument.name.value in ORG_ARGUMENTS:
+                slug = value_from_ast(argument.value, GraphQLString, variables)
+                if isinstance(slug, str):
+                    slugs.add(slug)
+            else:
+                slugs.update(_org_slugs(argument.value, variables))
+    return slugs
+
+
+def budget_for(roles):
+    """
+    The most generous budget of ``roles``, the caller's roles in the
+    organizations an operation names; None means unlimited
+    """
+    budgets = [BUDGETS.get(role, BUDGETS.get(DEFAULT)) for role in roles] or [BUDGETS.get(DEFAULT)]
+    if None in budgets:
+        return None
+    return max(budgets)
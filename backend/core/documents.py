@@ -0,0 +1,163 @@
+import hashlib
+import logging
+import re
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from graphql import FieldNode, GraphQLError, Visitor, parse, print_ast, visit
+from graphql.language import NameNode, OperationDefinitionNode, SelectionSetNode
+from graphql.validation import specified_rules, validate
+from graphene_django.settings import graphene_settings
+
+from .caching import TTLCache
+from .cost import DepthLimitRule
+
+logger = logging.getLogger(__name__)
+
+# A parsed query and the result of validating it against the schema
+CachedDocument = namedtuple('CachedDocument', ['document', 'errors'])
+
+_settings = getattr(settings, 'GRAPHQL_DOCUMENTS', {})
+document_cache = TTLCache(maxsize=_settings.get('CACHE_SIZE', 1000), ttl=None)
+# Hashes clients registered at runtime; preloaded ones live in _preloaded
+persisted_queries = TTLCache(maxsize=_settings.get('PERSISTED_CACHE_SIZE', 5000), ttl=None)
+_preloaded = {}
+_preload_lock = threading.Lock()
+_preload_done = False
+
+GQL_TEMPLATE = re.compile(r'gql`(.*?)`', re.DOTALL)
+
+
+class PersistedQueryError(Exception):
+    """A persisted query request that can't be served; ``code`` follows Apollo"""
+
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+    def as_graphql_error(self):
+        return GraphQLError(str(self), extensions={'code': self.code})
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def get_document(schema, query, validation_rules=None):
+    """
+    Parse and validate ``query`` once per distinct text.
+
+    Returns a CachedDocument; syntax errors come back in ``errors`` with
+    ``document`` set to None. Results depend only on the query text and the
+    (static) schema, so they are safe to share between users. The depth
+    limit is always checked, since the cache key doesn't cover the rules.
+    """
+    key = query_hash(query)
+    cached = document_cache.get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        document = parse(query)
+    except GraphQLError as e:
+        cached = CachedDocument(None, [e])
+    else:
+        rules = [*(validation_rules or specified_rules), DepthLimitRule]
+        errors = validate(schema, document, rules, graphene_settings.MAX_VALIDATION_ERRORS)
+        cached = CachedDocument(document, errors)
+    document_cache.set(key, cached)
+    return cached
+
+
+def resolve_persisted_query(query, extensions):
+    """
+    Apply Apollo's automatic persisted queries protocol.
+
+    ``extensions.persistedQuery.sha256Hash`` with no query looks the text up
+    (PersistedQueryNotFound makes the client retry with the full text); with
+    a query it registers the hash after checking that it matches.
+    """
+    persisted = (extensions or {}).get('persistedQuery')
+    if not persisted:
+        return query
+    if persisted.get('version', 1) != 1:
+        raise PersistedQueryError('Unsupported persisted query version', 'PERSISTED_QUERY_NOT_SUPPORTED')
+
+    sha256 = persisted.get('sha256Hash')
+    if not sha256:
+        raise PersistedQueryError('Missing sha256Hash', 'PERSISTED_QUERY_NOT_FOUND')
+
+    if query:
+        if query_hash(query) != sha256:
+            raise PersistedQueryError('provided sha does not match query', 'INVALID_SHA256_HASH')
+        if sha256 not in _preloaded:
+            persisted_queries.set(sha256, query)
+        return query
+
+    query = _preloaded.get(sha256) or persisted_queries.get(sha256)
+    if query is None:
+        raise PersistedQueryError('PersistedQueryNotFound', 'PERSISTED_QUERY_NOT_FOUND')
+    return query
+
+
+class _AddTypename(Visitor):
+    """What Apollo Client's cache does to a query before it is sent"""
+
+    def enter_selection_set(self, node, key, parent, path, ancestors):
+        if isinstance(parent, OperationDefinitionNode):
+            return None
+        if any(isinstance(s, FieldNode) and s.name.value == '__typename' for s in node.selections):
+            return None
+        typename = FieldNode(name=NameNode(value='__typename'), arguments=(), directives=())
+        return SelectionSetNode(selections=(*node.selections, typename))
+
+
+def apollo_text(text):
+    """The text Apollo Client sends for the operation written as ``text``"""
+    return print_ast(visit(parse(text), _AddTypename()))
+
+
+def query_variants(text):
+    """
+    Texts a client may send for the operation written as ``text``: as
+    written, as printed by graphql-js, and as printed after Apollo's cache
+    adds ``__typename``. Hashes are taken over the exact text sent.
+    """
+    return {text, print_ast(parse(text)), apollo_text(text)}
+
+
+def preload_persisted_queries(schema=None):
+    """
+    Register the operations in ``GRAPHQL_DOCUMENTS['PRELOAD']`` (files holding
+    ``gql`` template literals, e.g. the frontend's queries.ts) so clients can
+    send their hash on first use. With ``schema`` the documents are parsed and
+    validated up front as well. Called at server startup (``core.asgi``,
+    ``core.wsgi``) rather than on a request; runs once per process.
+    """
+    global _preload_done
+    if _preload_done:
+        return
+    with _preload_lock:
+        if _preload_done:
+            return
+        for path in _settings.get('PRELOAD', []):
+            try:
+                with open(path) as f:
+                    source = f.read()
+            except OSError as e:
+                logger.warning(f"Can't preload persisted queries from {path}: {e}")
+                continue
+            for text in GQL_TEMPLATE.findall(source):
+                if '${' in text:
+                    continue  # Interpolated fragments can't be resolved here
+                try:
+                    variants = query_variants(text)
+                except GraphQLError as e:
+                    logger.warning(f"Skipping unparsable query in {path}: {e}")
+                    continue
+                for variant in variants:
+                    _preloaded[query_hash(variant)] = variant
+                    if schema is not None:
+                        get_document(schema, variant)
+        _preload_done = True
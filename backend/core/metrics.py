@@ -0,0 +1,254 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
+from graphql import get_nullable_type, is_list_type
+
+_settings = getattr(settings, 'GRAPHQL_METRICS', {})
+ENABLED = _settings.get('ENABLED', True)
+# Bearer token /metrics requires; None leaves it open (scraped on a private network)
+TOKEN = _settings.get('TOKEN')
+# Operation names are chosen by clients; past this many distinct ones they are reported as 'other'
+MAX_OPERATIONS = _settings.get('MAX_OPERATIONS', 200)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Prometheus' default buckets; resolvers get finer ones at the bottom
+OPERATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+FIELD_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 250)
+
+# Resolvers the libraries generate (attribute lookups, ids, enum values)
+_LIBRARY_MODULES = ('graphene.', 'graphene_django.', 'graphql.', 'graphql_jwt.')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(pairs):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Histogram:
+    """Thread-safe histogram per label values, rendered in the Prometheus text format"""
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(float(bound) for bound in buckets)
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in sorted(self._series.items())]
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for labels, counts, total in snapshot:
+            pairs = list(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_format_labels(pairs + [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(pairs)} {repr(total)}')
+            lines.append(f'{self.name}_count{_format_labels(pairs)} {cumulative}')
+        return '\n'.join(lines)
+
+
+operation_duration = Histogram(
+    'graphql_operation_duration_seconds', 'Time to serve a GraphQL operation, including cache hits.',
+    ['operation', 'type', 'outcome'], OPERATION_BUCKETS,
+)
+operation_db_queries = Histogram(
+    'graphql_operation_db_queries', 'SQL statements run per GraphQL operation.',
+    ['operation', 'type'], QUERY_COUNT_BUCKETS,
+)
+operation_db_duration = Histogram(
+    'graphql_operation_db_duration_seconds', 'Time spent in SQL per GraphQL operation.',
+    ['operation', 'type'], OPERATION_BUCKETS,
+)
+field_duration = Histogram(
+    'graphql_field_duration_seconds', 'Time spent in a resolver.',
+    ['field'], FIELD_BUCKETS,
+)
+field_db_queries = Histogram(
+    'graphql_field_db_queries', 'SQL statements run by a resolver.',
+    ['field'], QUERY_COUNT_BUCKETS,
+)
+field_db_duration = Histogram(
+    'graphql_field_db_duration_seconds', 'Time a resolver spent in SQL.',
+    ['field'], FIELD_BUCKETS,
+)
+REGISTRY = [
+    operation_duration, operation_db_queries, operation_db_duration,
+    field_duration, field_db_queries, field_db_duration,
+]
+
+
+def render():
+    return '\n'.join(histogram.render() for histogram in REGISTRY) + '\n'
+
+
+class DbStats:
+    __slots__ = ('queries', 'seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+# SQL run for the operation being served. Execution happens on one executor
+# thread, so the resolvers and the connection wrapper see the same object.
+_db_stats = ContextVar('graphql_db_stats', default=None)
+
+
+def _track_query(execute, sql, params, many, context):
+    stats = _db_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.seconds += time.perf_counter() - started
+
+
+def _install_query_tracker(sender, connection, **kwargs):
+    if _track_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_track_query)
+
+
+if ENABLED:
+    connection_created.connect(_install_query_tracker, dispatch_uid='core.metrics')
+
+_operation_names = set()
+_operation_names_lock = threading.Lock()
+
+
+def _operation_label(name):
+    if name in _operation_names:
+        return name
+    with _operation_names_lock:
+        if len(_operation_names) >= MAX_OPERATIONS:
+            return 'other'
+        _operation_names.add(name)
+    return name
+
+
+class track_operation:
+    """
+    Records one GraphQL request. The view sets ``operation_ast`` once the
+    document is resolved, ``cached`` on a result cache hit and ``result``
+    at the end; requests that never get as far as an operation (unknown
+    persisted query, syntax errors) are not recorded.
+    """
+
+    def __init__(self):
+        self.operation_ast = None
+        self.cached = False
+        self.result = None
+
+    def __enter__(self):
+        if ENABLED:
+            self._token = _db_stats.set(DbStats())
+            self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not ENABLED:
+            return
+        elapsed = time.perf_counter() - self._started
+        stats = _db_stats.get()
+        _db_stats.reset(self._token)
+        if self.operation_ast is None:
+            return
+        name = _operation_label(self.operation_ast.name.value if self.operation_ast.name else 'anonymous')
+        kind = self.operation_ast.operation.value
+        if exc_type is not None or self.result is None or self.result.errors:
+            outcome = 'error'
+        else:
+            outcome = 'cached' if self.cached else 'ok'
+        operation_duration.observe((name, kind, outcome), elapsed)
+        operation_db_queries.observe((name, kind), stats.queries)
+        operation_db_duration.observe((name, kind), stats.seconds)
+
+
+# (parent type, field) -> 'Parent.field' for resolvers worth timing, None for the rest
+_field_labels = {}
+
+
+def _field_label(info):
+    key = (info.parent_type.name, info.field_name)
+    try:
+        return _field_labels[key]
+    except KeyError:
+        pass
+    label = None
+    field = info.parent_type.fields.get(info.field_name)  # None for __typename and friends
+    if field is not None:
+        resolve = getattr(field.resolve, 'func', field.resolve)
+        own = resolve is not None and not getattr(resolve, '__module__', '').startswith(_LIBRARY_MODULES)
+        if own or info.path.prev is None:
+            label = f'{key[0]}.{key[1]}'
+    _field_labels[key] = label
+    return label
+
+
+class MetricsMiddleware:
+    """
+    Graphene middleware timing root fields and every field resolved by a
+    ``resolve_*`` of this project, with the SQL it ran. Attribute lookups,
+    ids and enums pass straight through, which keeps the cost per resolved
+    value to a dict lookup.
+    """
+
+    def resolve(self, next, root, info, **args):
+        if not ENABLED:
+            return next(root, info, **args)
+        label = _field_label(info)
+        if label is None:
+            return next(root, info, **args)
+
+        stats = _db_stats.get()
+        queries, db_seconds = (stats.queries, stats.seconds) if stats is not None else (0, 0.0)
+        started = time.perf_counter()
+        result = next(root, info, **args)
+        # Lists are iterated right after anyway; evaluating the QuerySet here
+        # charges its SQL to the resolver that built it
+        if isinstance(result, QuerySet) and is_list_type(get_nullable_type(info.return_type)):
+            len(result)
+        field_duration.observe((label,), time.perf_counter() - started)
+        if stats is not None:
+            field_db_queries.observe((label,), stats.queries - queries)
+            field_db_duration.observe((label,), stats.seconds - db_seconds)
+        return result
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint"""
+    if not ENABLED:
+        return HttpResponseNotFound()
+    if TOKEN is not None and request.headers.get('Authorization') != f'Bearer {TOKEN}':
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
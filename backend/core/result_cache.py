@@ -0,0 +1,96 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from graphql import FieldNode, StringValueNode, VariableNode
+
+from organizations.models import OrganizationVersion
+
+_settings = getattr(settings, 'GRAPHQL_RESULT_CACHE', {})
+# Root fields (GraphQL names) whose results depend only on the organization and the role
+CACHEABLE_FIELDS = frozenset(_settings.get('FIELDS', ()))
+TIMEOUT = _settings.get('TIMEOUT', 60)
+
+
+def get_cache():
+    return caches[_settings.get('ALIAS', 'default')]
+
+
+def org_version(organization_id):
+    """
+    The organization's current version. It lives in the database rather
+    than the cache, so a bump is seen by every process even when the
+    results themselves are cached per process.
+    """
+    version = OrganizationVersion.objects.filter(pk=organization_id).values_list('version', flat=True).first()
+    return version or 0
+
+
+BUMP_SQL = """
+    INSERT INTO {table} (organization_id, version) VALUES (%s, 1)
+    ON CONFLICT (organization_id) DO UPDATE SET version = {table}.version + 1
+"""
+
+
+def bump_org_version(organization_id):
+    """
+    Invalidate every cached result of the organization once the current
+    transaction commits (immediately outside one). Old entries are never
+    looked up again and age out on their own.
+    """
+    def bump():
+        table = connection.ops.quote_name(OrganizationVersion._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(BUMP_SQL.format(table=table), [organization_id])
+
+    transaction.on_commit(bump)
+
+
+def _argument_value(argument, variables):
+    value = argument.value
+    if isinstance(value, VariableNode):
+        return (variables or {}).get(value.name.value)
+    if isinstance(value, StringValueNode):
+        return value.value
+    return None
+
+
+def cacheable_org_slug(operation, variables):
+    """
+    The ``orgSlug`` shared by every root field of ``operation``, or None if
+    the operation isn't cacheable: a field outside CACHEABLE_FIELDS, a
+    fragment at the root, or fields of more than one organization.
+    """
+    if not CACHEABLE_FIELDS:
+        return None
+    org_slugs = set()
+    for selection in operation.selection_set.selections:
+        if not isinstance(selection, FieldNode):
+            return None
+        name = selection.name.value
+        if name == '__typename':
+            continue
+        if name not in CACHEABLE_FIELDS:
+            return None
+        org_slugs.update(
+            _argument_value(argument, variables)
+            for argument in selection.arguments if argument.name.value == 'orgSlug'
+        )
+    if len(org_slugs) != 1:
+        return None
+    org_slug = org_slugs.pop()
+    return org_slug if isinstance(org_slug, str) else None
+
+
+def result_key(query, operation_name, variables, organization_id, role):
+    """
+    Key of one result: the operation and its variables under the org's
+    current version and the caller's role. Bumping the version orphans
+    every key of the org at once.
+    """
+    fingerprint = hashlib.sha256(
+        json.dumps([query, operation_name, variables or {}], sort_keys=True, default=str).encode()
+    ).hexdigest()
+    return f'gql:result:{organization_id}:{org_version(organization_id)}:{role}:{fingerprint}'
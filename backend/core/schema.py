@@ -1,10 +1,11 @@
 import graphene
 import graphql_jwt
+from jobs.schema import Query as JobQuery
 from organizations.schema import Query as OrganizationQuery, Mutation as OrganizationMutation
 from projects.schema import Query as ProjectQuery, Mutation as ProjectMutation
 from users.schema import Query as UserQuery, Mutation as UserMutation
 
-class Query(OrganizationQuery, ProjectQuery, UserQuery, graphene.ObjectType):
+class Query(OrganizationQuery, ProjectQuery, UserQuery, JobQuery, graphene.ObjectType):
     pass
 
 class Mutation(OrganizationMutation, ProjectMutation, UserMutation, graphene.ObjectType):
@@ -0,0 +1,45 @@
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+
+def _collect(selection_set, fragments, into):
+    """Walk a selection set, flattening fragments into a name -> [FieldNode] map"""
+    if selection_set is None:
+        return into
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            into.setdefault(selection.name.value, []).append(selection)
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = fragments.get(selection.name.value)
+            if fragment is not None:
+                _collect(fragment.selection_set, fragments, into)
+        elif isinstance(selection, InlineFragmentNode):
+            _collect(selection.selection_set, fragments, into)
+    return into
+
+
+def selected_fields(info, *path):
+    """
+    Return the snake_case names of the fields selected on the current field.
+
+    ``path`` descends into nested selections first, e.g.
+    ``selected_fields(info, 'edges', 'node')`` for a connection. List
+    resolvers use this to decide which joins and aggregates a queryset needs
+    before it is evaluated, instead of paying for them row by row.
+    """
+    nodes = list(info.field_nodes)
+    for name in path:
+        children = {}
+        for node in nodes:
+            _collect(node.selection_set, info.fragments, children)
+        nodes = [
+            child
+            for field_name, field_nodes in children.items()
+            if to_snake_case(field_name) == name
+            for child in field_nodes
+        ]
+
+    fields = {}
+    for node in nodes:
+        _collect(node.selection_set, info.fragments, fields)
+    return {to_snake_case(name) for name in fields}
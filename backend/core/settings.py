@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     # Third party apps
     'graphene_django',
     'corsheaders',
@@ -44,7 +45,9 @@ INSTALLED_APPS = [
     # Our apps
     'organizations',
     'users',
-    'projects'
+    'projects',
+    'benchmarks',
+    'jobs',
 ]
 
 AUTH_USER_MODEL = 'users.User'
@@ -155,13 +158,103 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Threads that run GraphQL execution (and hold DB connections) for the async view
+GRAPHQL_EXECUTOR_WORKERS = 16
+
+# Parsed/validated document cache and persisted queries (core.documents).
+# PRELOAD files are scanned for gql`...` operations whose hashes clients
+# may send without registering them first.
+GRAPHQL_DOCUMENTS = {
+    'CACHE_SIZE': 1000,
+    'PERSISTED_CACHE_SIZE': 5000,
+    'PRELOAD': [
+        BASE_DIR.parent / 'frontend' / 'src' / 'graphql' / 'queries.ts',
+    ],
+}
+
+# Cached results of read queries, keyed per organization version and role
+# (core.result_cache). Mutations bump the version in the database, so no
+# worker serves a result from before a write it can see; a shared CACHES
+# backend only lets workers reuse each other's entries.
+GRAPHQL_RESULT_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 60,  # seconds
+    'FIELDS': [
+        'projects', 'project', 'projectsConnection',
+        'tasks', 'task', 'tasksConnection',
+        'taskComments', 'taskCommentsConnection',
+        'organizationMembers', 'searchTasks', 'orgDashboard',
+    ],
+}
+
+# Static cost analysis and depth limit (core.cost). A field costs its weight
+# (objects 1, scalars 0) for every parent it is resolved for; lists multiply
+# by their first/last argument, else DEFAULT_LIST_SIZE, capped at
+# MAX_LIST_SIZE. The budget is that of the caller's role in the organizations
+# the operation names; None is unlimited.
+GRAPHQL_QUERY_COST = {
+    'MAX_DEPTH': 10,
+    'DEFAULT_LIST_SIZE': 50,
+    'MAX_LIST_SIZE': 200,
+    'WEIGHTS': {
+        'Query.searchTasks': 20,
+        'Query.orgDashboard': 20,
+    },
+    'BUDGETS': {
+        'ADMIN': 10000,
+        'MEMBER': 5000,
+        'DEFAULT': 1000,
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
 GRAPHENE = {
     'SCHEMA': 'core.schema.schema',
     'MIDDLEWARE': [
         'graphql_jwt.middleware.JSONWebTokenMiddleware',
+        'core.metrics.MetricsMiddleware',
     ],
 }
 
+# Per-operation and per-resolver latency and SQL histograms (core.metrics),
+# served in the Prometheus text format at /metrics. Each process keeps its
+# own; scrape every worker.
+GRAPHQL_METRICS = {
+    'ENABLED': True,
+    'TOKEN': os.environ.get('METRICS_TOKEN'),  # required as "Authorization: Bearer <token>" when set
+    'MAX_OPERATIONS': 200,
+}
+
+# Batched project deletion (projects.deletion): tasks per transaction, comments
+# per DELETE, and the task count above which deleteProject queues a background
+# job and returns at once
+PROJECT_DELETION = {
+    'BATCH_SIZE': 1000,
+    'COMMENT_BATCH_SIZE': 5000,
+    'INLINE_MAX_TASKS': 2000,
+}
+
+# Background jobs (jobs app), run by `manage.py run_workers`. Failed attempts
+# are retried after BACKOFF_BASE * 2 ** (attempt - 1) seconds, capped at
+# BACKOFF_MAX; a running job whose heartbeat is older than LEASE seconds is
+# queued again. Finished jobs are deleted after KEEP_DAYS.
+JOBS = {
+    'CONCURRENCY': 4,
+    'POLL_INTERVAL': 5,
+    'HEARTBEAT_INTERVAL': 10,
+    'LEASE': 60,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE': 10,
+    'BACKOFF_MAX': 3600,
+    'KEEP_DAYS': 7,
+}
+
 AUTHENTICATION_BACKENDS = [
     'graphql_jwt.backends.JSONWebTokenBackend',
     'django.contrib.auth.backends.ModelBackend',
@@ -178,9 +271,28 @@ CORS_ALLOW_CREDENTIALS = True
 
 ASGI_APPLICATION = 'core.asgi.application'
 
-# Channels layer configuration (in-memory for development)
+# Channels layer configuration: LISTEN/NOTIFY on the main database so events
+# reach sockets held by every ASGI worker. 'channels.layers.InMemoryChannelLayer'
+# is enough for a single process.
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer'
+        'BACKEND': 'core.channel_layers.PostgresChannelLayer',
+        'CONFIG': {
+            'database': 'default',
+            'prefix': 'channels',
+        },
     }
-}
\ No newline at end of file
+}
+# Process-local cache of (user, org_slug) -> membership lookups (users.authorization)
+ORG_MEMBERSHIP_CACHE = {
+    'MAXSIZE': 10000,
+    'TTL': 30,  # seconds; bounds staleness across processes
+}
+
+# Process-local cache of verified WebSocket tokens (projects.websocket_auth).
+# Entries never outlive the token's exp; TTL bounds how long a user
+# deactivated in another process can still open sockets here.
+WEBSOCKET_TOKEN_CACHE = {
+    'MAXSIZE': 10000,
+    'TTL': 60,  # seconds
+}
@@ -0,0 +1,60 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+
+def next_free_slug(queryset, base_slug, field='slug', max_length=50):
+    """
+    Return ``base_slug`` or the first free ``base_slug-N`` in ``queryset``.
+
+    All candidates sharing the prefix are fetched with one query and the
+    suffix is picked in memory, instead of probing ``exists()`` per counter.
+    """
+    suffix_required = False
+    while True:
+        prefix = f"{base_slug}-"
+        taken = set(
+            queryset.filter(Q(**{field: base_slug}) | Q(**{f'{field}__startswith': prefix}))
+            .values_list(field, flat=True)
+        )
+        if base_slug not in taken and not suffix_required:
+            return base_slug
+
+        suffixes = {
+            int(slug[len(prefix):]) for slug in taken
+            if slug[len(prefix):].isdigit()
+        }
+        counter = 1
+        while counter in suffixes:
+            counter += 1
+
+        slug = f"{prefix}{counter}"
+        if len(slug) <= max_length:
+            return slug
+        # Make room for the suffix and look again under the shorter prefix
+        base_slug = base_slug[:max_length - len(str(counter)) - 1].rstrip('-')
+        suffix_required = True
+
+
+def save_with_unique_slug(instance, source, save, field='slug', attempts=5):
+    """
+    Slugify ``source`` into ``instance.<field>`` and call ``save()``.
+
+    A concurrent insert can claim the same slug between the lookup and the
+    INSERT; the unique constraint turns that into an IntegrityError, which
+    is retried with a freshly picked suffix.
+    """
+    model = type(instance)
+    max_length = model._meta.get_field(field).max_length
+    base_slug = slugify(source)[:max_length].rstrip('-') or model._meta.model_name
+
+    for attempt in range(attempts):
+        # The base manager sees rows a default manager may hide (e.g. projects
+        # being deleted), which still hold their slugs
+        setattr(instance, field, next_free_slug(model._base_manager.all(), base_slug, field, max_length))
+        try:
+            with transaction.atomic():
+                return save()
+        except IntegrityError:
+            if attempt == attempts - 1:
+                raise
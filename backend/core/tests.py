@@ -0,0 +1,491 @@
+import asyncio
+import json
+import tempfile
+import time
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from graphql import parse, validate
+from graphql_jwt.shortcuts import get_token
+
+from organizations.models import Organization, OrganizationVersion
+from projects.models import Project, Task
+from users.authorization import membership_cache
+from users.models import OrganizationMember, User
+from . import cost, documents, metrics, result_cache
+from .channel_layers import NOTIFY_PAYLOAD_LIMIT, PostgresChannelLayer
+from .documents import PersistedQueryError, get_document, query_hash, resolve_persisted_query
+from .schema import schema
+from .slugs import next_free_slug
+
+graphql_schema = schema.graphql_schema
+
+
+def query_cost(query, variables=None):
+    document = parse(query)
+    return cost.operation_cost(graphql_schema, document, document.definitions[0], variables)
+
+
+class QueryCostTests(SimpleTestCase):
+    def test_scalars_are_free(self):
+        self.assertEqual(query_cost('{ projects(orgSlug: "acme") { id name slug } }'), 1)
+
+    def test_lists_multiply_their_children(self):
+        # The list itself, then assignee once for each of the default 50 tasks
+        query = '{ tasks(orgSlug: "acme", projectSlug: "web") { title assignee { email } } }'
+        self.assertEqual(query_cost(query), 1 + cost.DEFAULT_LIST_SIZE)
+
+    def test_connection_first_sizes_the_edges(self):
+        query = '''
+            query($first: Int) {
+              tasksConnection(orgSlug: "acme", projectSlug: "web", first: $first) {
+                edges { node { title assignee { email } } }
+              }
+            }
+        '''
+        # The connection, its edges list, then node and assignee per edge
+        self.assertEqual(query_cost(query, {'first': 10}), 1 + 1 + 10 + 10)
+        self.assertEqual(query_cost(query, {'first': 100_000}), 1 + 1 + 2 * cost.MAX_LIST_SIZE)
+        self.assertEqual(query_cost(query), 1 + 1 + 2 * cost.DEFAULT_LIST_SIZE)
+
+    def test_weights(self):
+        with mock.patch.dict(cost.WEIGHTS, {'Query.projects': 7}):
+            self.assertEqual(query_cost('{ projects(orgSlug: "acme") { id } }'), 7)
+
+    def test_fragments_are_counted_once_per_use(self):
+        query = '''
+            { tasks(orgSlug: "acme", projectSlug: "web") { ...Assigned ... on TaskType { assignee { id } } } }
+            fragment Assigned on TaskType { assignee { email } }
+        '''
+        self.assertEqual(query_cost(query), 1 + 2 * cost.DEFAULT_LIST_SIZE)
+
+    def test_introspection_is_free(self):
+        self.assertEqual(query_cost('{ __schema { types { name fields { name } } } }'), 0)
+
+    def test_org_slugs(self):
+        document = parse('''
+            mutation($input: ProjectInput!) {
+              a: createProject(input: $input) { success }
+              b: createProject(input: {organizationSlug: "initech", name: "Web"}) { success }
+              c: bulkDeleteTasks(orgSlug: "globex", taskIds: []) { success }
+            }
+        ''')
+        slugs = cost.operation_org_slugs(document.definitions[0], {'input': {'organizationSlug': 'acme', 'name': 'Web'}})
+        self.assertEqual(slugs, {'acme', 'initech', 'globex'})
+
+    def test_budget_for(self):
+        budgets = {'ADMIN': 100, 'MEMBER': 50, 'DEFAULT': 10}
+        with mock.patch.dict(cost.BUDGETS, budgets, clear=True):
+            self.assertEqual(cost.budget_for(set()), 10)
+            self.assertEqual(cost.budget_for({'MEMBER'}), 50)
+            self.assertEqual(cost.budget_for({'ADMIN', 'MEMBER'}), 100)
+        with mock.patch.dict(cost.BUDGETS, {'ADMIN': None, 'DEFAULT': 10}, clear=True):
+            self.assertIsNone(cost.budget_for({'ADMIN'}))
+
+
+class DepthLimitTests(SimpleTestCase):
+    def errors(self, query):
+        return validate(graphql_schema, parse(query), [cost.DepthLimitRule])
+
+    def test_depth_counts_fields_through_fragments(self):
+        document = parse('''
+            { taskComments(orgSlug: "acme", taskId: "WEB-1") { ...Comment } }
+            fragment Comment on TaskCommentType { task { assignee { email } } }
+        ''')
+        fragments = {d.name.value: d for d in document.definitions[1:]}
+        self.assertEqual(cost.selection_depth(document.definitions[0].selection_set, fragments.get), 4)
+
+    def test_deep_operations_are_rejected(self):
+        query = 'query Deep { taskComments(orgSlug: "acme", taskId: "WEB-1") { task { assignee { email } } } }'
+        with mock.patch.object(cost, 'MAX_DEPTH', 4):
+            self.assertEqual(self.errors(query), [])
+        with mock.patch.object(cost, 'MAX_DEPTH', 3):
+            errors = self.errors(query)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0].message, "'Deep' is nested 4 levels deep; the maximum is 3")
+        self.assertEqual(errors[0].extensions, {'code': 'QUERY_TOO_DEEP'})
+
+    def test_no_limit(self):
+        with mock.patch.object(cost, 'MAX_DEPTH', None):
+            self.assertEqual(self.errors('{ taskComments(orgSlug: "acme", taskId: "WEB-1") { task { id } } }'), [])
+
+
+class SlugTests(TestCase):
+    def organization(self, name, slug=''):
+        return Organization.objects.create(name=name, slug=slug, contact_email=f'{name}@example.com')
+
+    def test_next_free_slug(self):
+        organizations = Organization.objects.all()
+        self.assertEqual(next_free_slug(organizations, 'acme'), 'acme')
+        for slug in ('acme', 'acme-1', 'acme-3', 'acme-corp', 'acme-2x'):
+            self.organization(slug, slug)
+        self.assertEqual(next_free_slug(organizations, 'acme'), 'acme-2')
+
+    def test_suffix_fits_max_length(self):
+        self.organization('Long', 'a' * 10)
+        self.assertEqual(next_free_slug(Organization.objects.all(), 'a' * 10, max_length=10), 'a' * 8 + '-1')
+
+    def test_save_picks_a_free_slug(self):
+        organization = self.organization('Acme Inc')
+        self.assertEqual(organization.slug, 'acme-inc')
+        slugs = [Project.objects.create(organization=organization, name='Web App').slug for _ in range(3)]
+        self.assertEqual(slugs, ['web-app', 'web-app-1', 'web-app-2'])
+
+    def test_hidden_rows_keep_their_slug(self):
+        organization = self.organization('Acme')
+        project = Project.objects.create(organization=organization, name='Web')
+        Project.objects.filter(pk=project.pk).update(deleted_at=timezone.now())
+        self.assertEqual(Project.objects.create(organization=organization, name='Web').slug, 'web-1')
+
+
+# Broadcasts go to an in-memory layer rather than another database connection
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class ResultCacheTests(TransactionTestCase):
+    """
+    Through the endpoint, whose resolvers run on other threads (and so other
+    connections): the data has to be committed for them to see it.
+    """
+    PROJECTS = 'query { projects(orgSlug: "acme") { name } }'
+
+    def setUp(self):
+        membership_cache.clear()
+        result_cache.get_cache().clear()
+        self.organization = Organization.objects.create(name='Acme', slug='acme', contact_email='acme@example.com')
+        self.project = Project.objects.create(organization=self.organization, name='Web', slug='web')
+        self.task = Task.objects.create(project=self.project, title='Task')
+        self.admin = self.user('admin@example.com', 'ADMIN')
+        self.member = self.user('member@example.com', 'MEMBER')
+
+    def user(self, email, role, organization=None):
+        user = User.objects.create_user(email=email, password='secret', name=email)
+        OrganizationMember.objects.create(user=user, organization=organization or self.organization, role=role)
+        return user
+
+    def post(self, query, user=None, **variables):
+        response = self.client.post(
+            '/graphql/', json.dumps({'query': query, 'variables': variables}), content_type='application/json',
+            HTTP_AUTHORIZATION=f'JWT {get_token(user or self.admin)}',
+        )
+        content = response.json()
+        self.assertNotIn('errors', content)
+        return content['data']
+
+    def project_names(self, user=None):
+        return [project['name'] for project in self.post(self.PROJECTS, user)['projects']]
+
+    def rename_quietly(self, name):
+        # A write that doesn't bump the version, so only a miss can see it
+        Project.objects.filter(pk=self.project.pk).update(name=name)
+
+    def assertCached(self, query=PROJECTS, user=None):
+        before = self.post(query, user)
+        self.rename_quietly(f'{self.project.name} (renamed)')
+        self.project.refresh_from_db()
+        self.assertEqual(self.post(query, user), before)
+
+    def test_mutations_invalidate(self):
+        comment = 'mutation { createTaskComment(orgSlug: "acme", taskId: "WEB-1", content: "Hi") { success } }'
+        mutations = [
+            'mutation { createProject(input: {organizationSlug: "acme", name: "Api", slug: "api"}) { success } }',
+            'mutation { updateProject(organizationSlug: "acme", projectSlug: "api", input: {description: "x"}) { success } }',
+            'mutation { deleteProject(organizationSlug: "acme", projectSlug: "api") { success } }',
+            'mutation { createTask(input: {organizationSlug: "acme", projectSlug: "web", title: "Two"}) { success } }',
+            'mutation { updateTask(orgSlug: "acme", taskId: "WEB-2", input: {status: "DONE"}) { success } }',
+            'mutation { deleteTask(orgSlug: "acme", taskId: "WEB-2") { success } }',
+            'mutation { bulkCreateTasks(orgSlug: "acme", projectSlug: "web", tasks: [{title: "Three"}]) { success } }',
+            'mutation { bulkUpdateTasks(orgSlug: "acme", tasks: [{taskId: "WEB-3", status: "DONE"}]) { success } }',
+            'mutation { bulkDeleteTasks(orgSlug: "acme", taskIds: ["WEB-3"]) { success } }',
+            comment,
+        ]
+        for mutation in mutations:
+            with self.subTest(mutation=mutation):
+                self.assertCached()
+                data = self.post(mutation)
+                self.assertTrue(next(iter(data.values()))['success'])
+                self.assertIn(self.project.name, self.project_names())
+
+    def test_bumps_from_other_processes_invalidate(self):
+        self.assertCached()
+        # What another worker's bump looks like from here: only the row changed
+        OrganizationVersion.objects.update_or_create(organization_id=self.organization.pk, defaults={'version': 10**6})
+        self.assertIn(self.project.name, self.project_names())
+
+    def test_membership_changes_invalidate(self):
+        self.assertCached()
+        self.user('new@example.com', 'MEMBER')
+        self.assertIn(self.project.name, self.project_names())
+
+    def test_other_organizations_keep_their_entries(self):
+        other = Organization.objects.create(name='Globex', slug='globex', contact_email='globex@example.com')
+        Project.objects.create(organization=other, name='Ops', slug='ops')
+        OrganizationMember.objects.create(user=self.admin, organization=other, role='ADMIN')
+        query = 'query { projects(orgSlug: "globex") { name } }'
+        self.post(query)
+        Project.objects.filter(organization=other).update(name='Ops (renamed)')
+        self.post('mutation { createTask(input: {organizationSlug: "acme", projectSlug: "web", title: "Two"}) { success } }')
+        self.assertEqual(self.post(query), {'projects': [{'name': 'Ops'}]})
+
+    def test_results_are_keyed_per_role(self):
+        # Adding a member bumps the version, so before anything is cached
+        other_member = self.user('other@example.com', 'MEMBER')
+        self.post(self.PROJECTS, self.admin)
+        self.rename_quietly('Renamed')
+        self.assertEqual(self.project_names(self.member), ['Renamed'])
+        self.assertEqual(self.project_names(self.admin), ['Web'])
+        # Members share an entry
+        self.assertEqual(self.project_names(other_member), ['Renamed'])
+
+    def test_uncacheable_operations(self):
+        other = Organization.objects.create(name='Globex', slug='globex', contact_email='globex@example.com')
+        OrganizationMember.objects.create(user=self.admin, organization=other, role='ADMIN')
+        queries = [
+            'query { a: projects(orgSlug: "acme") { name } b: projects(orgSlug: "globex") { name } }',
+            'query { projects(orgSlug: "acme") { name } me { email } }',
+            'query { ...Projects } fragment Projects on Query { projects(orgSlug: "acme") { name } }',
+        ]
+        for number, query in enumerate(queries):
+            with self.subTest(query=query):
+                self.post(query)
+                self.rename_quietly(f'Renamed {number}')
+                self.assertIn(f'Renamed {number}', json.dumps(self.post(query)))
+
+
+class PostgresChannelLayerTests(TransactionTestCase):
+    """Two layers stand in for two server processes; each has its own connections"""
+
+    def setUp(self):
+        self.layers = []
+
+    def layer(self, **kwargs):
+        layer = PostgresChannelLayer(poll_interval=0.05, **kwargs)
+        self.layers.append(layer)
+        return layer
+
+    async def close_layers(self):
+        for layer in self.layers:
+            await layer.close()
+            if layer._listener is not None:
+                await asyncio.to_thread(layer._listener.join, 5)
+            layer._executor.shutdown()
+
+    async def listening(self, *layers):
+        for layer in layers:
+            self.assertTrue(await asyncio.to_thread(layer._listening.wait, 5))
+
+    async def receive(self, layer, channel, timeout=5):
+        return await asyncio.wait_for(layer.receive(channel), timeout)
+
+    async def assertNothing(self, layer, channel):
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.receive(layer, channel, timeout=0.3)
+
+    async def test_groups_span_processes(self):
+        first, second = self.layer(), self.layer()
+        try:
+            one, two = await first.new_channel(), await second.new_channel()
+            await first.group_add('tasks', one)
+            await second.group_add('tasks', two)
+            await self.listening(first, second)
+
+            await first.group_send('tasks', {'type': 'task.created', 'id': 1})
+            self.assertEqual(await self.receive(first, one), {'type': 'task.created', 'id': 1})
+            self.assertEqual(await self.receive(second, two), {'type': 'task.created', 'id': 1})
+            # The sender's own listener doesn't deliver it a second time
+            await self.assertNothing(first, one)
+
+            await second.group_discard('tasks', two)
+            await first.group_send('tasks', {'type': 'task.created', 'id': 2})
+            self.assertEqual((await self.receive(first, one))['id'], 2)
+            await self.assertNothing(second, two)
+        finally:
+            await self.close_layers()
+
+    async def test_send_to_another_processes_channel(self):
+        first, second = self.layer(), self.layer()
+        try:
+            channel = await second.new_channel()
+            await self.listening(second)
+            await first.send(channel, {'type': 'hello'})
+            self.assertEqual(await self.receive(second, channel), {'type': 'hello'})
+        finally:
+            await self.close_layers()
+
+    async def test_big_payloads_spill_over(self):
+        first, second = self.layer(), self.layer()
+        try:
+            channel = await second.new_channel()
+            await second.group_add('tasks', channel)
+            await self.listening(second)
+            content = 'x' * (2 * NOTIFY_PAYLOAD_LIMIT)
+            await first.group_send('tasks', {'type': 'comment', 'content': content})
+            self.assertEqual(await self.receive(second, channel), {'type': 'comment', 'content': content})
+            self.assertEqual(first._spilled, 1)
+        finally:
+            await self.close_layers()
+
+    def test_spillover_table_exists(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('channels_spillover') IS NOT NULL")
+            self.assertTrue(cursor.fetchone()[0])
+
+    async def test_members_expire(self):
+        layer = self.layer(group_expiry=60)
+        try:
+            stale, fresh = await layer.new_channel(), await layer.new_channel()
+            await layer.group_add('tasks', stale)
+            await layer.group_add('tasks', fresh)
+            layer._groups['tasks'][stale] = time.time() - 61
+
+            await layer.group_send('tasks', {'type': 'ping'})
+            self.assertEqual(await self.receive(layer, fresh), {'type': 'ping'})
+            await self.assertNothing(layer, stale)
+            self.assertEqual(list(layer._groups['tasks']), [fresh])
+
+            # Adding a member again renews it
+            layer._groups['tasks'][fresh] = time.time() - 61
+            await layer.group_add('tasks', fresh)
+            await layer.group_send('tasks', {'type': 'ping'})
+            self.assertEqual(await self.receive(layer, fresh), {'type': 'ping'})
+
+            layer._groups['tasks'][fresh] = time.time() - 61
+            await layer.group_send('tasks', {'type': 'ping'})
+            self.assertNotIn('tasks', layer._groups)
+        finally:
+            await self.close_layers()
+
+
+class DocumentTests(SimpleTestCase):
+    QUERY = 'query Me { me { email } }'
+
+    def setUp(self):
+        documents.document_cache.clear()
+        documents.persisted_queries.clear()
+
+    def persisted(self, sha256, query=None):
+        return resolve_persisted_query(query, {'persistedQuery': {'version': 1, 'sha256Hash': sha256}})
+
+    def test_unknown_hash(self):
+        with self.assertRaisesMessage(PersistedQueryError, 'PersistedQueryNotFound') as raised:
+            self.persisted(query_hash(self.QUERY))
+        self.assertEqual(raised.exception.code, 'PERSISTED_QUERY_NOT_FOUND')
+
+    def test_register_then_send_the_hash(self):
+        sha256 = query_hash(self.QUERY)
+        self.assertEqual(self.persisted(sha256, self.QUERY), self.QUERY)
+        self.assertEqual(self.persisted(sha256), self.QUERY)
+
+    def test_mismatched_hash_is_not_registered(self):
+        sha256 = query_hash('query Other { me { id } }')
+        with self.assertRaisesMessage(PersistedQueryError, 'provided sha does not match query') as raised:
+            self.persisted(sha256, self.QUERY)
+        self.assertEqual(raised.exception.code, 'INVALID_SHA256_HASH')
+        with self.assertRaises(PersistedQueryError):
+            self.persisted(sha256)
+
+    def test_without_extension(self):
+        self.assertEqual(resolve_persisted_query(self.QUERY, None), self.QUERY)
+
+    def test_cache_hit_skips_validation(self):
+        with mock.patch('core.documents.validate', wraps=validate) as validating:
+            first = get_document(graphql_schema, self.QUERY)
+            second = get_document(graphql_schema, self.QUERY)
+        self.assertIs(first, second)
+        self.assertEqual(first.errors, [])
+        self.assertEqual(validating.call_count, 1)
+
+    def test_errors_are_cached(self):
+        with mock.patch('core.documents.validate', wraps=validate) as validating:
+            for _ in range(2):
+                self.assertEqual(len(get_document(graphql_schema, '{ nope }').errors), 1)
+                self.assertIsNone(get_document(graphql_schema, '{ broken').document)
+        self.assertEqual(validating.call_count, 1)
+
+    def test_depth_limit_applies_to_custom_rules(self):
+        with mock.patch.object(cost, 'MAX_DEPTH', 1):
+            errors = get_document(graphql_schema, self.QUERY, validation_rules=[]).errors
+        self.assertEqual([error.extensions['code'] for error in errors], ['QUERY_TOO_DEEP'])
+
+    def test_preload(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ts') as source:
+            source.write(f'export const ME = gql`{self.QUERY}`;\nexport const X = gql`${{fragment}} query X {{ me {{ id }} }}`;\n')
+            source.flush()
+            with mock.patch.dict(documents._settings, {'PRELOAD': [source.name]}), \
+                    mock.patch.dict(documents._preloaded, clear=True), \
+                    mock.patch.object(documents, '_preload_done', False):
+                documents.preload_persisted_queries(graphql_schema)
+                self.assertEqual(self.persisted(query_hash(self.QUERY)), self.QUERY)
+                apollo = documents.apollo_text(self.QUERY)
+                self.assertIn('__typename', apollo)
+                self.assertEqual(self.persisted(query_hash(apollo)), apollo)
+                # Validated up front too
+                self.assertIsNotNone(documents.document_cache.get(query_hash(apollo)))
+                # Templates with interpolations are skipped
+                self.assertEqual(len(set(documents._preloaded.values())), len(documents.query_variants(self.QUERY)))
+
+
+class MetricsTests(SimpleTestCase):
+    def setUp(self):
+        for histogram in metrics.REGISTRY:
+            histogram.clear()
+
+    def tearDown(self):
+        for histogram in metrics.REGISTRY:
+            histogram.clear()
+
+    def test_histogram_rendering(self):
+        histogram = metrics.Histogram('test_seconds', 'A test histogram.', ['operation'], (0.1, 1))
+        for value in (0.05, 0.1, 0.5, 5):
+            histogram.observe(('Get"Tasks\\\n',), value)
+        histogram.observe(('Other',), 0.2)
+        self.assertEqual(histogram.render().split('\n'), [
+            '# HELP test_seconds A test histogram.',
+            '# TYPE test_seconds histogram',
+            # Buckets are cumulative and include their upper bound
+            'test_seconds_bucket{operation="Get\\"Tasks\\\\\\n",le="0.1"} 2',
+            'test_seconds_bucket{operation="Get\\"Tasks\\\\\\n",le="1.0"} 3',
+            'test_seconds_bucket{operation="Get\\"Tasks\\\\\\n",le="+Inf"} 4',
+            'test_seconds_sum{operation="Get\\"Tasks\\\\\\n"} 5.65',
+            'test_seconds_count{operation="Get\\"Tasks\\\\\\n"} 4',
+            'test_seconds_bucket{operation="Other",le="0.1"} 0',
+            'test_seconds_bucket{operation="Other",le="1.0"} 1',
+            'test_seconds_bucket{operation="Other",le="+Inf"} 1',
+            'test_seconds_sum{operation="Other"} 0.2',
+            'test_seconds_count{operation="Other"} 1',
+        ])
+
+    def record(self, query, errors=None):
+        with metrics.track_operation() as tracked:
+            tracked.operation_ast = parse(query).definitions[0]
+            tracked.result = mock.Mock(errors=errors)
+
+    def test_operation_names_past_the_limit_are_other(self):
+        with mock.patch.object(metrics, 'MAX_OPERATIONS', 2), mock.patch.object(metrics, '_operation_names', set()):
+            for name in ('GetTasks', 'GetProjects', 'Unseen', 'GetTasks'):
+                self.record(f'query {name} {{ __typename }}')
+            self.record('mutation Another { __typename }', errors=['Boom'])
+        rendered = metrics.render()
+        for labels, count in [
+            ('operation="GetTasks",type="query",outcome="ok"', 2),
+            ('operation="GetProjects",type="query",outcome="ok"', 1),
+            ('operation="other",type="query",outcome="ok"', 1),
+            ('operation="other",type="mutation",outcome="error"', 1),
+        ]:
+            self.assertIn(f'graphql_operation_duration_seconds_count{{{labels}}} {count}\n', rendered)
+        self.assertNotIn('Unseen', rendered)
+
+    def test_endpoint(self):
+        metrics.operation_duration.observe(('GetTasks', 'query', 'ok'), 0.01)
+        response = self.client.get('/metrics')
+        self.assertEqual((response.status_code, response['Content-Type']), (200, metrics.CONTENT_TYPE))
+        self.assertIn('graphql_operation_duration_seconds_count{operation="GetTasks"', response.content.decode())
+
+        with mock.patch.object(metrics, 'TOKEN', 'secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+            self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'secret'}).status_code, 403)
+            self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code, 200)
+
+        with mock.patch.object(metrics, 'ENABLED', False):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
@@ -2,13 +2,20 @@
 from django.contrib import admin
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
 from channels.routing import URLRouter
 from channels.auth import AuthMiddlewareStack
 import projects.routing
+from projects.views import export_organization_view, import_tasks_view, task_import_status_view
+
+from .metrics import metrics_view
+from .views import AsyncGraphQLView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path('graphql/', csrf_exempt(AsyncGraphQLView.as_view(graphiql=True))),
+    path('metrics', metrics_view),
+    path('export/<slug:org_slug>/', export_organization_view),
+    path('import/<slug:org_slug>/tasks/', csrf_exempt(import_tasks_view)),
+    path('import/<slug:org_slug>/tasks/<int:import_id>/', task_import_status_view),
 ]
 
@@ -0,0 +1,220 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.db import connection, transaction
+from django.http import HttpResponseNotAllowed
+from django.http.response import HttpResponseBadRequest
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast, validate_schema
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.utils import get_http_authorization
+
+from projects.events import collect_broadcasts, send_broadcasts
+from users.authorization import get_membership
+from . import cost, metrics, result_cache
+from .documents import PersistedQueryError, get_document, resolve_persisted_query
+
+# Resolvers use the ORM, which is sync-only. They run on this pool so the
+# number of threads (and database connections) stays bounded however many
+# requests and sockets the event loop is holding.
+executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'GRAPHQL_EXECUTOR_WORKERS', 16),
+    thread_name_prefix='graphql',
+)
+
+
+class AsyncGraphQLView(GraphQLView):
+    """
+    GraphQLView served as an async view under ASGI.
+
+    Parsing, validation and execution run on the bounded ``executor``;
+    events that mutations ``broadcast()`` are collected meanwhile and awaited
+    on the event loop once execution is done, instead of each one blocking a
+    thread in ``async_to_sync``.
+
+    Parsed and validated documents are cached by query hash, and Apollo's
+    automatic persisted queries are supported (see ``core.documents``).
+    Results of read-only queries on one organization are cached per org
+    version and role (see ``core.result_cache``). Operations over the cost
+    budget of the caller's role are rejected before that (see ``core.cost``).
+    """
+
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        run = database_sync_to_async(super().dispatch, thread_sensitive=False, executor=executor)
+        with collect_broadcasts() as pending:
+            response = await run(request, *args, **kwargs)
+        await send_broadcasts(pending)
+        return response
+
+    @staticmethod
+    def get_extensions(request, data):
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if extensions and isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        return extensions if isinstance(extensions, dict) else None
+
+    @staticmethod
+    def authenticate(request):
+        """
+        The request's user, authenticating the JWT now rather than in the
+        graphene middleware so cached results can be served without executing
+        """
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user
+        if get_http_authorization(request) is None:
+            return None
+        try:
+            user = authenticate(request=request)
+        except JSONWebTokenError:
+            return None  # Execution reports the error as usual
+        if user is not None:
+            request.user = user
+        return user
+
+    def get_result_cache_key(self, request, operation_ast, query, operation_name, variables):
+        org_slug = result_cache.cacheable_org_slug(operation_ast, variables)
+        if org_slug is None:
+            return None
+        user = self.authenticate(request)
+        if user is None:
+            return None
+        membership = get_membership(user, org_slug, request)
+        if membership is None:
+            return None
+        return result_cache.result_key(
+            query, operation_name, variables, membership.organization.pk, membership.role
+        )
+
+    def check_cost(self, request, schema, document, operation_ast, variables):
+        """
+        A GraphQLError if the operation's static cost is over the budget of
+        the caller's role in the organizations it names, else None
+        """
+        user = self.authenticate(request)
+        roles = set()
+        for org_slug in cost.operation_org_slugs(operation_ast, variables):
+            membership = get_membership(user, org_slug, request)
+            if membership is not None:
+                roles.add(membership.role)
+        budget = cost.budget_for(roles)
+        if budget is None:
+            return None
+        total = cost.operation_cost(schema, document, operation_ast, variables)
+        if total <= budget:
+            return None
+        return GraphQLError(
+            f"Query cost {total} exceeds the budget of {budget}; request fewer items or nested fields",
+            extensions={'code': 'QUERY_TOO_EXPENSIVE', 'cost': total, 'budget': budget},
+        )
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        with metrics.track_operation() as tracked:
+            tracked.result = self._execute_graphql_request(
+                request, data, query, variables, operation_name, show_graphiql, tracked
+            )
+        return tracked.result
+
+    def _execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql, tracked
+    ):
+        # Same flow as GraphQLView, with parse + validate served from the cache
+        schema = self.schema.graphql_schema
+
+        try:
+            query = resolve_persisted_query(query, self.get_extensions(request, data))
+        except PersistedQueryError as e:
+            return ExecutionResult(data=None, errors=[e.as_graphql_error()])
+
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        document, validation_errors = get_document(schema, query, self.validation_rules)
+        if document is None:
+            return ExecutionResult(errors=validation_errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+        tracked.operation_ast = operation_ast
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        if validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors)
+
+        if operation_ast is not None:
+            cost_error = self.check_cost(request, schema, document, operation_ast, variables)
+            if cost_error is not None:
+                return ExecutionResult(data=None, errors=[cost_error])
+
+        cache_key = None
+        if operation_ast is not None and operation_ast.operation == OperationType.QUERY:
+            cache_key = self.get_result_cache_key(request, operation_ast, query, operation_name, variables)
+            if cache_key is not None:
+                data = result_cache.get_cache().get(cache_key)
+                if data is not None:
+                    tracked.cached = True
+                    return ExecutionResult(data=data)
+
+        try:
+            execute_options = {
+                "root_value": self.get_root_value(request),
+                "context_value": self.get_context(request),
+                "variable_values": variables,
+                "operation_name": operation_name,
+                "middleware": self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                execute_options["execution_context_class"] = self.execution_context_class
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            result = execute(schema, document, **execute_options)
+            if cache_key is not None and not result.errors:
+                result_cache.get_cache().set(cache_key, result.data, result_cache.TIMEOUT)
+            return result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+from core.documents import preload_persisted_queries
+from core.schema import schema
+
+# Register the frontend's persisted queries now rather than on the first request
+preload_persisted_queries(schema.graphql_schema)
@@ -0,0 +1,45 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs import queue
+from jobs.worker import CONCURRENCY, POLL_INTERVAL, WorkerPool, WorkerProcess
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs from the jobs table until SIGTERM or Ctrl-C, which let running jobs "
+        "finish first. Start as many of these, on as many machines, as you like."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help="Jobs run at the same time")
+        parser.add_argument(
+            '--pool', choices=['thread', 'process'], default='thread',
+            help="Run them on threads of this process, or in --concurrency forked processes",
+        )
+        parser.add_argument('--threads', type=int, default=1, help="Threads in each process of --pool process")
+        parser.add_argument(
+            '--poll-interval', type=float, default=POLL_INTERVAL,
+            help="Seconds between looks for due jobs when no notification arrives",
+        )
+        parser.add_argument('--burst', action='store_true', help="Exit once no job is ready to run")
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['threads'] < 1:
+            raise CommandError("--concurrency and --threads must be at least 1")
+        if not queue.handler_names():
+            raise CommandError("No job handlers are registered")
+
+        if options['pool'] == 'process':
+            runner = WorkerPool(
+                options['concurrency'], options['threads'], options['poll_interval'], options['burst'], self.log,
+            )
+        else:
+            runner = WorkerProcess(options['concurrency'], options['poll_interval'], options['burst'], self.log)
+        signal.signal(signal.SIGTERM, runner.shutdown)
+        signal.signal(signal.SIGINT, runner.shutdown)
+        runner.run()
+
+    def log(self, message):
+        self.stdout.write(message)
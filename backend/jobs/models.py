@@ -0,0 +1,62 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+from organizations.models import Organization
+from users.models import User
+
+
+class Job(models.Model):
+    """
+    A unit of background work, run by ``manage.py run_workers`` (see
+    ``jobs.worker``). Workers claim queued jobs with ``FOR UPDATE SKIP
+    LOCKED``, so any number of them share the table without a broker.
+    """
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    ]
+
+    # Registered handler, e.g. "projects.delete_project"
+    name = models.CharField(max_length=100)
+    # Keyword arguments of the handler
+    args = models.JSONField(default=dict, blank=True)
+    # Whose job it is, for the job status query
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    # Higher runs first
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # Not claimed before this; pushed back after each failed attempt
+    run_at = models.DateTimeField(default=timezone.now)
+    # The process running it (or that ran it last), which refreshes
+    # heartbeat_at while the job runs
+    locked_by = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    # Whatever the handler reports while it runs, and what it returned
+    progress = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    # Why the last attempt failed
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The claim query: ready jobs by priority, then age
+            models.Index(
+                models.F('priority').desc(), 'run_at', 'id',
+                condition=Q(status='QUEUED'), name='job_queued_idx',
+            ),
+            # Running jobs whose worker stopped sending heartbeats
+            models.Index(fields=['heartbeat_at'], condition=Q(status='RUNNING'), name='job_running_idx'),
+            models.Index(fields=['organization', '-created_at'], name='job_org_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job {self.pk} {self.name}: {self.status}"
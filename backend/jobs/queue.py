@@ -0,0 +1,158 @@
+import random
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from .models import Job
+
+_settings = getattr(settings, 'JOBS', {})
+MAX_ATTEMPTS = _settings.get('MAX_ATTEMPTS', 5)
+# Attempt n is retried after BACKOFF_BASE * 2 ** (n - 1) seconds, at most
+# BACKOFF_MAX, plus up to 10% so failures don't retry in lockstep
+BACKOFF_BASE = _settings.get('BACKOFF_BASE', 10)
+BACKOFF_MAX = _settings.get('BACKOFF_MAX', 3600)
+# A running job whose heartbeat is older than this many seconds lost its worker
+LEASE = _settings.get('LEASE', 60)
+# Finished jobs are kept this many days
+KEEP_DAYS = _settings.get('KEEP_DAYS', 7)
+
+# enqueue() notifies this channel so idle workers claim right away
+NOTIFY_CHANNEL = 'jobs'
+
+Handler = namedtuple('Handler', ['func', 'max_attempts', 'priority'])
+_handlers = {}
+
+
+def register(name, max_attempts=MAX_ATTEMPTS, priority=0):
+    """
+    Register the decorated function as the handler of jobs called ``name``.
+    It is called as ``func(job, **job.args)`` and may return a JSON-able
+    result. It must be safe to run again after a failed or interrupted try.
+    """
+    def decorator(func):
+        _handlers[name] = Handler(func, max_attempts, priority)
+        return func
+    return decorator
+
+
+def get_handler(name):
+    return _handlers.get(name)
+
+
+def handler_names():
+    return sorted(_handlers)
+
+
+def enqueue(name, organization=None, user=None, priority=None, run_at=None, **args):
+    """
+    Queue a job for ``name``'s handler with ``args``. Inside a transaction
+    workers only see it, and are only woken, once the transaction commits.
+    """
+    handler = _handlers.get(name)
+    if handler is None:
+        raise ValueError(f"No job handler registered as {name!r}")
+    job = Job.objects.create(
+        name=name,
+        args=args,
+        organization=organization,
+        created_by=user,
+        priority=handler.priority if priority is None else priority,
+        max_attempts=handler.max_attempts,
+        run_at=run_at or timezone.now(),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, '')", [NOTIFY_CHANNEL])
+    return job
+
+
+CLAIM_SQL = """
+    UPDATE jobs_job
+    SET status = 'RUNNING', attempts = attempts + 1, locked_by = %s, heartbeat_at = now(), started_at = now()
+    WHERE id = (
+        SELECT id FROM jobs_job
+        WHERE status = 'QUEUED' AND run_at <= now() AND name = ANY(%s)
+        ORDER BY priority DESC, run_at, id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id
+"""
+
+
+def claim(worker_id):
+    """
+    The most urgent ready job this process has a handler for, now RUNNING
+    and locked by ``worker_id``, or None. Rows other workers are claiming
+    are skipped rather than waited for.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(CLAIM_SQL, [worker_id, handler_names()])
+        row = cursor.fetchone()
+    return Job.objects.get(pk=row[0]) if row else None
+
+
+def _owned(job):
+    # A job taken back after its lease expired belongs to someone else now
+    return Job.objects.filter(pk=job.pk, status='RUNNING', locked_by=job.locked_by)
+
+
+def report_progress(job, **progress):
+    """Merge ``progress`` into what the job status query shows while ``job`` runs"""
+    job.progress = {**job.progress, **progress}
+    _owned(job).update(progress=job.progress)
+
+
+def complete(job, result=None):
+    job.status = 'COMPLETED'
+    job.result = result
+    job.error = ''
+    job.finished_at = timezone.now()
+    _owned(job).update(status=job.status, result=result, error='', finished_at=job.finished_at)
+    return job
+
+
+def backoff(attempt):
+    delay = min(BACKOFF_BASE * 2 ** (attempt - 1), BACKOFF_MAX)
+    return delay * (1 + random.random() / 10)
+
+
+def fail(job, error):
+    """Queue ``job`` again after a backoff, or mark it FAILED once it used up its attempts"""
+    job.error = error
+    if job.attempts >= job.max_attempts:
+        job.status = 'FAILED'
+        job.finished_at = timezone.now()
+    else:
+        job.status = 'QUEUED'
+        job.run_at = timezone.now() + timedelta(seconds=backoff(job.attempts))
+    _owned(job).update(status=job.status, error=error, run_at=job.run_at, finished_at=job.finished_at)
+    return job
+
+
+def heartbeat(worker_id):
+    """Extend the lease of every job ``worker_id`` is running"""
+    return Job.objects.filter(status='RUNNING', locked_by=worker_id).update(heartbeat_at=Now())
+
+
+def reclaim_stale():
+    """Queue again (or fail, without attempts left) running jobs whose worker stopped sending heartbeats"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            UPDATE jobs_job
+            SET status = CASE WHEN attempts >= max_attempts THEN 'FAILED' ELSE 'QUEUED' END,
+                finished_at = CASE WHEN attempts >= max_attempts THEN now() END,
+                error = 'The worker running the job stopped', run_at = now()
+            WHERE status = 'RUNNING' AND heartbeat_at < now() - make_interval(secs => %s)
+        """, [LEASE])
+        return cursor.rowcount
+
+
+def prune():
+    """Delete jobs that finished more than KEEP_DAYS ago"""
+    cutoff = timezone.now() - timedelta(days=KEEP_DAYS)
+    deleted, _ = Job.objects.filter(status__in=['COMPLETED', 'FAILED'], finished_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,47 @@
+import graphene
+from graphene.types.generic import GenericScalar
+from graphene_django import DjangoObjectType
+from graphql_jwt.decorators import login_required
+
+from users.authorization import require_membership
+from .models import Job
+
+# Most jobs the jobs query returns
+MAX_JOBS = 100
+
+
+# Job Type
+class JobType(DjangoObjectType):
+    progress = GenericScalar()
+    result = GenericScalar()
+
+    class Meta:
+        model = Job
+        fields = (
+            "id", "name", "status", "priority", "attempts", "max_attempts", "run_at", "progress", "result",
+            "error", "created_at", "started_at", "finished_at",
+        )
+
+
+class Query(graphene.ObjectType):
+    # Status of one background job, e.g. the one a mutation returned
+    job = graphene.Field(JobType, org_slug=graphene.String(required=True), id=graphene.ID(required=True))
+
+    # The organization's latest jobs, newest first
+    jobs = graphene.List(JobType, org_slug=graphene.String(required=True), status=graphene.String(), first=graphene.Int())
+
+    @login_required
+    def resolve_job(self, info, org_slug, id):
+        # Check if user has access to this organization
+        organization = require_membership(info, org_slug).organization
+        return Job.objects.filter(organization=organization, pk=id).first()
+
+    @login_required
+    def resolve_jobs(self, info, org_slug, status=None, first=None):
+        # Check if user has access to this organization
+        organization = require_membership(info, org_slug).organization
+        jobs = Job.objects.filter(organization=organization)
+        if status:
+            jobs = jobs.filter(status=status)
+        first = MAX_JOBS if first is None else max(0, min(first, MAX_JOBS))
+        return jobs.order_by('-created_at', '-id')[:first]
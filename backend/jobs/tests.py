@@ -0,0 +1,113 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from . import queue
+from .models import Job
+
+
+@queue.register('tests.noop', max_attempts=3)
+def noop(job, **args):
+    return args
+
+
+@queue.register('tests.urgent', priority=10)
+def urgent(job, **args):
+    return args
+
+
+def ago(**kwargs):
+    # The database's now() is when the test's transaction began, so jobs are
+    # made due (and heartbeats stale) well before that
+    return timezone.now() - timedelta(**kwargs)
+
+
+class QueueTests(TestCase):
+    def enqueue(self, name='tests.noop', **kwargs):
+        kwargs.setdefault('run_at', ago(hours=1))
+        return queue.enqueue(name, **kwargs)
+
+    def test_enqueue_uses_the_handler_defaults(self):
+        job = self.enqueue(value=1)
+        self.assertEqual((job.status, job.args, job.max_attempts, job.priority), ('QUEUED', {'value': 1}, 3, 0))
+        self.assertEqual(self.enqueue('tests.urgent').priority, 10)
+        with self.assertRaises(ValueError):
+            queue.enqueue('tests.missing')
+
+    def test_claim_order(self):
+        later = self.enqueue(run_at=ago(minutes=5))
+        first = self.enqueue(run_at=ago(minutes=10))
+        urgent = self.enqueue('tests.urgent', run_at=ago(minutes=1))
+        self.enqueue(run_at=timezone.now() + timedelta(hours=1))
+        Job.objects.create(name='tests.unregistered', run_at=ago(hours=1))
+
+        claimed = [queue.claim('worker-1') for _ in range(4)]
+        self.assertEqual([job.pk if job else None for job in claimed], [urgent.pk, first.pk, later.pk, None])
+        job = claimed[0]
+        self.assertEqual((job.status, job.attempts, job.locked_by), ('RUNNING', 1, 'worker-1'))
+        self.assertIsNotNone(job.heartbeat_at)
+
+    def test_complete(self):
+        self.enqueue()
+        job = queue.complete(queue.claim('worker-1'), {'done': True})
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.error), ('COMPLETED', {'done': True}, ''))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_fail_retries_with_backoff_then_gives_up(self):
+        self.enqueue()
+        for attempt in (1, 2):
+            job = queue.claim('worker-1')
+            before = timezone.now()
+            queue.fail(job, 'Boom')
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.error), ('QUEUED', attempt, 'Boom'))
+            self.assertGreaterEqual(job.run_at, before + timedelta(seconds=queue.BACKOFF_BASE * 2 ** (attempt - 1)))
+            # Due again, as if the backoff had passed
+            Job.objects.filter(pk=job.pk).update(run_at=ago(hours=1))
+
+        job = queue.fail(queue.claim('worker-1'), 'Boom')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('FAILED', 3))
+        self.assertIsNotNone(job.finished_at)
+        self.assertIsNone(queue.claim('worker-1'))
+
+    def test_backoff(self):
+        with mock.patch('jobs.queue.random.random', return_value=0):
+            self.assertEqual(queue.backoff(1), queue.BACKOFF_BASE)
+            self.assertEqual(queue.backoff(3), queue.BACKOFF_BASE * 4)
+            self.assertEqual(queue.backoff(100), queue.BACKOFF_MAX)
+        with mock.patch('jobs.queue.random.random', return_value=0.999):
+            self.assertLess(queue.backoff(100), queue.BACKOFF_MAX * 1.1)
+
+    def test_reclaim_stale(self):
+        self.enqueue()
+        self.enqueue()
+        self.enqueue()
+        stale, spent, alive = [queue.claim('worker-1') for _ in range(3)]
+        Job.objects.filter(pk__in=[stale.pk, spent.pk]).update(heartbeat_at=ago(seconds=queue.LEASE + 3600))
+        Job.objects.filter(pk=spent.pk).update(attempts=3)
+        Job.objects.filter(pk=alive.pk).update(heartbeat_at=timezone.now())
+
+        self.assertEqual(queue.reclaim_stale(), 2)
+        stale.refresh_from_db()
+        spent.refresh_from_db()
+        alive.refresh_from_db()
+        self.assertEqual((stale.status, stale.error), ('QUEUED', 'The worker running the job stopped'))
+        self.assertEqual(spent.status, 'FAILED')
+        self.assertEqual(alive.status, 'RUNNING')
+
+        # The worker that lost the job can no longer record its outcome
+        queue.complete(stale, {'late': True})
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.result), ('QUEUED', None))
+
+    def test_heartbeat(self):
+        self.enqueue()
+        job = queue.claim('worker-1')
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=ago(hours=1))
+        self.assertEqual(queue.heartbeat('worker-2'), 0)
+        self.assertEqual(queue.heartbeat('worker-1'), 1)
+        self.assertEqual(queue.reclaim_stale(), 0)
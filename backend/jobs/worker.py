@@ -0,0 +1,228 @@
+"""
+Job workers: threads that claim jobs from the jobs table and run their
+handlers, one job at a time each.
+
+Every worker process runs WorkerProcess: the worker threads, a thread that
+LISTENs for enqueue() notifications to wake idle workers, and one that
+renews the heartbeat of the jobs the process runs, takes back jobs whose
+worker died and prunes old ones. WorkerPool forks several such processes.
+"""
+import logging
+import multiprocessing
+import os
+import select
+import signal
+import socket
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db import DatabaseError, connection, connections
+
+from . import queue
+
+logger = logging.getLogger(__name__)
+
+_settings = getattr(settings, 'JOBS', {})
+# Worker threads (or processes) run_workers starts
+CONCURRENCY = _settings.get('CONCURRENCY', 4)
+# Idle workers look for due jobs this often even without a notification,
+# which is what picks up retries once their backoff ends
+POLL_INTERVAL = _settings.get('POLL_INTERVAL', 5)
+# How often running jobs' heartbeats are renewed; well under queue.LEASE
+HEARTBEAT_INTERVAL = _settings.get('HEARTBEAT_INTERVAL', 10)
+PRUNE_INTERVAL = 3600
+
+
+def _log(message):
+    logger.info(message)
+
+
+class Worker:
+    """Claim and run jobs on the calling thread until ``stop`` is set, or the queue is empty in burst mode"""
+
+    def __init__(self, worker_id, stop, wakeup, poll_interval=POLL_INTERVAL, burst=False, log=_log):
+        self.worker_id = worker_id
+        self.stop = stop
+        self.wakeup = wakeup
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.log = log
+
+    def run(self):
+        try:
+            while not self.stop.is_set():
+                try:
+                    job = queue.claim(self.worker_id)
+                    if job is not None:
+                        self.execute(job)
+                        continue
+                except DatabaseError as e:
+                    # A job whose outcome couldn't be saved is taken back once its lease expires
+                    self.log(f"Lost the database connection ({e}); retrying in {self.poll_interval}s")
+                    connection.close()
+                    self.stop.wait(self.poll_interval)
+                    continue
+                if self.burst:
+                    break
+                with self.wakeup:
+                    self.wakeup.wait(self.poll_interval)
+        finally:
+            connection.close()
+
+    def execute(self, job):
+        handler = queue.get_handler(job.name)
+        started = time.perf_counter()
+        try:
+            result = handler.func(job, **job.args)
+        except Exception as e:
+            logger.debug(traceback.format_exc())
+            job = queue.fail(job, f"{type(e).__name__}: {e}")
+            outcome = 'failed' if job.status == 'FAILED' else f"failed, retry at {job.run_at:%H:%M:%S}"
+            self.log(f"Job {job.pk} {job.name} {outcome} (attempt {job.attempts}/{job.max_attempts}): {job.error}")
+        else:
+            queue.complete(job, result)
+            self.log(f"Job {job.pk} {job.name} completed in {time.perf_counter() - started:.1f}s")
+        finally:
+            # As between requests: drop a connection the handler broke
+            connection.close_if_unusable_or_obsolete()
+
+
+class WorkerProcess:
+    """Run ``threads`` workers in this process, plus its listener and housekeeping threads"""
+
+    def __init__(self, threads=CONCURRENCY, poll_interval=POLL_INTERVAL, burst=False, log=_log):
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.log = log
+        self.stop = threading.Event()
+        self.wakeup = threading.Condition()
+
+    def run(self):
+        self.log(f"Worker {self.worker_id} running {self.threads} threads for {', '.join(queue.handler_names())}")
+        workers = [
+            threading.Thread(
+                target=Worker(self.worker_id, self.stop, self.wakeup, self.poll_interval, self.burst, self.log).run,
+                name=f'job-worker-{i}',
+            )
+            for i in range(self.threads)
+        ]
+        helpers = [threading.Thread(target=self.housekeep, name='job-housekeeping', daemon=True)]
+        if not self.burst:
+            helpers.append(threading.Thread(target=self.listen, name='job-listener', daemon=True))
+        for thread in helpers + workers:
+            thread.start()
+        # Join with a timeout so signal handlers get to run on this thread
+        for thread in workers:
+            while thread.is_alive():
+                thread.join(1)
+        self.shutdown()
+        for thread in helpers:
+            thread.join(self.poll_interval)
+        self.log(f"Worker {self.worker_id} stopped")
+
+    def shutdown(self, *args):
+        """Let running jobs finish, then stop; installed as the SIGTERM and SIGINT handler"""
+        self.stop.set()
+        with self.wakeup:
+            self.wakeup.notify_all()
+
+    def housekeep(self):
+        last_prune = 0
+        try:
+            while not self.stop.is_set():
+                try:
+                    queue.heartbeat(self.worker_id)
+                    reclaimed = queue.reclaim_stale()
+                    if reclaimed:
+                        self.log(f"Took back {reclaimed} jobs from workers that stopped")
+                        with self.wakeup:
+                            self.wakeup.notify_all()
+                    if time.monotonic() - last_prune > PRUNE_INTERVAL:
+                        queue.prune()
+                        last_prune = time.monotonic()
+                except DatabaseError as e:
+                    self.log(f"Job housekeeping failed ({e})")
+                    connection.close()
+                self.stop.wait(HEARTBEAT_INTERVAL)
+        finally:
+            connection.close()
+
+    def listen(self):
+        """Wake idle workers on enqueue() notifications; they fall back to polling while this is down"""
+        try:
+            while not self.stop.is_set():
+                try:
+                    connection.ensure_connection()
+                    pg = connection.connection
+                    with pg.cursor() as cursor:
+                        cursor.execute(f'LISTEN "{queue.NOTIFY_CHANNEL}"')
+                    while not self.stop.is_set():
+                        if select.select([pg], [], [], 1) == ([], [], []):
+                            continue
+                        pg.poll()
+                        if pg.notifies:
+                            pg.notifies.clear()
+                            with self.wakeup:
+                                self.wakeup.notify_all()
+                except Exception as e:
+                    self.log(f"Job listener lost its connection ({e})")
+                    connection.close()
+                    self.stop.wait(self.poll_interval)
+        finally:
+            connection.close()
+
+
+def _run_child(threads, poll_interval, burst, log):
+    process = WorkerProcess(threads, poll_interval, burst, log)
+    signal.signal(signal.SIGTERM, process.shutdown)
+    signal.signal(signal.SIGINT, process.shutdown)
+    process.run()
+
+
+class WorkerPool:
+    """
+    Fork ``processes`` worker processes of ``threads`` workers each and
+    restart any that dies, until SIGTERM or SIGINT. In burst mode they are
+    not restarted, and the pool returns once all of them have exited.
+    """
+
+    def __init__(self, processes, threads=1, poll_interval=POLL_INTERVAL, burst=False, log=_log):
+        self.processes = processes
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.log = log
+        self.stopping = False
+        self.children = []
+
+    def spawn(self):
+        # Children must not inherit this process's database connections
+        connections.close_all()
+        child = multiprocessing.get_context('fork').Process(
+            target=_run_child, args=(self.threads, self.poll_interval, self.burst, self.log), name='job-worker',
+        )
+        child.start()
+        return child
+
+    def run(self):
+        self.children = [self.spawn() for _ in range(self.processes)]
+        while self.children:
+            for child in list(self.children):
+                child.join(1)
+                if child.is_alive():
+                    continue
+                self.children.remove(child)
+                if child.exitcode and not self.stopping:
+                    self.log(f"Worker process {child.pid} exited with {child.exitcode}")
+                if not (self.stopping or self.burst):
+                    self.children.append(self.spawn())
+
+    def shutdown(self, *args):
+        self.stopping = True
+        for child in self.children:
+            if child.is_alive():
+                child.terminate()
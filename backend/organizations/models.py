@@ -1,6 +1,7 @@
 # organizations/models.py
 from django.db import models
 from django.core.exceptions import ValidationError
+from core.slugs import save_with_unique_slug
 
 class Organization(models.Model):
     name = models.CharField(max_length=100, unique=True)  # Add unique
@@ -11,14 +12,28 @@ class Organization(models.Model):
     def clean(self):
         if Organization.objects.filter(name=self.name).exclude(id=self.id).exists():
             raise ValidationError({'name': 'Organization with this name already exists.'})
-        if Organization.objects.filter(slug=self.slug).exclude(id=self.id).exists():
+        if self.slug and Organization.objects.filter(slug=self.slug).exclude(id=self.id).exists():
             raise ValidationError({'slug': 'Organization with this slug already exists.'})
         if Organization.objects.filter(contact_email=self.contact_email).exclude(id=self.id).exists():
             raise ValidationError({'email': 'Organization with this email already exists.'})
     
     def save(self, *args, **kwargs):
         self.clean()
+        if not self.slug:
+            save_with_unique_slug(self, self.name, lambda: super(Organization, self).save(*args, **kwargs))
+            return
         super().save(*args, **kwargs)
     
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+
+class OrganizationVersion(models.Model):
+    """
+    Bumped after every write to an organization's data. Cached GraphQL
+    results are keyed by it (see ``core.result_cache``), and keeping it in
+    the database lets every worker process see a bump at once. No foreign
+    key: the row may be bumped after the organization is deleted.
+    """
+    organization_id = models.BigIntegerField(primary_key=True)
+    version = models.BigIntegerField(default=0)
@@ -17,7 +17,7 @@ class Query(graphene.ObjectType):
 
 class OrganizationInput(graphene.InputObjectType):
     name = graphene.String(required=True)
-    slug = graphene.String(required=True)
+    slug = graphene.String()  # Generated from the name when omitted
     contact_email = graphene.String(required=True)
 
 class CreateOrganization(graphene.Mutation):
@@ -31,7 +31,7 @@ class CreateOrganization(graphene.Mutation):
     def mutate(self, info, input):
         try:
             # Check for existing data
-            if Organization.objects.filter(slug=input.slug).exists():
+            if input.slug and Organization.objects.filter(slug=input.slug).exists():
                 return CreateOrganization(success=False, errors=["Organization with this slug already exists"])
             if Organization.objects.filter(name=input.name).exists():
                 return CreateOrganization(success=False, errors=["Organization with this name already exists"])
@@ -40,7 +40,7 @@ class CreateOrganization(graphene.Mutation):
             
             organization = Organization.objects.create(
                 name=input.name,
-                slug=input.slug,
+                slug=input.slug or "",
                 contact_email=input.contact_email
             )
             return CreateOrganization(organization=organization, success=True, errors=[])
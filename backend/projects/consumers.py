@@ -1,11 +1,31 @@
 import json
 import logging
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
 
+from .events import comment_event, project_tasks_group, task_comments_group
+
 logger = logging.getLogger(__name__)
 
+# Comments per frame when replaying a backlog on (re)connect
+REPLAY_CHUNK_SIZE = 100
+
+def comment_frame(comment):
+    """Client-facing shape of a comment, shared by live events and replay"""
+    return {
+        'id': comment['id'],
+        'seq': comment['seq'],
+        'content': comment['content'],
+        'author': {
+            'email': comment['author_email'],
+            'id': comment['author_id']
+        },
+        'timestamp': comment['timestamp'],
+        'task_id': comment['task_id']
+    }
+
 class TaskCommentConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         logger.info("=== WebSocket Connection Attempt ===")
@@ -15,7 +35,7 @@ class TaskCommentConsumer(AsyncWebsocketConsumer):
         try:
             self.org_slug = self.scope['url_route']['kwargs']['org_slug']
             self.task_id = self.scope['url_route']['kwargs']['task_id'].upper()
-            self.room_group_name = f'task_comments_{self.org_slug}_{self.task_id}'
+            self.room_group_name = task_comments_group(self.org_slug, self.task_id)
 
             logger.info(f"Org slug: {self.org_slug}, Task ID: {self.task_id}")
 
@@ -26,7 +46,6 @@ class TaskCommentConsumer(AsyncWebsocketConsumer):
             logger.info(f"Is anonymous: {user.is_anonymous if user else 'No user'}")
 
             if not user or user.is_anonymous:
-                print(user,"user")
                 logger.warning("Rejecting connection: Anonymous user")
                 await self.close(code=4001)
                 return
@@ -56,6 +75,11 @@ class TaskCommentConsumer(AsyncWebsocketConsumer):
                 'task_id': self.task_id
             }))
 
+            # The group is joined first, so live events raised during the replay
+            # queue up behind it and are de-duplicated by seq in comment_message
+            self.last_seq = None
+            await self.replay_backlog()
+
         except Exception as e:
             logger.error(f"Error in connect method: {e}")
             await self.close(code=4000)
@@ -71,6 +95,9 @@ class TaskCommentConsumer(AsyncWebsocketConsumer):
     async def receive(self, text_data):
         try:
             text_data_json = json.loads(text_data)
+            if text_data_json.get('type') == 'ping':
+                await self.send(text_data=json.dumps({'type': 'pong'}))
+                return
             message = text_data_json.get('message', '').strip()
             user = self.scope["user"]
 
@@ -88,15 +115,7 @@ class TaskCommentConsumer(AsyncWebsocketConsumer):
             # Send message to room group
             await self.channel_layer.group_send(
                 self.room_group_name,
-                {
-                    'type': 'comment_message',
-                    'id': comment.id,
-                    'content': comment.content,
-                    'author_email': user.email,
-                    'author_id': user.id,
-                    'timestamp': comment.timestamp.isoformat(),
-                    'task_id': self.task_id
-                }
+                comment_event(comment, self.org_slug, self.task_id, author=user)
             )
         except Exception as e:
             logger.error(f"Error processing message: {e}")
@@ -105,44 +124,102 @@ class TaskCommentConsumer(AsyncWebsocketConsumer):
             }))
 
     async def comment_message(self, event):
-        await self.send(text_data=json.dumps({
-            'id': event['id'],
-            'content': event['content'],
-            'author': {
-                'email': event['author_email'],
-                'id': event['author_id']
-            },
-            'timestamp': event['timestamp'],
-            'task_id': event['task_id']
-        }))
+        if self.last_seq is not None:
+            if event['seq'] <= self.last_seq:
+                return  # Already sent during replay
+            self.last_seq = event['seq']
+        await self.send(text_data=json.dumps(comment_frame(event)))
+
+    async def replay_backlog(self):
+        """
+        Stream comments the client missed, in bounded chunks, before live events.
+
+        ``?since=<comment id>`` is the last comment the client saw;
+        ``?since_seq=<seq>`` may be sent instead. Without either nothing is
+        replayed and the client is expected to load history over GraphQL.
+        """
+        params = parse_qs(self.scope.get('query_string', b'').decode())
+        since = params.get('since', [None])[0]
+        since_seq = params.get('since_seq', [None])[0]
+        if since is None and since_seq is None:
+            return
+
+        try:
+            if since_seq is not None:
+                after_seq = int(since_seq)
+            else:
+                after_seq = await self.seq_for_comment(int(since))
+        except ValueError:
+            await self.send(text_data=json.dumps({'type': 'error', 'error': 'Invalid since cursor'}))
+            return
+
+        while True:
+            comments = await self.comments_after(after_seq, REPLAY_CHUNK_SIZE)
+            if comments:
+                after_seq = comments[-1]['seq']
+                await self.send(text_data=json.dumps({'type': 'replay', 'comments': comments}))
+            if len(comments) < REPLAY_CHUNK_SIZE:
+                break
+
+        self.last_seq = after_seq
+        await self.send(text_data=json.dumps({'type': 'replay_complete', 'last_seq': after_seq}))
+
+    @database_sync_to_async
+    def seq_for_comment(self, comment_id):
+        """Highest seq at or before ``comment_id`` in this task"""
+        from django.db.models import Max
+        from .models import TaskComment
+        return TaskComment.objects.filter(
+            task__task_id=self.task_id,
+            task__project__organization__slug=self.org_slug,
+            id__lte=comment_id
+        ).aggregate(seq=Max('seq'))['seq'] or 0
+
+    @database_sync_to_async
+    def comments_after(self, after_seq, limit):
+        from .models import TaskComment
+        comments = TaskComment.objects.filter(
+            task__task_id=self.task_id,
+            task__project__organization__slug=self.org_slug,
+            seq__gt=after_seq
+        ).select_related('author').order_by('seq')[:limit]
+        return [
+            comment_frame({
+                'id': comment.id,
+                'seq': comment.seq,
+                'content': comment.content,
+                'author_email': comment.author.email if comment.author else None,
+                'author_id': comment.author_id,
+                'timestamp': comment.timestamp.isoformat(),
+                'task_id': self.task_id
+            })
+            for comment in comments
+        ]
 
     @database_sync_to_async
     def verify_user_access(self, user, org_slug, task_id):
         """Verify user has access to the organization and task exists"""
         try:
             from .models import Task
-            from users.models import User, OrganizationMember
+            from users.authorization import get_membership
             
             logger.info(f"Verifying access for user {user.email} to org {org_slug}, task {task_id}")
             
-            # Check organization membership
-            org_member = OrganizationMember.objects.get(
-                user=user,
-                organization__slug=org_slug
-            )
-            logger.info(f"Organization membership found: {org_member}")
+            # Check organization membership (shared with the GraphQL resolvers' cache)
+            membership = get_membership(user, org_slug)
+            if membership is None:
+                logger.warning(f"OrganizationMember not found for user {user.email} in org {org_slug}")
+                return False
+            logger.info(f"Organization membership found: {membership.role}")
             
             # Check task exists
             task = Task.objects.get(
                 task_id=task_id,
-                project__organization__slug=org_slug
+                project__organization=membership.organization
             )
             logger.info(f"Task found: {task.task_id} - {task.title}")
             
             return True
-        except OrganizationMember.DoesNotExist:
-            logger.warning(f"OrganizationMember not found for user {user.email} in org {org_slug}")
-            return False
         except Task.DoesNotExist:
             logger.warning(f"Task not found: {task_id} in org {org_slug}")
             return False
@@ -153,14 +230,147 @@ class TaskCommentConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
     def create_comment(self, content, user, task_id, org_slug):
         """Create a new comment in database"""
+        from core.result_cache import bump_org_version
         from .models import Task, TaskComment
-        task = Task.objects.get(
+        task = Task.objects.select_related('project').get(
             task_id=task_id,
             project__organization__slug=org_slug
         )
+        # ``user`` may be a TokenPrincipal rather than a model instance
         comment = TaskComment.objects.create(
             task=task,
             content=content,
-            author=user
+            author_id=user.id
         )
-        return comment
\ No newline at end of file
+        bump_org_version(task.project.organization_id)
+        return comment
+
+
+class StreamConsumer(AsyncWebsocketConsumer):
+    """
+    One authenticated socket carrying any number of task and project streams.
+
+    Clients send ``{"action": "subscribe", "stream": "task", "org_slug": ...,
+    "task_id": ...}`` or ``{"action": "subscribe", "stream": "project",
+    "org_slug": ..., "project_slug": ...}``. Each subscription is checked on
+    its own and answered with the stream key (``task:<org>:<task_id>`` or
+    ``project:<org>:<project_slug>``). Later events carry that key.
+    ``{"action": "unsubscribe", "stream": <key>}`` leaves a stream.
+    """
+
+    MAX_SUBSCRIPTIONS = 200
+
+    async def connect(self):
+        user = self.scope.get("user")
+        if not user or user.is_anonymous:
+            await self.close(code=4001)
+            return
+
+        # stream key -> channel layer group
+        self.subscriptions = {}
+        await self.accept()
+        await self.send_json({'type': 'system', 'message': 'Connected to stream'})
+
+    async def disconnect(self, close_code):
+        for group in getattr(self, 'subscriptions', {}).values():
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def receive(self, text_data):
+        try:
+            data = json.loads(text_data)
+        except ValueError:
+            await self.send_json({'type': 'error', 'error': 'Invalid JSON'})
+            return
+
+        action = data.get('action') or data.get('type')
+        if action == 'ping':
+            await self.send_json({'type': 'pong'})
+        elif action == 'subscribe':
+            await self.subscribe(data)
+        elif action == 'unsubscribe':
+            await self.unsubscribe(data.get('stream'))
+        else:
+            await self.send_json({'type': 'error', 'error': f'Unknown action: {action}'})
+
+    async def subscribe(self, data):
+        user = self.scope["user"]
+        stream = data.get('stream')
+        org_slug = data.get('org_slug') or ''
+
+        if stream == 'task':
+            task_id = (data.get('task_id') or '').upper()
+            key = f'task:{org_slug}:{task_id}'
+            group = task_comments_group(org_slug, task_id)
+            check = lambda: self.verify_task_access(user, org_slug, task_id)
+        elif stream == 'project':
+            project_slug = data.get('project_slug') or ''
+            key = f'project:{org_slug}:{project_slug}'
+            group = project_tasks_group(org_slug, project_slug)
+            check = lambda: self.verify_project_access(user, org_slug, project_slug)
+        else:
+            await self.send_json({'type': 'error', 'error': f'Unknown stream: {stream}'})
+            return
+
+        if key in self.subscriptions:
+            await self.send_json({'type': 'subscribed', 'stream': key})
+            return
+        if len(self.subscriptions) >= self.MAX_SUBSCRIPTIONS:
+            await self.send_json({'type': 'error', 'stream': key, 'error': 'Too many subscriptions'})
+            return
+        if not await check():
+            await self.send_json({'type': 'error', 'stream': key, 'error': 'Access denied'})
+            return
+
+        try:
+            await self.channel_layer.group_add(group, self.channel_name)
+        except (TypeError, AssertionError):
+            await self.send_json({'type': 'error', 'stream': key, 'error': 'Invalid stream'})
+            return
+        self.subscriptions[key] = group
+        await self.send_json({'type': 'subscribed', 'stream': key})
+
+    async def unsubscribe(self, key):
+        group = self.subscriptions.pop(key, None)
+        if group is not None:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        await self.send_json({'type': 'unsubscribed', 'stream': key})
+
+    async def comment_message(self, event):
+        await self.send_json({
+            'type': 'comment',
+            'stream': f"task:{event['org_slug']}:{event['task_id']}",
+            **comment_frame(event)
+        })
+
+    async def task_message(self, event):
+        await self.send_json({
+            'type': 'tasks',
+            'stream': f"project:{event['org_slug']}:{event['project_slug']}",
+            'action': event['action'],
+            'tasks': event['tasks']
+        })
+
+    async def send_json(self, content):
+        await self.send(text_data=json.dumps(content))
+
+    @database_sync_to_async
+    def verify_task_access(self, user, org_slug, task_id):
+        from .models import Task
+        from users.authorization import get_membership
+
+        membership = get_membership(user, org_slug)
+        return membership is not None and Task.objects.filter(
+            task_id=task_id,
+            project__organization=membership.organization
+        ).exists()
+
+    @database_sync_to_async
+    def verify_project_access(self, user, org_slug, project_slug):
+        from .models import Project
+        from users.authorization import get_membership
+
+        membership = get_membership(user, org_slug)
+        return membership is not None and Project.objects.filter(
+            slug=project_slug,
+            organization=membership.organization
+        ).exists()
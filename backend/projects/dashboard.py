@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Project
+
+COUNT_KEYS = ('todo', 'in_progress', 'done', 'overdue', 'due_this_week')
+
+
+def week_bounds(now):
+    """Start of the current week (Monday 00:00, local time) and of the next one"""
+    today = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    start = today - timedelta(days=today.weekday())
+    return start, start + timedelta(days=7)
+
+
+def empty_counts():
+    return dict.fromkeys(COUNT_KEYS, 0)
+
+
+def add_counts(target, row):
+    for key in COUNT_KEYS:
+        target[key] += row[key]
+    return target
+
+
+def with_totals(counts):
+    counts['total'] = counts['todo'] + counts['in_progress'] + counts['done']
+    return counts
+
+
+def org_dashboard(organization, now=None):
+    """
+    Status histograms per project, workload per assignee, overdue and
+    due-this-week counts for ``organization``.
+
+    Everything comes from one query grouping the org's tasks by (project,
+    assignee); the per-project, per-assignee and org-wide views are sums of
+    those rows. Projects without tasks are included (left join).
+    Overdue and due-this-week only count tasks that aren't DONE.
+    """
+    now = now or timezone.now()
+    week_start, week_end = week_bounds(now)
+    open_task = Q(task__status__in=['TODO', 'IN_PROGRESS'])
+
+    rows = (
+        Project.objects.filter(organization=organization)
+        .values('pk', 'slug', 'name', 'status', 'task__assignee', 'task__assignee__email', 'task__assignee__name')
+        .annotate(
+            todo=Count('task', filter=Q(task__status='TODO')),
+            in_progress=Count('task', filter=Q(task__status='IN_PROGRESS')),
+            done=Count('task', filter=Q(task__status='DONE')),
+            overdue=Count('task', filter=open_task & Q(task__due_date__lt=now)),
+            due_this_week=Count(
+                'task', filter=open_task & Q(task__due_date__gte=week_start, task__due_date__lt=week_end)
+            ),
+        )
+        .order_by('name', 'pk')
+    )
+
+    projects = {}
+    assignees = {}
+    totals = empty_counts()
+    for row in rows:
+        project = projects.setdefault(row['pk'], {
+            'slug': row['slug'], 'name': row['name'], 'status': row['status'], **empty_counts(),
+        })
+        add_counts(project, row)
+        add_counts(totals, row)
+
+        if row['task__assignee'] is None and not any(row[key] for key in COUNT_KEYS):
+            continue  # Project without tasks
+        assignee = assignees.setdefault(row['task__assignee'], {
+            'email': row['task__assignee__email'], 'name': row['task__assignee__name'], **empty_counts(),
+        })
+        add_counts(assignee, row)
+
+    return {
+        'generated_at': now,
+        'week_start': week_start,
+        'totals': with_totals(totals),
+        'projects': [with_totals(project) for project in projects.values()],
+        # Busiest first; unassigned tasks are reported under a null email
+        'assignees': sorted(
+            (with_totals(assignee) for assignee in assignees.values()),
+            key=lambda assignee: (-(assignee['todo'] + assignee['in_progress']), assignee['email'] or ''),
+        ),
+    }
@@ -0,0 +1,164 @@
+"""
+Project deletion without Django's collector, which loads every task and
+comment of a project into memory to cascade the delete.
+
+Deleting a project hides it at once (``Project.deleted_at``, filtered out by
+the default managers). Its slug stays taken until the project row itself is
+deleted, last: its tasks' IDs are built from it and unique. Its rows are
+then removed with
+set-based DELETEs: tasks in batches taken from the (project, created_at, id)
+index, each batch's comments first, in statements of bounded size. Every
+statement commits on its own together with the progress on the
+ProjectDeletion, so a deletion that is interrupted can be run again.
+Big projects are deleted by the background job in projects.jobs.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from core.result_cache import bump_org_version
+from jobs.models import Job
+from jobs.queue import enqueue
+from .models import Project, ProjectDeletion
+
+logger = logging.getLogger(__name__)
+_settings = getattr(settings, 'PROJECT_DELETION', {})
+# Tasks deleted per transaction, with their comment sequences
+BATCH_SIZE = _settings.get('BATCH_SIZE', 1000)
+# Comments deleted per statement
+COMMENT_BATCH_SIZE = _settings.get('COMMENT_BATCH_SIZE', 5000)
+# Projects with more tasks are deleted by a background job
+INLINE_MAX_TASKS = _settings.get('INLINE_MAX_TASKS', 2000)
+
+DELETE_JOB = 'projects.delete_project'
+
+# First key of the advisory locks that keep two runs off one deletion
+LOCK_CLASS = 0x70726a64
+
+
+class DeletionInProgress(Exception):
+    """The deletion is being run by another thread or process"""
+
+
+def request_deletion(project, user=None):
+    """
+    Hide ``project`` and return the ProjectDeletion that tracks removing
+    it, or the existing one if its deletion was already requested
+    """
+    with transaction.atomic():
+        project = Project.all_objects.select_for_update().get(pk=project.pk)
+        if project.deleted_at is not None:
+            return ProjectDeletion.objects.filter(project_id=project.pk).latest('pk')
+        deletion = ProjectDeletion.objects.create(
+            organization_id=project.organization_id,
+            requested_by=user,
+            project_id=project.pk,
+            project_name=project.name,
+            project_slug=project.slug,
+            tasks_total=project.task_count,
+        )
+        project.deleted_at = timezone.now()
+        project.save(update_fields=['deleted_at'])
+        bump_org_version(project.organization_id)
+    return deletion
+
+
+class ProjectDeleter:
+    """Remove the rows of the project ``deletion`` is for, recording progress on it"""
+
+    def __init__(self, deletion, batch_size=BATCH_SIZE, comment_batch_size=COMMENT_BATCH_SIZE, on_progress=None):
+        self.deletion = deletion
+        self.batch_size = batch_size
+        self.comment_batch_size = comment_batch_size
+        self.on_progress = on_progress
+
+    def run(self):
+        deletion = self.deletion
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s, %s)", [LOCK_CLASS, deletion.pk])
+            if not cursor.fetchone()[0]:
+                raise DeletionInProgress(f"Deletion {deletion.pk} is already running")
+            try:
+                deletion.status = 'RUNNING'
+                deletion.save(update_fields=['status', 'updated_at'])
+                while self.delete_batch(cursor):
+                    pass
+                self.delete_project(cursor)
+            except Exception as e:
+                deletion.status = 'FAILED'
+                deletion.error = str(e)
+                deletion.save(update_fields=['status', 'error', 'updated_at'])
+                raise
+            finally:
+                cursor.execute("SELECT pg_advisory_unlock(%s, %s)", [LOCK_CLASS, deletion.pk])
+        return deletion
+
+    def delete_batch(self, cursor):
+        """Delete the next batch of tasks and their comments; False once none are left"""
+        started = time.perf_counter()
+        deletion = self.deletion
+        cursor.execute(
+            "SELECT id FROM projects_task WHERE project_id = %s ORDER BY project_id, created_at, id LIMIT %s",
+            [deletion.project_id, self.batch_size],
+        )
+        task_ids = [pk for pk, in cursor.fetchall()]
+        if not task_ids:
+            return False
+
+        while True:
+            with transaction.atomic():
+                cursor.execute("""
+                    DELETE FROM projects_taskcomment WHERE (id, "timestamp") IN (
+                        SELECT id, "timestamp" FROM projects_taskcomment WHERE task_id = ANY(%s) LIMIT %s
+                    )
+                """, [task_ids, self.comment_batch_size])
+                deleted = cursor.rowcount
+                if deleted:
+                    deletion.comments_deleted += deleted
+                    deletion.save(update_fields=['comments_deleted', 'updated_at'])
+            if deleted < self.comment_batch_size:
+                break
+
+        with transaction.atomic():
+            cursor.execute("DELETE FROM projects_commentsequence WHERE task_id = ANY(%s)", [task_ids])
+            cursor.execute("DELETE FROM projects_task WHERE id = ANY(%s)", [task_ids])
+            deletion.tasks_deleted += cursor.rowcount
+            deletion.save(update_fields=['tasks_deleted', 'updated_at'])
+
+        if self.on_progress is not None:
+            self.on_progress(deletion, len(task_ids), time.perf_counter() - started)
+        return True
+
+    def delete_project(self, cursor):
+        deletion = self.deletion
+        with transaction.atomic():
+            cursor.execute("DELETE FROM projects_tasksequence WHERE project_id = %s", [deletion.project_id])
+            cursor.execute("DELETE FROM projects_project WHERE id = %s", [deletion.project_id])
+            deletion.status = 'COMPLETED'
+            deletion.error = ''
+            deletion.save(update_fields=['status', 'error', 'updated_at'])
+
+
+def start_deletion(deletion, user=None, background=None):
+    """
+    Remove the rows of ``deletion``'s project right away, or for projects
+    with more than INLINE_MAX_TASKS tasks queue a job to do it and return
+    that job. A database error of the inline deletion is recorded on the
+    deletion, which the caller reports; anything else is raised, as is
+    DeletionInProgress when another run is removing the rows.
+    """
+    if background is None:
+        background = deletion.tasks_total > INLINE_MAX_TASKS
+    if background:
+        pending = Job.objects.filter(
+            name=DELETE_JOB, args__deletion_id=deletion.pk, status__in=['QUEUED', 'RUNNING'],
+        ).first()
+        return pending or enqueue(DELETE_JOB, deletion.organization, user, deletion_id=deletion.pk)
+    try:
+        ProjectDeleter(deletion).run()
+    except DatabaseError:
+        logger.exception("Deletion %s of project %s failed", deletion.pk, deletion.project_slug)
+    return None
@@ -0,0 +1,104 @@
+import contextvars
+import logging
+from contextlib import contextmanager
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+logger = logging.getLogger(__name__)
+
+# Set while a request collects its broadcasts to send them from the event loop
+_pending_broadcasts = contextvars.ContextVar('pending_broadcasts', default=None)
+
+
+def task_comments_group(org_slug, task_id):
+    return f'task_comments_{org_slug}_{task_id.upper()}'
+
+
+def project_tasks_group(org_slug, project_slug):
+    return f'project_tasks_{org_slug}_{project_slug}'
+
+
+def comment_event(comment, org_slug, task_id, author=None):
+    """
+    Channel layer message for a new comment, handled by ``comment_message``.
+    Pass ``author`` when it is already known to avoid loading it again.
+    """
+    author = author or comment.author
+    return {
+        'type': 'comment_message',
+        'id': comment.id,
+        'seq': comment.seq,
+        'content': comment.content,
+        'author_email': author.email if author else None,
+        'author_id': comment.author_id,
+        'timestamp': comment.timestamp.isoformat(),
+        'task_id': task_id.upper(),
+        'org_slug': org_slug,
+    }
+
+
+def task_payload(task):
+    due_date = task.due_date
+    return {
+        'task_id': task.task_id,
+        'title': task.title,
+        'status': task.status,
+        'assignee_id': task.assignee_id,
+        # Mutations assign the raw input string, saved rows hold a datetime
+        'due_date': due_date.isoformat() if hasattr(due_date, 'isoformat') else due_date,
+    }
+
+
+def tasks_event(action, payloads, org_slug, project_slug):
+    """
+    Channel layer message for tasks created/updated/deleted in one project,
+    handled by ``task_message``. Bulk mutations send one event per project.
+    """
+    return {
+        'type': 'task_message',
+        'action': action,
+        'tasks': payloads,
+        'org_slug': org_slug,
+        'project_slug': project_slug,
+    }
+
+
+def broadcast(group, event):
+    """
+    Send ``event`` to ``group`` from synchronous code; failures are logged, not raised.
+    Inside ``collect_broadcasts()`` the event is queued for ``send_broadcasts`` instead.
+    """
+    pending = _pending_broadcasts.get()
+    if pending is not None:
+        pending.append((group, event))
+        return
+    try:
+        async_to_sync(get_channel_layer().group_send)(group, event)
+    except Exception as e:
+        # WebSocket might not be available, but the write is still saved
+        logger.warning(f"WebSocket broadcast to {group} failed: {e}")
+
+
+@contextmanager
+def collect_broadcasts():
+    """
+    Queue ``broadcast()`` calls made in this context (including sync code run
+    through ``sync_to_async``) and yield the list they are appended to.
+    """
+    pending = []
+    token = _pending_broadcasts.set(pending)
+    try:
+        yield pending
+    finally:
+        _pending_broadcasts.reset(token)
+
+
+async def send_broadcasts(pending):
+    """Await the queued broadcasts in order on the running event loop"""
+    channel_layer = get_channel_layer()
+    for group, event in pending:
+        try:
+            await channel_layer.group_send(group, event)
+        except Exception as e:
+            logger.warning(f"WebSocket broadcast to {group} failed: {e}")
@@ -0,0 +1,137 @@
+import csv
+import io
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+from .models import Project, Task, TaskComment
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+FORMATS = (NDJSON, CSV)
+CONTENT_TYPES = {NDJSON: 'application/x-ndjson', CSV: 'text/csv; charset=utf-8'}
+
+# Rows fetched per round trip of the server-side cursors
+CHUNK_SIZE = 2000
+# Output is handed on in blocks of about this many bytes
+BLOCK_SIZE = 1 << 16
+
+PROJECT_FIELDS = ('slug', 'name', 'description', 'status', 'due_date', 'created_at')
+TASK_FIELDS = ('task_id', 'title', 'description', 'status', 'assignee', 'due_date', 'created_at')
+COMMENT_FIELDS = ('task_id', 'seq', 'author', 'content', 'timestamp')
+# CSV has one header for all three record types; cells a type doesn't have stay empty
+CSV_COLUMNS = (
+    'type', 'project', 'task_id', 'seq', 'name', 'title', 'description', 'status',
+    'assignee', 'author', 'content', 'due_date', 'created_at', 'timestamp',
+)
+
+
+def export_records(organization, chunk_size=CHUNK_SIZE):
+    """
+    Yield ``(type, fields)`` for every project of ``organization``, each
+    followed by its tasks and then their comments.
+
+    Tasks and comments are read through server-side cursors, one project at
+    a time, so memory stays flat however big the organization is.
+    """
+    projects = (
+        Project.objects.filter(organization=organization)
+        .order_by('pk')
+        .values_list('pk', *PROJECT_FIELDS)
+    )
+    for pk, *values in projects.iterator(chunk_size=chunk_size):
+        project = dict(zip(PROJECT_FIELDS, values))
+        yield 'project', project
+
+        tasks = (
+            Task.objects.filter(project_id=pk)
+            .order_by('pk')
+            .values_list('task_id', 'title', 'description', 'status', 'assignee__email', 'due_date', 'created_at')
+        )
+        for values in tasks.iterator(chunk_size=chunk_size):
+            yield 'task', {'project': project['slug'], **dict(zip(TASK_FIELDS, values))}
+
+        comments = (
+            TaskComment.objects.filter(task__project_id=pk)
+            .order_by('task_id', 'seq')
+            .values_list('task__task_id', 'seq', 'author__email', 'content', 'timestamp')
+        )
+        for values in comments.iterator(chunk_size=chunk_size):
+            yield 'comment', {'project': project['slug'], **dict(zip(COMMENT_FIELDS, values))}
+
+
+def _ndjson_lines(records):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for kind, fields in records:
+        yield encoder.encode({'type': kind, **fields}) + '\n'
+
+
+def _csv_lines(records):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, CSV_COLUMNS)
+    writer.writeheader()
+    for kind, fields in records:
+        row = {'type': kind}
+        for name, value in fields.items():
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            row['project' if name == 'slug' else name] = value
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _blocks(lines):
+    """Join encoded lines into blocks of about BLOCK_SIZE bytes"""
+    block, size = [], 0
+    for line in lines:
+        data = line.encode()
+        block.append(data)
+        size += len(data)
+        if size >= BLOCK_SIZE:
+            yield b''.join(block)
+            block, size = [], 0
+    if block:
+        yield b''.join(block)
+
+
+def _gzipped(blocks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_organization(organization, fmt=NDJSON, compress=False, chunk_size=CHUNK_SIZE):
+    """
+    The export of ``organization`` as a generator of byte blocks, read from
+    one REPEATABLE READ snapshot so it is consistent however long it runs.
+
+    The generator holds a transaction and server-side cursors on the
+    connection of the thread iterating it: consume it on a single thread,
+    and close it if it isn't exhausted.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    return _export(organization, fmt, compress, chunk_size)
+
+
+def _export(organization, fmt, compress, chunk_size):
+    # Inside an outer transaction its snapshot is the one there is
+    snapshot = not connection.in_atomic_block
+    with transaction.atomic():
+        if snapshot:
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        records = export_records(organization, chunk_size)
+        lines = _ndjson_lines(records) if fmt == NDJSON else _csv_lines(records)
+        blocks = _blocks(lines)
+        yield from _gzipped(blocks) if compress else blocks
+
+
+def export_filename(organization, fmt, compress):
+    return f"{organization.slug}.{fmt}{'.gz' if compress else ''}"
@@ -0,0 +1,267 @@
+import codecs
+import csv
+import gzip
+import hashlib
+import json
+import time
+from datetime import datetime
+
+from django.db import transaction
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.timezone import get_current_timezone, is_naive, make_aware
+
+from core.result_cache import bump_org_version
+from .export import CSV, FORMATS, NDJSON
+from .models import Project, Task, TaskImport, TaskSequence
+from .schema import resolve_assignees
+
+BATCH_SIZE = 1000
+# Rejected records kept on the TaskImport; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+FINGERPRINT_BYTES = 1 << 16
+
+STATUSES = {status for status, _ in Task.TASK_STATUS_CHOICES}
+TITLE_MAX_LENGTH = Task._meta.get_field('title').max_length
+
+
+class TaskImportError(Exception):
+    """An import that can't start, e.g. resuming with another file"""
+
+
+def guess_format(name):
+    """The format of a file by its name (``tasks.csv``, ``tasks.ndjson.gz``), or None"""
+    name = name.lower().removesuffix('.gz')
+    if name.endswith('.csv'):
+        return CSV
+    if name.endswith(('.ndjson', '.jsonl')):
+        return NDJSON
+    return None
+
+
+def open_binary(file, name):
+    """``file`` as a binary stream, decompressed on the fly when ``name`` ends in .gz"""
+    return gzip.GzipFile(fileobj=file) if name.lower().endswith('.gz') else file
+
+
+def fingerprint(file):
+    """sha256 of the first bytes of a seekable binary ``file``, which is rewound"""
+    digest = hashlib.sha256(file.read(FINGERPRINT_BYTES)).hexdigest()
+    file.seek(0)
+    return digest
+
+
+def read_records(binary, fmt):
+    """
+    Yield one dict per record of ``binary``, decoding and parsing as it
+    goes. A line of NDJSON that isn't an object yields the error message
+    in its place, so record numbers stay aligned with the input.
+    """
+    lines = codecs.iterdecode(binary, 'utf-8-sig')
+    if fmt == CSV:
+        yield from csv.DictReader(lines)
+        return
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield f"Invalid JSON: {e}"
+            continue
+        yield record if isinstance(record, dict) else "Each line must be a JSON object"
+
+
+def _text(record, name):
+    value = record.get(name)
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def parse_due_date(value):
+    """An aware datetime from an ISO datetime or date; naive ones are in the current timezone"""
+    if not value:
+        return None
+    due_date = parse_datetime(value)
+    if due_date is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid due_date {value!r}")
+        due_date = datetime.combine(day, datetime.min.time())
+    if is_naive(due_date):
+        due_date = make_aware(due_date, get_current_timezone())
+    return due_date
+
+
+class TaskImporter:
+    """
+    Load task records into an organization in batches.
+
+    Each batch resolves its new project slugs and assignee emails with one
+    query apiece, reserves task numbers per project as one range, inserts
+    with ``bulk_create`` and commits together with the progress counters on
+    ``task_import``. Records the counters already cover are skipped, which
+    is how an interrupted import resumes.
+
+    Records use the export's task fields: ``project`` (slug), ``title``,
+    ``description``, ``status``, ``assignee`` (email) and ``due_date``.
+    Project and comment records of an export are skipped.
+    """
+
+    def __init__(self, task_import, batch_size=BATCH_SIZE, default_project=None, on_progress=None):
+        self.task_import = task_import
+        self.organization = task_import.organization
+        self.batch_size = batch_size
+        self.default_project = default_project
+        self.on_progress = on_progress
+        self.projects = {}
+        self.assignees = {}
+
+    def run(self, records):
+        task_import = self.task_import
+        try:
+            batch = []
+            for number, record in enumerate(records, 1):
+                if number <= task_import.records_read:
+                    continue
+                batch.append((number, record))
+                if len(batch) >= self.batch_size:
+                    self.load_batch(batch)
+                    batch = []
+            if batch:
+                self.load_batch(batch)
+        except Exception as e:
+            task_import.status = 'FAILED'
+            task_import.error = str(e)
+            task_import.save(update_fields=['status', 'error', 'updated_at'])
+            raise
+        task_import.status = 'COMPLETED'
+        task_import.error = ''
+        task_import.save(update_fields=['status', 'error', 'updated_at'])
+        return task_import
+
+    def lookup(self, batch):
+        """Fetch the projects and assignees of ``batch`` not seen in earlier batches"""
+        slugs, emails = set(), set()
+        for _, record in batch:
+            if isinstance(record, dict):
+                slugs.add(_text(record, 'project') or self.default_project)
+                emails.add(_text(record, 'assignee'))
+        slugs = {slug for slug in slugs if slug and slug not in self.projects}
+        if slugs:
+            found = Project.objects.filter(organization=self.organization, slug__in=slugs)
+            self.projects.update({slug: None for slug in slugs})
+            self.projects.update({project.slug: project for project in found})
+        emails = {email for email in emails if email and email not in self.assignees}
+        self.assignees.update(resolve_assignees(self.organization, emails))
+
+    def build(self, record):
+        """An unsaved Task for ``record``, None to skip it, or raise ValueError"""
+        if isinstance(record, str):
+            raise ValueError(record)
+        kind = record.get('type') or 'task'
+        if kind != 'task':
+            return None
+
+        slug = _text(record, 'project') or self.default_project
+        if not slug:
+            raise ValueError("Missing project")
+        project = self.projects.get(slug)
+        if project is None:
+            raise ValueError(f"Project {slug!r} not found")
+
+        title = _text(record, 'title')
+        if not title:
+            raise ValueError("Missing title")
+        if len(title) > TITLE_MAX_LENGTH:
+            raise ValueError(f"Title is longer than {TITLE_MAX_LENGTH} characters")
+
+        status = _text(record, 'status').upper() or 'TODO'
+        if status not in STATUSES:
+            raise ValueError(f"Invalid status {status!r}")
+
+        assignee = None
+        email = _text(record, 'assignee')
+        if email:
+            assignee = self.assignees.get(email)
+            if isinstance(assignee, str):
+                raise ValueError(f"{assignee}: {email}")
+
+        return Task(
+            project=project,
+            title=title,
+            description=_text(record, 'description'),
+            status=status,
+            assignee=assignee,
+            due_date=parse_due_date(_text(record, 'due_date')),
+        )
+
+    def load_batch(self, batch):
+        started = time.perf_counter()
+        task_import = self.task_import
+        self.lookup(batch)
+
+        tasks, errors, skipped = [], [], 0
+        for number, record in batch:
+            try:
+                task = self.build(record)
+            except ValueError as e:
+                errors.append({'record': number, 'error': str(e)})
+                continue
+            if task is None:
+                skipped += 1
+            else:
+                tasks.append(task)
+
+        by_project = {}
+        for task in tasks:
+            by_project.setdefault(task.project_id, []).append(task)
+
+        with transaction.atomic():
+            for project_tasks in by_project.values():
+                project = project_tasks[0].project
+                numbers = TaskSequence.objects.allocate(project, len(project_tasks))
+                for task, number in zip(project_tasks, numbers):
+                    task.task_id = project.make_task_id(number)
+            Task.objects.bulk_create(tasks)
+
+            task_import.records_read = batch[-1][0]
+            task_import.imported += len(tasks)
+            task_import.skipped += skipped
+            task_import.failed += len(errors)
+            room = MAX_REPORTED_ERRORS - len(task_import.errors)
+            if room > 0:
+                task_import.errors = task_import.errors + errors[:room]
+            task_import.save(update_fields=[
+                'records_read', 'imported', 'skipped', 'failed', 'errors', 'updated_at',
+            ])
+            if tasks:
+                bump_org_version(self.organization.pk)
+
+        if self.on_progress is not None:
+            self.on_progress(task_import, len(batch), time.perf_counter() - started)
+
+
+def start_import(organization, source, fmt, file_fingerprint, user=None, resume=None):
+    """
+    The TaskImport to load ``source`` into: a new one, or the unfinished
+    import ``resume`` (an id) after checking it is for the same input
+    """
+    if fmt not in FORMATS:
+        raise TaskImportError(f"Unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    if resume is None:
+        return TaskImport.objects.create(
+            organization=organization, created_by=user, source=source[:255],
+            fingerprint=file_fingerprint, format=fmt,
+        )
+    try:
+        task_import = TaskImport.objects.get(pk=resume, organization=organization)
+    except TaskImport.DoesNotExist:
+        raise TaskImportError(f"Import {resume} not found")
+    if task_import.status == 'COMPLETED':
+        raise TaskImportError(f"Import {resume} already completed")
+    if task_import.fingerprint != file_fingerprint or task_import.format != fmt:
+        raise TaskImportError(f"Import {resume} was started with a different file")
+    task_import.status = 'RUNNING'
+    task_import.save(update_fields=['status', 'updated_at'])
+    return task_import
@@ -0,0 +1,19 @@
+from jobs.queue import register, report_progress
+from .deletion import DELETE_JOB, ProjectDeleter
+from .models import ProjectDeletion
+
+
+@register(DELETE_JOB)
+def delete_project(job, deletion_id):
+    """
+    Finish a project deletion queued by deleteProject. DeletionInProgress,
+    when ``manage.py delete_projects`` is running it, fails the attempt so
+    it is retried later; by then it is complete and there is nothing to do.
+    """
+    deletion = ProjectDeletion.objects.get(pk=deletion_id)
+    if deletion.status != 'COMPLETED':
+        def on_progress(deletion, tasks, seconds):
+            report_progress(job, tasks_deleted=deletion.tasks_deleted, comments_deleted=deletion.comments_deleted)
+
+        ProjectDeleter(deletion, on_progress=on_progress).run()
+    return {'tasks_deleted': deletion.tasks_deleted, 'comments_deleted': deletion.comments_deleted}
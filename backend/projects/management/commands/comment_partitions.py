@@ -0,0 +1,83 @@
+import os
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from projects.partitions import (
+    add_months, archive_table, covering_partition, create_partition, detach_partition, detached_partitions,
+    expired_partitions, list_partitions, month_start,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintain the monthly partitions of task comments: create the coming months' "
+        "and detach or archive those past the retention period. Run it daily or monthly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=3, help="Months to create partitions for after this one")
+        parser.add_argument(
+            '--retain-months', type=int,
+            help="Keep this many whole months before the current one; older partitions are detached",
+        )
+        parser.add_argument('--archive-dir', help="Write detached partitions here as gzipped CSV, then drop them")
+        parser.add_argument('--detach-only', action='store_true', help="Leave detached partitions as plain tables")
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be done")
+
+    def handle(self, *args, **options):
+        retain, directory, detach_only = options['retain_months'], options['archive_dir'], options['detach_only']
+        if retain is not None and retain < 0:
+            raise CommandError("--retain-months can't be negative")
+        if retain is not None and not (directory or detach_only):
+            raise CommandError("Pass --archive-dir to archive old partitions, or --detach-only to keep them as tables")
+        if directory and detach_only:
+            raise CommandError("--archive-dir and --detach-only don't go together")
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        dry_run = options['dry_run']
+
+        this_month = month_start(datetime.now(timezone.utc))
+        with connection.cursor() as cursor:
+            partitions = list_partitions(cursor)
+        for n in range(options['ahead'] + 1):
+            month = add_months(this_month, n)
+            if dry_run:
+                if covering_partition(partitions, month) is None:
+                    self.stdout.write(f"Would create the partition for {month:%Y-%m}")
+            elif create_partition(month):
+                self.stdout.write(f"Created the partition for {month:%Y-%m}")
+
+        expired = []
+        if retain is not None:
+            with connection.cursor() as cursor:
+                expired = expired_partitions(cursor, retain)
+            for partition in expired:
+                self.stdout.write(f"{'Would detach' if dry_run else 'Detaching'} {partition.name} (~{partition.rows} rows)")
+                if not dry_run:
+                    detach_partition(partition.name)
+
+        if directory:
+            with connection.cursor() as cursor:
+                detached = detached_partitions(cursor)
+            if dry_run:
+                detached += [partition.name for partition in expired]
+            for name in detached:
+                if dry_run:
+                    self.stdout.write(f"Would archive {name} to {directory}")
+                    continue
+                path, rows = archive_table(name, directory)
+                self.stdout.write(f"Archived {rows} rows of {name} to {path} and dropped it")
+
+        with connection.cursor() as cursor:
+            partitions = list_partitions(cursor)
+        for partition in partitions:
+            if partition.end is None:
+                bounds = 'default'
+            else:
+                bounds = f'{partition.start:%Y-%m-%d} to {partition.end:%Y-%m-%d}'
+            self.stdout.write(
+                f"{partition.name:40} {bounds:26} ~{partition.rows:>10} rows {partition.size / 2 ** 20:>9.1f} MB"
+            )
+        self.stdout.write(self.style.SUCCESS(f"{len(partitions)} partitions"))
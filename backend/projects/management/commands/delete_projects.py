@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from organizations.models import Organization
+from projects.deletion import BATCH_SIZE, DeletionInProgress, ProjectDeleter, request_deletion
+from projects.models import Project, ProjectDeletion
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete projects in batches of set-based DELETEs. Without arguments, finish every deletion "
+        "that was interrupted or failed; with --org, delete that organization's projects"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--org', help="Delete the projects of this organization slug")
+        parser.add_argument('--project', help="Only this project slug of --org")
+        parser.add_argument(
+            '--delete-org', action='store_true', help="Delete the organization itself once its projects are gone",
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Tasks deleted per transaction")
+
+    def handle(self, *args, **options):
+        if (options['project'] or options['delete_org']) and not options['org']:
+            raise CommandError("--project and --delete-org need --org")
+        if options['project'] and options['delete_org']:
+            raise CommandError("--delete-org deletes every project; leave out --project")
+
+        organization = None
+        if options['org']:
+            try:
+                organization = Organization.objects.get(slug=options['org'])
+            except Organization.DoesNotExist:
+                raise CommandError(f"No organization with slug {options['org']!r}")
+            projects = Project.objects.filter(organization=organization).order_by('pk')
+            if options['project']:
+                projects = projects.filter(slug=options['project'])
+                if not projects.exists():
+                    raise CommandError(f"No project {options['project']!r} in {organization.slug}")
+            for project in projects:
+                request_deletion(project)
+
+        deletions = ProjectDeletion.objects.exclude(status='COMPLETED').order_by('pk')
+        if organization is not None:
+            deletions = deletions.filter(organization=organization)
+        failed = 0
+        for deletion in deletions:
+            self.stdout.write(f"Deleting {deletion.project_slug} ({deletion.tasks_total} tasks), deletion {deletion.pk}")
+            try:
+                ProjectDeleter(deletion, options['batch_size'], on_progress=self.report_progress).run()
+            except DeletionInProgress as e:
+                self.stdout.write(f"{e}; skipped")
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Deletion {deletion.pk} of {deletion.project_slug} failed: {e}")
+
+        if failed:
+            raise CommandError(f"{failed} deletions failed; fix the cause and run the command again")
+        if options['delete_org']:
+            if Project.all_objects.filter(organization=organization).exists():
+                raise CommandError(f"{organization.slug} still has projects being deleted elsewhere; run again later")
+            organization.delete()
+            self.stdout.write(f"Deleted organization {organization.slug}")
+        self.stdout.write(self.style.SUCCESS("Done"))
+
+    def report_progress(self, deletion, tasks, seconds):
+        rate = tasks / seconds if seconds else 0
+        self.stdout.write(
+            f"{deletion.tasks_deleted}/{deletion.tasks_total} tasks and {deletion.comments_deleted} comments "
+            f"deleted ({rate:,.0f} tasks/s)"
+        )
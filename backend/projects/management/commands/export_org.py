@@ -0,0 +1,36 @@
+import sys
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from organizations.models import Organization
+from projects.export import CHUNK_SIZE, FORMATS, NDJSON, export_organization
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream an organization's projects, tasks and comments as NDJSON or CSV, "
+        "from one consistent snapshot and in constant memory"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('org', help="Organization slug")
+        parser.add_argument('--format', choices=FORMATS, default=NDJSON)
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--output', '-o', help="File to write (default: stdout)")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows fetched per cursor round trip")
+
+    def handle(self, *args, **options):
+        try:
+            organization = Organization.objects.get(slug=options['org'])
+        except Organization.DoesNotExist:
+            raise CommandError(f"No organization with slug {options['org']!r}")
+
+        chunks = export_organization(organization, options['format'], options['gzip'], options['chunk_size'])
+        size = 0
+        with open(options['output'], 'wb') if options['output'] else nullcontext(sys.stdout.buffer) as out:
+            for chunk in chunks:
+                out.write(chunk)
+                size += len(chunk)
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"Wrote {size} bytes to {options['output']}"))
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from organizations.models import Organization
+from projects.export import FORMATS
+from projects.importer import (
+    BATCH_SIZE, TaskImporter, TaskImportError, fingerprint, guess_format, open_binary, read_records, start_import,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-load tasks into an organization from CSV or NDJSON (optionally .gz), in batches "
+        "that commit with a checkpoint so a failed run can be resumed with --resume"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('org', help="Organization slug")
+        parser.add_argument('path', help="Input file; .gz files are decompressed")
+        parser.add_argument('--format', choices=FORMATS, help="Default: from the file name")
+        parser.add_argument('--project', help="Project slug for records without a project column")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--resume', type=int, metavar='IMPORT_ID', help="Continue an interrupted import of the same file")
+
+    def handle(self, *args, **options):
+        try:
+            organization = Organization.objects.get(slug=options['org'])
+        except Organization.DoesNotExist:
+            raise CommandError(f"No organization with slug {options['org']!r}")
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        if fmt is None:
+            raise CommandError("Can't tell the format from the file name; pass --format")
+
+        with open(path, 'rb') as raw:
+            try:
+                task_import = start_import(organization, path, fmt, fingerprint(raw), resume=options['resume'])
+            except TaskImportError as e:
+                raise CommandError(str(e))
+            if task_import.records_read:
+                self.stdout.write(f"Resuming import {task_import.pk} after record {task_import.records_read}")
+            else:
+                self.stdout.write(f"Started import {task_import.pk}")
+
+            importer = TaskImporter(
+                task_import, options['batch_size'], options['project'], on_progress=self.report_progress,
+            )
+            try:
+                importer.run(read_records(open_binary(raw, path), fmt))
+            except Exception as e:
+                raise CommandError(
+                    f"Import {task_import.pk} failed after record {task_import.records_read}: {e}\n"
+                    f"Fix the cause and rerun with --resume {task_import.pk}"
+                )
+
+        for error in task_import.errors:
+            self.stderr.write(f"Record {error['record']}: {error['error']}")
+        if task_import.failed > len(task_import.errors):
+            self.stderr.write(f"... and {task_import.failed - len(task_import.errors)} more rejected records")
+        self.stdout.write(self.style.SUCCESS(
+            f"Import {task_import.pk}: {task_import.imported} tasks imported, "
+            f"{task_import.failed} rejected, {task_import.skipped} skipped"
+        ))
+
+    def report_progress(self, task_import, records, seconds):
+        rate = records / seconds if seconds else 0
+        self.stdout.write(
+            f"{task_import.records_read} records: {task_import.imported} imported, "
+            f"{task_import.failed} rejected ({rate:,.0f} records/s)"
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from projects.models import TASK_COUNTER_FIELDS, Project
+
+
+class Command(BaseCommand):
+    help = "Recount tasks per status and repair project counters that drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--org', help="Only projects of this organization slug")
+        parser.add_argument('--batch-size', type=int, default=500, help="Projects locked and recounted per transaction")
+
+    def handle(self, *args, **options):
+        projects = Project.objects.order_by('pk')
+        if options['org']:
+            projects = projects.filter(organization__slug=options['org'])
+        project_ids = list(projects.values_list('pk', flat=True))
+
+        fixed = 0
+        for start in range(0, len(project_ids), options['batch_size']):
+            batch = project_ids[start:start + options['batch_size']]
+            for project in Project.objects.filter(pk__in=batch).reconcile_task_counts():
+                fixed += 1
+                counts = ', '.join(f"{status}={getattr(project, field)}" for status, field in TASK_COUNTER_FIELDS.items())
+                self.stdout.write(f"Fixed {project.slug}: {counts}")
+
+        self.stdout.write(self.style.SUCCESS(f"Checked {len(project_ids)} projects, fixed {fixed}"))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_sequences(apps, schema_editor):
+    """Start every project's counter after its highest existing task number"""
+    Project = apps.get_model('projects', 'Project')
+    Task = apps.get_model('projects', 'Task')
+    TaskSequence = apps.get_model('projects', 'TaskSequence')
+
+    sequences = []
+    for project in Project.objects.only('id').iterator():
+        last_number = 0
+        task_ids = Task.objects.filter(project_id=project.id).values_list('task_id', flat=True)
+        for count, task_id in enumerate(task_ids.iterator(), start=1):
+            # Slugs may contain hyphens, the number is always the last part
+            suffix = task_id.rsplit('-', 1)[-1]
+            number = int(suffix) if suffix.isdigit() else count
+            last_number = max(last_number, number, count)
+        sequences.append(TaskSequence(project_id=project.id, last_number=last_number))
+    TaskSequence.objects.bulk_create(sequences, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0005_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskSequence',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='task_sequence', serialize=False, to='projects.project')),
+                ('last_number', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0006_task_sequence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommentSequence',
+            fields=[
+                ('task', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='comment_sequence', serialize=False, to='projects.task')),
+                ('last_number', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='taskcomment',
+            name='seq',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        # Number existing comments per task in timestamp order and start each counter after them
+        migrations.RunSQL(
+            sql="""
+                UPDATE projects_taskcomment AS comment
+                SET seq = numbered.seq
+                FROM (
+                    SELECT id, ROW_NUMBER() OVER (PARTITION BY task_id ORDER BY timestamp, id) AS seq
+                    FROM projects_taskcomment
+                ) AS numbered
+                WHERE comment.id = numbered.id;
+
+                INSERT INTO projects_commentsequence (task_id, last_number)
+                SELECT task_id, MAX(seq) FROM projects_taskcomment GROUP BY task_id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='taskcomment',
+            constraint=models.UniqueConstraint(fields=('task', 'seq'), name='comment_task_seq_unique'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0008_search_vectors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='done_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='in_progress_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='todo_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        # Start the counters from the tasks that already exist
+        migrations.RunSQL(
+            sql="""
+                UPDATE projects_project AS project
+                SET todo_count = counts.todo,
+                    in_progress_count = counts.in_progress,
+                    done_count = counts.done
+                FROM (
+                    SELECT project_id,
+                           COUNT(*) FILTER (WHERE status = 'TODO') AS todo,
+                           COUNT(*) FILTER (WHERE status = 'IN_PROGRESS') AS in_progress,
+                           COUNT(*) FILTER (WHERE status = 'DONE') AS done
+                    FROM projects_task
+                    GROUP BY project_id
+                ) AS counts
+                WHERE project.id = counts.project_id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,265 @@
+from datetime import datetime, timezone
+
+from django.db import migrations, models, transaction
+
+TABLE = 'projects_taskcomment'
+# Built next to the live table and swapped in for it at the end
+PARTITIONED = f'{TABLE}_partitioned'
+# Ids of comments written while rows are copied, filled by a trigger on the live table
+CHANGES = f'{TABLE}_changes'
+SEQUENCE = 'projects_taskcomment_id_seq'
+# Monthly partitions created up front, after the current month's
+MONTHS_AHEAD = 3
+# Rows copied, or changes replayed, per statement
+BATCH_SIZE = 50000
+# Changes are replayed without a lock until fewer than this many are left;
+# the rest are replayed while the live table is locked for the swap
+LOCKED_REPLAY_MAX = 1000
+
+COLUMNS = """
+    id bigint NOT NULL,
+    content text NOT NULL,
+    "timestamp" timestamp with time zone NOT NULL,
+    author_id bigint NULL,
+    task_id bigint NOT NULL,
+    seq integer NOT NULL CONSTRAINT projects_taskcomment_seq_check CHECK (seq >= 0),
+    search_vector tsvector GENERATED ALWAYS AS (to_tsvector('english'::regconfig, COALESCE(content, ''::text))) STORED
+"""
+ROW_COLUMNS = 'id, task_id, seq, content, author_id, "timestamp"'
+# The foreign keys and indexes Django created, recreated under the same names on the partitioned table
+FOREIGN_KEYS = [
+    ('projects_taskcomment_task_id_3c75a98e_fk_projects_task_id', 'task_id', 'projects_task'),
+    ('projects_taskcomment_author_id_464e8986_fk_users_user_id', 'author_id', 'users_user'),
+]
+INDEXES = [
+    ('projects_taskcomment_task_id_3c75a98e', 'btree (task_id)'),
+    ('projects_taskcomment_author_id_464e8986', 'btree (author_id)'),
+    ('comment_task_timestamp_idx', 'btree (task_id, "timestamp", id)'),
+    ('comment_search_idx', 'gin (search_vector)'),
+    ('comment_task_seq_idx', 'btree (task_id, seq)'),
+]
+
+
+def _add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _month_start(moment):
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def _foreign_key(name, column, target):
+    return (
+        f"CONSTRAINT {name} FOREIGN KEY ({column}) REFERENCES {target} (id) DEFERRABLE INITIALLY DEFERRED"
+    )
+
+
+def _clean_up(cursor):
+    # Left behind by a run that was interrupted before the swap
+    cursor.execute(f"DROP TRIGGER IF EXISTS {CHANGES}_log ON {TABLE}")
+    cursor.execute(f"DROP FUNCTION IF EXISTS {CHANGES}_log()")
+    cursor.execute(f"DROP TABLE IF EXISTS {CHANGES}, {PARTITIONED}")
+
+
+def _log_changes(cursor):
+    # CREATE TRIGGER waits for transactions writing to the table, so every
+    # write it misses is visible to the copy that follows
+    cursor.execute(f"CREATE TABLE {CHANGES} (change_id bigserial PRIMARY KEY, id bigint NOT NULL)")
+    cursor.execute(f"""
+        CREATE FUNCTION {CHANGES}_log() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO {CHANGES} (id) VALUES (CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END);
+            RETURN NULL;
+        END
+        $$
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER {CHANGES}_log AFTER INSERT OR UPDATE OR DELETE ON {TABLE}
+        FOR EACH ROW EXECUTE FUNCTION {CHANGES}_log()
+    """)
+
+
+def _create_partitioned(cursor):
+    """
+    Create the partitioned table, with a partition for every month that has
+    comments, this month's and MONTHS_AHEAD more, and return their names.
+    Indexes are built on the empty table and filled as rows are copied.
+    """
+    cursor.execute(f"""SELECT DISTINCT date_trunc('month', "timestamp", 'UTC') FROM {TABLE}""")
+    months = {_month_start(month) for month, in cursor.fetchall()}
+    this_month = _month_start(datetime.now(timezone.utc))
+    months.update(_add_months(this_month, n) for n in range(MONTHS_AHEAD + 1))
+
+    cursor.execute(f"""
+        CREATE TABLE {PARTITIONED} (
+            {COLUMNS},
+            CONSTRAINT {PARTITIONED}_pkey PRIMARY KEY (id, "timestamp")
+        ) PARTITION BY RANGE ("timestamp")
+    """)
+    # Index names are unique per schema; the live table's are taken until the swap
+    for name, definition in INDEXES:
+        cursor.execute(f"CREATE INDEX {name}_partitioned ON {PARTITIONED} USING {definition}")
+    partitions = []
+    for month in sorted(months):
+        name = f'{TABLE}_p{month:%Y_%m}'
+        cursor.execute(
+            f"CREATE TABLE {name} PARTITION OF {PARTITIONED} FOR VALUES FROM (%s) TO (%s)",
+            [month, _add_months(month, 1)],
+        )
+        partitions.append(name)
+    cursor.execute(f"CREATE TABLE {TABLE}_default PARTITION OF {PARTITIONED} DEFAULT")
+    return partitions + [f'{TABLE}_default']
+
+
+def _copy_rows(cursor, after, until):
+    """Copy the next batch of rows with ids in (after, until]; returns the last id copied, None when done"""
+    cursor.execute(f"""
+        WITH copied AS (
+            INSERT INTO {PARTITIONED} ({ROW_COLUMNS})
+            SELECT {ROW_COLUMNS} FROM {TABLE} WHERE id > %s AND id <= %s ORDER BY id LIMIT %s
+            RETURNING id
+        )
+        SELECT max(id) FROM copied
+    """, [after, until, BATCH_SIZE])
+    last, = cursor.fetchone()
+    return last
+
+
+def _replay_changes(cursor, limit=None):
+    """
+    Copy the current state of logged comments again, deleting those gone from
+    the live table; returns how many changes were replayed. Changes are
+    removed from the log as they are read, so one committed late, behind a
+    later change_id, is still picked up by the next call.
+    """
+    cursor.execute(f"""
+        DELETE FROM {CHANGES} WHERE change_id IN (
+            SELECT change_id FROM {CHANGES} ORDER BY change_id {'LIMIT %s' if limit else ''}
+        )
+        RETURNING id
+    """, [limit] if limit else None)
+    ids = list({id for id, in cursor.fetchall()})
+    if ids:
+        cursor.execute(f"DELETE FROM {PARTITIONED} WHERE id = ANY(%s)", [ids])
+        cursor.execute(f"""
+            INSERT INTO {PARTITIONED} ({ROW_COLUMNS}) SELECT {ROW_COLUMNS} FROM {TABLE} WHERE id = ANY(%s)
+        """, [ids])
+    return len(ids)
+
+
+def _swap(cursor, partitions):
+    """Replace the live table with the partitioned one; runs with it locked"""
+    cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+    _replay_changes(cursor)
+    cursor.execute(f"SELECT pg_get_serial_sequence('{TABLE}', 'id')")
+    identity, = cursor.fetchone()
+    cursor.execute(f"SELECT last_value, is_called FROM {identity}")
+    last_value, is_called = cursor.fetchone()
+
+    cursor.execute(f"DROP TABLE {TABLE}")
+    cursor.execute(f"DROP TABLE {CHANGES}")
+    cursor.execute(f"DROP FUNCTION {CHANGES}_log()")
+    cursor.execute(f"ALTER TABLE {PARTITIONED} RENAME TO {TABLE}")
+    cursor.execute(f"ALTER TABLE {TABLE} RENAME CONSTRAINT {PARTITIONED}_pkey TO {TABLE}_pkey")
+    for name, _ in INDEXES:
+        cursor.execute(f"ALTER INDEX {name}_partitioned RENAME TO {name}")
+
+    # Partitioned tables can't have identity columns
+    cursor.execute(f"CREATE SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id")
+    cursor.execute(f"SELECT setval('{SEQUENCE}', %s, %s)", [last_value, is_called])
+    cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+    # Enforced from here on; the rows already there are validated after the lock is released
+    for partition in partitions:
+        for foreign_key in FOREIGN_KEYS:
+            cursor.execute(f"ALTER TABLE {partition} ADD {_foreign_key(*foreign_key)} NOT VALID")
+
+
+def partition_comments(apps, schema_editor):
+    """
+    Turn projects_taskcomment into a table partitioned by month of
+    ``timestamp``, with one partition for each month that has comments.
+
+    Rows are copied into a new partitioned table in batches of BATCH_SIZE,
+    each its own transaction, while the live table stays in use; a trigger
+    logs the comments written meanwhile and they are copied again. The live
+    table is only locked to replay the last few changes and swap the tables.
+    Foreign keys are validated partition by partition afterwards, which
+    doesn't block writes.
+    """
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        _clean_up(cursor)
+        _log_changes(cursor)
+        partitions = _create_partitioned(cursor)
+        cursor.execute(f"SELECT coalesce(max(id), 0) FROM {TABLE}")
+        until, = cursor.fetchone()
+        last = 0
+        while last is not None:
+            last = _copy_rows(cursor, last, until)
+    while True:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            if _replay_changes(cursor, BATCH_SIZE) < LOCKED_REPLAY_MAX:
+                break
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        _swap(cursor, partitions)
+
+    with connection.cursor() as cursor:
+        for partition in partitions:
+            for name, _, _ in FOREIGN_KEYS:
+                cursor.execute(f"ALTER TABLE {partition} VALIDATE CONSTRAINT {name}")
+        # Adopts the partitions' validated keys instead of checking every row again
+        for foreign_key in FOREIGN_KEYS:
+            cursor.execute(f"ALTER TABLE {TABLE} ADD {_foreign_key(*foreign_key)}")
+
+
+def unpartition_comments(apps, schema_editor):
+    """Copy every partition back into one plain table, as it was before; the table is locked meanwhile"""
+    connection = schema_editor.connection
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f"SELECT last_value, is_called FROM {SEQUENCE}")
+        last_value, is_called = cursor.fetchone()
+        cursor.execute(f"CREATE TABLE {TABLE}_plain ({COLUMNS})")
+        cursor.execute(f"INSERT INTO {TABLE}_plain ({ROW_COLUMNS}) SELECT {ROW_COLUMNS} FROM {TABLE}")
+        cursor.execute(f"ALTER SEQUENCE {SEQUENCE} OWNED BY NONE")
+        cursor.execute(f"DROP TABLE {TABLE}")
+        cursor.execute(f"DROP SEQUENCE {SEQUENCE}")
+        cursor.execute(f"ALTER TABLE {TABLE}_plain RENAME TO {TABLE}")
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY")
+        cursor.execute(f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), %s, %s)", [last_value, is_called])
+        cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id)")
+        cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT comment_task_seq_unique UNIQUE (task_id, seq)")
+        for foreign_key in FOREIGN_KEYS:
+            cursor.execute(f"ALTER TABLE {TABLE} ADD {_foreign_key(*foreign_key)}")
+        for name, definition in INDEXES:
+            if name != 'comment_task_seq_idx':
+                cursor.execute(f"CREATE INDEX {name} ON {TABLE} USING {definition}")
+
+
+class Migration(migrations.Migration):
+    # Rows are copied in many short transactions; partition_comments opens its own
+    atomic = False
+
+    dependencies = [
+        ('projects', '0010_task_import'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(partition_comments, unpartition_comments),
+            ],
+            state_operations=[
+                migrations.RemoveConstraint(
+                    model_name='taskcomment',
+                    name='comment_task_seq_unique',
+                ),
+                migrations.AddIndex(
+                    model_name='taskcomment',
+                    index=models.Index(fields=['task', 'seq'], name='comment_task_seq_idx'),
+                ),
+            ],
+        ),
+    ]
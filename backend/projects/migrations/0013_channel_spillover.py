@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Spillover table of core.channel_layers.PostgresChannelLayer, for messages
+    over the NOTIFY payload limit. Unlogged: its rows only live a few minutes.
+    IF NOT EXISTS because the layer used to create it at runtime.
+    """
+
+    dependencies = [
+        ('projects', '0012_project_deletion'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            CREATE UNLOGGED TABLE IF NOT EXISTS channels_spillover (
+                id BIGSERIAL PRIMARY KEY,
+                payload TEXT NOT NULL,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+            """,
+            "DROP TABLE IF EXISTS channels_spillover",
+        ),
+    ]
@@ -1,8 +1,75 @@
-from django.db import models
-from django.utils.text import slugify
+from collections import Counter
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import connections, models, router, transaction
+from django.db.models import Count, F, Q
+from core.slugs import save_with_unique_slug
 from organizations.models import Organization
 from users.models import User
 
+# Text search configuration of the generated search_vector columns
+SEARCH_CONFIG = 'english'
+
+# Project columns counting the project's tasks per status
+TASK_COUNTER_FIELDS = {
+    'TODO': 'todo_count',
+    'IN_PROGRESS': 'in_progress_count',
+    'DONE': 'done_count',
+}
+
+class ProjectQuerySet(models.QuerySet):
+    def reconcile_task_counts(self):
+        """
+        Recount the tasks of these projects and repair counters that drifted.
+        
+        Each project row is locked while it is counted, so task writes that
+        commit meanwhile are either seen by the count or applied after it.
+        Returns the projects that were fixed, with their counters updated.
+        """
+        fixed = []
+        with transaction.atomic(using=self.db):
+            projects = list(self.select_for_update(of=('self',)).order_by('pk'))
+            counts = {
+                row['pk']: row
+                for row in Project.objects.using(self.db).filter(pk__in=[project.pk for project in projects]).values('pk').annotate(**{
+                    field: Count('task', filter=Q(task__status=status))
+                    for status, field in TASK_COUNTER_FIELDS.items()
+                })
+            }
+            for project in projects:
+                actual = counts[project.pk]
+                if any(getattr(project, field) != actual[field] for field in TASK_COUNTER_FIELDS.values()):
+                    for field in TASK_COUNTER_FIELDS.values():
+                        setattr(project, field, actual[field])
+                    fixed.append(project)
+            Project.objects.using(self.db).bulk_update(fixed, list(TASK_COUNTER_FIELDS.values()))
+        return fixed
+
+def apply_task_count_changes(changes, using=None):
+    """
+    Add ``changes`` ({(project_id, status): delta}) to the project counters.
+    
+    Counters are only ever moved with ``F()`` expressions, one UPDATE per
+    project in id order, so concurrent writers don't lose increments or
+    deadlock on each other. Call inside the transaction writing the tasks.
+    """
+    per_project = {}
+    for (project_id, status), delta in changes.items():
+        if delta and status in TASK_COUNTER_FIELDS:
+            field = TASK_COUNTER_FIELDS[status]
+            per_project.setdefault(project_id, Counter())[field] += delta
+    for project_id in sorted(per_project):
+        Project.objects.using(using).filter(pk=project_id).update(**{
+            field: F(field) + delta for field, delta in per_project[project_id].items() if delta
+        })
+
+class VisibleProjectManager(models.Manager):
+    """Projects not awaiting deletion; ``all_objects`` includes those too"""
+    
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
 class Project(models.Model):
     STATUS_CHOICES = [
         ('ACTIVE', 'Active'),
@@ -17,20 +84,139 @@ class Project(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='ACTIVE')
     due_date = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Kept up to date by Task writes (see TaskQuerySet); repair with reconcile_task_counts
+    todo_count = models.IntegerField(default=0, editable=False)
+    in_progress_count = models.IntegerField(default=0, editable=False)
+    done_count = models.IntegerField(default=0, editable=False)
+    # Set when deletion is requested; the project is hidden from then on
+    # while projects.deletion removes its rows
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    
+    objects = VisibleProjectManager.from_queryset(ProjectQuerySet)()
+    all_objects = ProjectQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Keyset pagination: projectsConnection orders by (created_at, id)
+            models.Index(fields=['organization', 'created_at', 'id'], name='project_org_created_idx'),
+        ]
     
     def __str__(self):
         return self.name
     
+    @property
+    def task_count(self):
+        return self.todo_count + self.in_progress_count + self.done_count
+    
     def save(self, *args, **kwargs):
+        if not self._state.adding and not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # The counters on this instance may be stale; only F() updates write them
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in TASK_COUNTER_FIELDS.values()
+            ]
         if not self.slug:
-            base_slug = slugify(self.name)
-            slug = base_slug
-            counter = 1
-            while Project.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slug
+            save_with_unique_slug(self, self.name, lambda: super(Project, self).save(*args, **kwargs))
+            return
         super().save(*args, **kwargs)
+    
+    def make_task_id(self, number):
+        return f"{self.slug.upper()}-{number}"
+
+class SequenceManager(models.Manager):
+    """Counter rows keyed by their owner (one-to-one primary key) with a ``last_number`` column"""
+    
+    def allocate(self, owner, count=1):
+        """
+        Reserve ``count`` consecutive numbers for ``owner``.
+        
+        A single ``UPDATE ... RETURNING`` bumps the counter, so concurrent
+        writers each get a distinct range without reading existing rows.
+        """
+        ops = connections[self.db].ops
+        table = ops.quote_name(self.model._meta.db_table)
+        owner_column = ops.quote_name(self.model._meta.pk.column)
+        sql = f"UPDATE {table} SET last_number = last_number + %s WHERE {owner_column} = %s RETURNING last_number"
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, [count, owner.pk])
+            row = cursor.fetchone()
+            if row is None:
+                # First allocation for this owner
+                self.get_or_create(pk=owner.pk)
+                cursor.execute(sql, [count, owner.pk])
+                row = cursor.fetchone()
+        last_number = row[0]
+        return range(last_number - count + 1, last_number + 1)
+
+class TaskSequence(models.Model):
+    """Per-project counter behind task IDs like PROJECT-1, PROJECT-2"""
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, primary_key=True, related_name='task_sequence')
+    last_number = models.PositiveIntegerField(default=0)
+    
+    objects = SequenceManager()
+    
+    def __str__(self):
+        return f"{self.project.slug}: {self.last_number}"
+
+class TaskQuerySet(models.QuerySet):
+    """
+    Bulk operations that keep the project task counters in step.
+    
+    Rows are locked and their (project, status) read before they change, so
+    the counter deltas match what was actually written.
+    """
+    
+    def _locked_counts(self):
+        return list(self.select_for_update(of=('self',)).order_by('pk').values_list('pk', 'project_id', 'status'))
+    
+    def _rows(self, pks):
+        # Unfiltered, so the write covers exactly the rows that were locked and counted
+        return TaskQuerySet(self.model, using=self.db).filter(pk__in=pks)
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            if kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'):
+                # Which rows were inserted isn't known; recount instead
+                Project.objects.using(self.db).filter(pk__in={obj.project_id for obj in objs}).reconcile_task_counts()
+            else:
+                apply_task_count_changes(Counter((obj.project_id, obj.status) for obj in created), self.db)
+        return created
+    
+    def update(self, **kwargs):
+        # Also covers bulk_update(), which is built on update()
+        if not {'status', 'project', 'project_id'} & set(kwargs):
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            before = self._locked_counts()
+            rows = self._rows([pk for pk, _, _ in before])
+            updated = super(TaskQuerySet, rows).update(**kwargs)
+            changes = Counter((project_id, status) for project_id, status in rows.values_list('project_id', 'status'))
+            changes.subtract((project_id, status) for _, project_id, status in before)
+            apply_task_count_changes(changes, self.db)
+        return updated
+    
+    update.alters_data = True
+    
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            before = self._locked_counts()
+            rows = self._rows([pk for pk, _, _ in before])
+            deleted = super(TaskQuerySet, rows).delete()
+            changes = Counter()
+            changes.subtract((project_id, status) for _, project_id, status in before)
+            apply_task_count_changes(changes, self.db)
+        return deleted
+    
+    delete.alters_data = True
+    delete.queryset_only = True
+
+class VisibleTaskManager(models.Manager):
+    """Tasks of projects not awaiting deletion; ``all_objects`` includes the rest"""
+    
+    def get_queryset(self):
+        return super().get_queryset().filter(project__deleted_at__isnull=True)
 
 class Task(models.Model):
     TASK_STATUS_CHOICES = [
@@ -47,32 +233,161 @@ class Task(models.Model):
     assignee = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_tasks')
     due_date = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Maintained by Postgres on every write, including bulk_create/bulk_update
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+    
+    objects = VisibleTaskManager.from_queryset(TaskQuerySet)()
+    all_objects = TaskQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['project', 'created_at', 'id'], name='task_project_created_idx'),
+            GinIndex(fields=['search_vector'], name='task_search_idx'),
+        ]
     
     def __str__(self):
         return f"{self.task_id} - {self.title}"
     
     def save(self, *args, **kwargs):
-        if not self.task_id:
-            # Generate task_id like "PROJECT-1", "PROJECT-2", etc.
-            last_task = Task.objects.filter(project=self.project).order_by('-id').first()
-            last_number = 0
-            if last_task:
-                try:
-                    # Extract number from existing task_id
-                    last_number = int(last_task.task_id.split('-')[1])
-                except (IndexError, ValueError):
-                    # If parsing fails, count existing tasks
-                    last_number = Task.objects.filter(project=self.project).count()
+        using = kwargs.get('using') or router.db_for_write(Task, instance=self)
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic(using=using):
+            if not self.task_id:
+                # Generate task_id like "PROJECT-1", "PROJECT-2", etc.
+                number = TaskSequence.objects.allocate(self.project)[0]
+                self.task_id = self.project.make_task_id(number)
             
-            self.task_id = f"{self.project.slug.upper()}-{last_number + 1}"
-        
-        super().save(*args, **kwargs)
+            counted = update_fields is None or bool({'status', 'project', 'project_id'} & set(update_fields))
+            before = None
+            if counted and self.pk is not None:
+                before = Task.objects.using(using).filter(pk=self.pk)._locked_counts()
+            
+            super().save(*args, **kwargs)
+            
+            if counted:
+                changes = Counter({(self.project_id, self.status): 1})
+                changes.subtract((project_id, status) for _, project_id, status in before or [])
+                apply_task_count_changes(changes, using)
+    
+    def delete(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(Task, instance=self)
+        with transaction.atomic(using=using):
+            before = Task.objects.using(using).filter(pk=self.pk)._locked_counts()
+            deleted = super().delete(*args, **kwargs)
+            changes = Counter()
+            changes.subtract((project_id, status) for _, project_id, status in before)
+            apply_task_count_changes(changes, using)
+        return deleted
+
+class CommentSequence(models.Model):
+    """Per-task counter behind TaskComment.seq"""
+    task = models.OneToOneField(Task, on_delete=models.CASCADE, primary_key=True, related_name='comment_sequence')
+    last_number = models.PositiveIntegerField(default=0)
+    
+    objects = SequenceManager()
+    
+    def __str__(self):
+        return f"{self.task.task_id}: {self.last_number}"
 
 class TaskComment(models.Model):
     task = models.ForeignKey(Task, on_delete=models.CASCADE)
+    # Gap-free position within the task, so clients can detect missed events
+    seq = models.PositiveIntegerField(default=0)
     content = models.TextField()
     author = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='comments')
     timestamp = models.DateTimeField(auto_now_add=True)
+    search_vector = models.GeneratedField(
+        expression=SearchVector('content', config=SEARCH_CONFIG),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+    
+    class Meta:
+        # The table is partitioned by month of timestamp (see projects.partitions),
+        # so its primary key is (id, timestamp) and (task, seq) can't be declared
+        # unique: CommentSequence hands out each seq once
+        indexes = [
+            models.Index(fields=['task', 'timestamp', 'id'], name='comment_task_timestamp_idx'),
+            GinIndex(fields=['search_vector'], name='comment_search_idx'),
+            models.Index(fields=['task', 'seq'], name='comment_task_seq_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Comment by {self.author.email if self.author else 'Unknown'} on {self.task.title}"
+    
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(TaskComment, instance=self)
+        # The sequence row stays locked until the comment commits, so a failed
+        # insert doesn't burn its seq and comments commit in seq order
+        with transaction.atomic(using=using):
+            if not self.seq:
+                self.seq = CommentSequence.objects.allocate(self.task)[0]
+            super().save(*args, **kwargs)
+
+class TaskImport(models.Model):
+    """
+    Progress of a bulk task import (see ``projects.importer``). Every batch
+    of tasks commits together with these counters, so an interrupted import
+    resumes right after the last record it committed.
+    """
+    STATUS_CHOICES = [
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='task_imports')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='task_imports')
+    source = models.CharField(max_length=255)
+    # sha256 of the start of the input, to refuse resuming with another file
+    fingerprint = models.CharField(max_length=64)
+    format = models.CharField(max_length=10)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='RUNNING')
+    records_read = models.PositiveIntegerField(default=0)
+    imported = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    # The first rejected records as {"record": n, "error": "..."}
+    errors = models.JSONField(default=list, blank=True)
+    # Why the import stopped, if it failed
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Import {self.pk} of {self.source} into {self.organization.slug}: {self.status}"
+
+class ProjectDeletion(models.Model):
+    """
+    Progress of deleting a project (see ``projects.deletion``). The project
+    row goes last, so the ids here outlive it.
+    """
+    STATUS_CHOICES = [
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='project_deletions')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='project_deletions')
+    project_id = models.BigIntegerField()
+    project_name = models.CharField(max_length=200)
+    project_slug = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='RUNNING')
+    tasks_total = models.PositiveIntegerField(default=0)
+    tasks_deleted = models.PositiveIntegerField(default=0)
+    comments_deleted = models.PositiveIntegerField(default=0)
+    # Why the deletion stopped, if it failed
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return f"Comment by {self.author.email if self.author else 'Unknown'} on {self.task.title}"
\ No newline at end of file
+        return f"Deletion {self.pk} of {self.project_slug}: {self.status}"
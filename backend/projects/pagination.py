@@ -0,0 +1,65 @@
+import base64
+import binascii
+
+from django.db.models import F, Field, Func, Value
+from django.utils.dateparse import parse_datetime
+from graphene.relay import PageInfo
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(value, pk):
+    """Opaque cursor for a row's position in (value, id) order"""
+    raw = f"{value.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        value, pk = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+        timestamp = parse_datetime(value)
+        if timestamp is None:
+            raise ValueError(value)
+        return timestamp, int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise Exception("Invalid cursor")
+
+
+def paginate(queryset, connection_type, order_field, first=None, after=None):
+    """
+    Keyset-paginate ``queryset`` on ``(order_field, id)`` into ``connection_type``.
+
+    The ``after`` cursor becomes the row-value comparison
+    ``(order_field, id) > (value, pk)`` rather than an OFFSET. Postgres
+    starts the range scan of the (..., order_field, id) index at the cursor,
+    so every page reads ``first + 1`` rows no matter how deep it is. (The
+    equivalent ``a > v OR (a = v AND id > pk)`` is no index bound at all.)
+    """
+    if first is None:
+        first = DEFAULT_PAGE_SIZE
+    if first < 0:
+        raise Exception("first must be a non-negative integer")
+    first = min(first, MAX_PAGE_SIZE)
+
+    if after:
+        value, pk = decode_cursor(after)
+        queryset = queryset.alias(
+            _keyset=Func(F(order_field), F('id'), function='ROW', output_field=Field()),
+        ).filter(_keyset__gt=Func(Value(value), Value(pk), function='ROW', output_field=Field()))
+
+    rows = list(queryset.order_by(order_field, 'id')[:first + 1])
+    has_next_page = len(rows) > first
+    rows = rows[:first]
+
+    edges = [
+        connection_type.Edge(node=row, cursor=encode_cursor(getattr(row, order_field), row.pk))
+        for row in rows
+    ]
+    page_info = PageInfo(
+        start_cursor=edges[0].cursor if edges else None,
+        end_cursor=edges[-1].cursor if edges else None,
+        has_previous_page=bool(after),
+        has_next_page=has_next_page,
+    )
+    return connection_type(edges=edges, page_info=page_info)
@@ -0,0 +1,167 @@
+"""
+Monthly range partitions of projects_taskcomment (by ``timestamp``, UTC).
+
+Partitions are named ``projects_taskcomment_pYYYY_MM``; migration
+projects.0011 created one for every month that had comments. A default
+partition catches rows no partition covers, so inserts never fail for lack
+of one.
+"""
+import gzip
+import os
+import re
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from django.db import connection, transaction
+
+TABLE = 'projects_taskcomment'
+DEFAULT_PARTITION = f'{TABLE}_default'
+MONTHLY_NAME = re.compile(rf'^{TABLE}_p\d{{4}}_\d{{2}}$')
+# Written to archives and read back when restoring one; search_vector is generated
+COLUMNS = ('id', 'task_id', 'seq', 'author_id', 'content', 'timestamp')
+# DDL on the parent waits at most this long for its lock, rather than
+# queueing every comment query behind it
+LOCK_TIMEOUT = '5s'
+
+_BOUNDS = re.compile(r"FROM \('(?P<start>[^']+)'\) TO \('(?P<end>[^']+)'\)")
+
+# start and end are None for the default partition
+Partition = namedtuple('Partition', ['name', 'start', 'end', 'rows', 'size'])
+
+
+def month_start(moment):
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y_%m}'
+
+
+def _quoted_columns():
+    return ', '.join(f'"{column}"' for column in COLUMNS)
+
+
+def list_partitions(cursor):
+    """The partitions of the comments table by start, with estimated rows and size on disk"""
+    cursor.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples, pg_total_relation_size(c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, [TABLE])
+    partitions = []
+    for name, bound, rows, size in cursor.fetchall():
+        match = _BOUNDS.search(bound)
+        start = end = None
+        if match is not None:
+            start = datetime.fromisoformat(match['start'])
+            end = datetime.fromisoformat(match['end'])
+        # reltuples is -1 until the table is first analyzed
+        partitions.append(Partition(name, start, end, max(int(rows), 0), size))
+    return sorted(partitions, key=lambda p: (p.end is None, p.start))
+
+
+def detached_partitions(cursor):
+    """Former partitions left detached, by --detach-only or an archive run that was interrupted"""
+    cursor.execute("""
+        SELECT relname FROM pg_class
+        WHERE relkind = 'r' AND NOT relispartition AND relname LIKE %s
+        ORDER BY relname
+    """, [f'{TABLE}\\_%'])
+    return [name for name, in cursor.fetchall() if MONTHLY_NAME.match(name)]
+
+
+def _lock_timeout(cursor):
+    cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+
+
+def covering_partition(partitions, month):
+    """The partition holding rows of ``month``, if any other than the default one"""
+    start, end = month_start(month), add_months(month_start(month), 1)
+    for partition in partitions:
+        if partition.end is not None and partition.start < end and start < partition.end:
+            return partition
+    return None
+
+
+def create_partition(month):
+    """
+    Create the partition for ``month`` unless one already covers it; returns
+    whether it did. Rows the default partition took for that month are moved
+    into the new one.
+    """
+    start, end = month_start(month), add_months(month_start(month), 1)
+    name = partition_name(start)
+    with transaction.atomic(), connection.cursor() as cursor:
+        if covering_partition(list_partitions(cursor), start) is not None:
+            return False
+        _lock_timeout(cursor)
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s)',
+            [start, end],
+        )
+        strays, = cursor.fetchone()
+        if not strays:
+            cursor.execute(f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)", [start, end])
+            return True
+        # Postgres won't create a partition for rows the default one holds
+        columns = _quoted_columns()
+        cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT_PARTITION}")
+        cursor.execute(f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)", [start, end])
+        cursor.execute(f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING {columns}
+            )
+            INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM moved
+        """, [start, end])
+        cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT")
+    return True
+
+
+def detach_partition(name):
+    """
+    Take ``name`` out of the comments table. Its foreign keys go too: the
+    rows are an archive now, and must not stop tasks or users being deleted.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        _lock_timeout(cursor)
+        cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+        cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'", [name])
+        for constraint, in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE {name} DROP CONSTRAINT {constraint}")
+
+
+def archive_table(name, directory):
+    """
+    Write the detached partition ``name`` to ``<directory>/<name>.csv.gz``
+    and drop it once the file holds every row. Returns (path, rows).
+    """
+    path = os.path.join(directory, f'{name}.csv.gz')
+    partial = f'{path}.partial'
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM {name}")
+        rows, = cursor.fetchone()
+        with gzip.open(partial, 'wb') as archive:
+            cursor.copy_expert(
+                f"COPY (SELECT {_quoted_columns()} FROM {name} ORDER BY id) TO STDOUT WITH (FORMAT csv, HEADER)",
+                archive,
+            )
+            copied = cursor.rowcount
+        if copied != rows:
+            os.remove(partial)
+            raise RuntimeError(f"Archived {copied} of the {rows} rows of {name}; it was kept")
+        with open(partial, 'rb') as archive:
+            os.fsync(archive.fileno())
+        os.replace(partial, path)
+        cursor.execute(f"DROP TABLE {name}")
+    return path, rows
+
+
+def expired_partitions(cursor, retain_months, now=None):
+    """Partitions ending before the start of the month ``retain_months`` before this one"""
+    cutoff = add_months(month_start(now or datetime.now(timezone.utc)), -retain_months)
+    return [p for p in list_partitions(cursor) if p.end is not None and p.end <= cutoff]
@@ -1,6 +1,8 @@
 from django.urls import path
-from .consumers import TaskCommentConsumer
+from .consumers import StreamConsumer, TaskCommentConsumer
 
 websocket_urlpatterns = [
     path('ws/tasks/<str:org_slug>/<str:task_id>/comments/', TaskCommentConsumer.as_asgi()),
+    # Multiplexed: one socket, subscribe/unsubscribe messages per task or project
+    path('ws/stream/', StreamConsumer.as_asgi()),
 ]
\ No newline at end of file
@@ -1,13 +1,34 @@
 import graphene
 from graphene_django import DjangoObjectType
 from graphql_jwt.decorators import login_required
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 
-from .models import Project, Task, TaskComment
+from core.result_cache import bump_org_version
+from core.selection import selected_fields
+from jobs.schema import JobType
+from users.authorization import get_membership, require_membership
+from .models import Project, ProjectDeletion, Task, TaskComment, TaskSequence
+from .dashboard import org_dashboard
+from .deletion import DeletionInProgress, request_deletion, start_deletion
+from .events import broadcast, comment_event, project_tasks_group, task_comments_group, task_payload, tasks_event
+from .pagination import paginate
+from .search import encode_search_cursor, search_tasks
 from organizations.models import Organization
 from users.models import User, OrganizationMember
 
+def with_related(queryset, info, relations, *path):
+    """select_related() only the foreign keys the query actually selected"""
+    fields = selected_fields(info, *path)
+    selected = [relation for relation in relations if relation in fields]
+    return queryset.select_related(*selected) if selected else queryset
+
+def slug_taken_error(project):
+    if project.deleted_at is not None:
+        # Its tasks' IDs still use the slug until the deletion finishes
+        return "A project with this slug is being deleted; pick another slug or try again later"
+    return "Project with this slug already exists in this organization"
+
 # Project Type
 class ProjectType(DjangoObjectType):
     task_count = graphene.Int()
@@ -18,10 +39,11 @@ class ProjectType(DjangoObjectType):
         fields = ("id", "name", "slug", "description", "status", "due_date", "created_at")
     
     def resolve_task_count(self, info):
-        return self.task_set.count()
+        # Counter columns maintained on task writes, no COUNT query needed
+        return self.task_count
     
     def resolve_completed_tasks(self, info):
-        return self.task_set.filter(status='DONE').count()
+        return self.done_count
 
 # Task Type
 class TaskType(DjangoObjectType):
@@ -33,7 +55,41 @@ class TaskType(DjangoObjectType):
 class TaskCommentType(DjangoObjectType):
     class Meta:
         model = TaskComment
-        fields = ("id", "content", "author", "timestamp", "task")
+        fields = ("id", "seq", "content", "author", "timestamp", "task")
+
+# Project Deletion Type
+class ProjectDeletionType(DjangoObjectType):
+    class Meta:
+        model = ProjectDeletion
+        fields = (
+            "id", "project_name", "project_slug", "status", "tasks_total", "tasks_deleted",
+            "comments_deleted", "error", "created_at", "updated_at",
+        )
+
+# Connection Types (keyset-paginated lists)
+class ProjectConnection(graphene.relay.Connection):
+    class Meta:
+        node = ProjectType
+
+class TaskConnection(graphene.relay.Connection):
+    class Meta:
+        node = TaskType
+
+class TaskCommentConnection(graphene.relay.Connection):
+    class Meta:
+        node = TaskCommentType
+
+class TaskSearchConnection(graphene.relay.Connection):
+    class Meta:
+        node = TaskType
+    
+    # True when the term matched more than MAX_RANKED_HITS tasks or comments
+    # and only the newest of them were searched
+    truncated = graphene.Boolean()
+    
+    class Edge:
+        rank = graphene.Float()
+        snippet = graphene.String()  # HTML-escaped matching text with <mark>…</mark> around hits
 
 # Date Scalar
 class Date(graphene.Scalar):
@@ -84,6 +140,60 @@ class UpdateTaskInput(graphene.InputObjectType):
     due_date = Date()
     assignee_email = graphene.String()  # Optional field
 
+# Bulk Task Input Types
+class BulkTaskInput(graphene.InputObjectType):
+    title = graphene.String(required=True)
+    description = graphene.String()
+    status = graphene.String()
+    due_date = Date()
+    assignee_email = graphene.String()
+
+class BulkUpdateTaskInput(UpdateTaskInput):
+    task_id = graphene.String(required=True)
+
+# Per-item outcome of a bulk mutation, in input order
+class BulkTaskResult(graphene.ObjectType):
+    index = graphene.Int()
+    task_id = graphene.String()
+    task = graphene.Field(TaskType)
+    success = graphene.Boolean()
+    errors = graphene.List(graphene.String)
+
+# Organization Dashboard Types
+class DashboardCounts(graphene.Interface):
+    todo = graphene.Int()
+    in_progress = graphene.Int()
+    done = graphene.Int()
+    total = graphene.Int()
+    overdue = graphene.Int()  # Not DONE and past due_date
+    due_this_week = graphene.Int()  # Not DONE and due between Monday and Sunday
+
+class DashboardTotals(graphene.ObjectType):
+    class Meta:
+        interfaces = (DashboardCounts,)
+
+class ProjectDashboard(graphene.ObjectType):
+    slug = graphene.String()
+    name = graphene.String()
+    status = graphene.String()
+    
+    class Meta:
+        interfaces = (DashboardCounts,)
+
+class AssigneeWorkload(graphene.ObjectType):
+    email = graphene.String()  # null for unassigned tasks
+    name = graphene.String()
+    
+    class Meta:
+        interfaces = (DashboardCounts,)
+
+class OrgDashboard(graphene.ObjectType):
+    generated_at = graphene.DateTime()
+    week_start = graphene.DateTime()
+    totals = graphene.Field(DashboardTotals)
+    projects = graphene.List(ProjectDashboard)
+    assignees = graphene.List(AssigneeWorkload)
+
 # Project Mutations
 class CreateProject(graphene.Mutation):
     class Arguments:
@@ -99,18 +209,16 @@ class CreateProject(graphene.Mutation):
             user = info.context.user
             
             # Check if user belongs to the organization
-            try:
-                organization_member = OrganizationMember.objects.get(
-                    user=user,
-                    organization__slug=input.organization_slug
-                )
-                organization = organization_member.organization
-            except OrganizationMember.DoesNotExist:
+            membership = get_membership(user, input.organization_slug, info.context)
+            if membership is None:
                 return CreateProject(success=False, errors=["You don't have access to this organization"])
+            organization = membership.organization
             
             # Check if slug is already taken in this organization
-            if input.slug and Project.objects.filter(organization=organization, slug=input.slug).exists():
-                return CreateProject(success=False, errors=["Project with this slug already exists in this organization"])
+            if input.slug:
+                taken = Project.all_objects.filter(organization=organization, slug=input.slug).first()
+                if taken is not None:
+                    return CreateProject(success=False, errors=[slug_taken_error(taken)])
             
             # Create project
             project = Project.objects.create(
@@ -121,6 +229,7 @@ class CreateProject(graphene.Mutation):
                 status=input.status or "ACTIVE",
                 due_date=input.due_date
             )
+            bump_org_version(organization.pk)
             return CreateProject(project=project, success=True, errors=[])
         except Exception as e:
             return CreateProject(success=False, errors=[str(e)])
@@ -141,14 +250,10 @@ class UpdateProject(graphene.Mutation):
             user = info.context.user
             
             # Check if user belongs to the organization
-            try:
-                organization_member = OrganizationMember.objects.get(
-                    user=user,
-                    organization__slug=organization_slug
-                )
-                organization = organization_member.organization
-            except OrganizationMember.DoesNotExist:
+            membership = get_membership(user, organization_slug, info.context)
+            if membership is None:
                 return UpdateProject(success=False, errors=["You don't have access to this organization"])
+            organization = membership.organization
             
             # Get the project
             try:
@@ -161,8 +266,9 @@ class UpdateProject(graphene.Mutation):
             
             # Check if new slug is already taken (if provided and different from current)
             if input.slug and input.slug != project.slug:
-                if Project.objects.filter(organization=organization, slug=input.slug).exists():
-                    return UpdateProject(success=False, errors=["Project with this slug already exists in this organization"])
+                taken = Project.all_objects.filter(organization=organization, slug=input.slug).first()
+                if taken is not None:
+                    return UpdateProject(success=False, errors=[slug_taken_error(taken)])
             
             # Update fields
             if input.name is not None:
@@ -177,6 +283,7 @@ class UpdateProject(graphene.Mutation):
                 project.due_date = input.due_date
             
             project.save()
+            bump_org_version(organization.pk)
             return UpdateProject(project=project, success=True, errors=[])
         except Exception as e:
             return UpdateProject(success=False, errors=[str(e)])
@@ -186,6 +293,9 @@ class DeleteProject(graphene.Mutation):
         project_slug = graphene.String(required=True)
         organization_slug = graphene.String(required=True)
     
+    deletion = graphene.Field(ProjectDeletionType)
+    # The background job deleting a big project's rows, otherwise null
+    job = graphene.Field(JobType)
     success = graphene.Boolean()
     errors = graphene.List(graphene.String)
     
@@ -195,14 +305,10 @@ class DeleteProject(graphene.Mutation):
             user = info.context.user
             
             # Check if user belongs to the organization
-            try:
-                organization_member = OrganizationMember.objects.get(
-                    user=user,
-                    organization__slug=organization_slug
-                )
-                organization = organization_member.organization
-            except OrganizationMember.DoesNotExist:
+            membership = get_membership(user, organization_slug, info.context)
+            if membership is None:
                 return DeleteProject(success=False, errors=["You don't have access to this organization"])
+            organization = membership.organization
             
             # Get the project
             try:
@@ -213,9 +319,16 @@ class DeleteProject(graphene.Mutation):
             except Project.DoesNotExist:
                 return DeleteProject(success=False, errors=["Project not found"])
             
-            # Delete the project (this will cascade delete tasks and comments)
-            project.delete()
-            return DeleteProject(success=True, errors=[])
+            # Hidden right away; its tasks and comments are deleted in batches,
+            # by a background job for big projects (see projects.deletion)
+            deletion = request_deletion(project, user)
+            try:
+                job = start_deletion(deletion, user)
+            except DeletionInProgress as e:
+                return DeleteProject(deletion=deletion, success=False, errors=[str(e)])
+            if deletion.status == 'FAILED':
+                return DeleteProject(deletion=deletion, success=False, errors=[deletion.error])
+            return DeleteProject(deletion=deletion, job=job, success=True, errors=[])
         except Exception as e:
             return DeleteProject(success=False, errors=[str(e)])
 
@@ -234,14 +347,10 @@ class CreateTask(graphene.Mutation):
             user = info.context.user
             
             # Check if user belongs to the organization
-            try:
-                organization_member = OrganizationMember.objects.get(
-                    user=user,
-                    organization__slug=input.organization_slug
-                )
-                organization = organization_member.organization
-            except OrganizationMember.DoesNotExist:
+            membership = get_membership(user, input.organization_slug, info.context)
+            if membership is None:
                 return CreateTask(success=False, errors=["You don't have access to this organization"])
+            organization = membership.organization
             
             # Get the project
             try:
@@ -277,6 +386,11 @@ class CreateTask(graphene.Mutation):
                 due_date=input.due_date,
                 assignee=assignee
             )
+            bump_org_version(organization.pk)
+            broadcast(
+                project_tasks_group(organization.slug, project.slug),
+                tasks_event('created', [task_payload(task)], organization.slug, project.slug)
+            )
             return CreateTask(task=task, success=True, errors=[])
         except Exception as e:
             return CreateTask(success=False, errors=[str(e)])
@@ -297,18 +411,14 @@ class UpdateTask(graphene.Mutation):
             user = info.context.user
             
             # Check if user belongs to the organization
-            try:
-                organization_member = OrganizationMember.objects.get(
-                    user=user,
-                    organization__slug=org_slug
-                )
-                organization = organization_member.organization
-            except OrganizationMember.DoesNotExist:
+            membership = get_membership(user, org_slug, info.context)
+            if membership is None:
                 return UpdateTask(success=False, errors=["You don't have access to this organization"])
+            organization = membership.organization
             
             # SIMPLE: Get the task directly by task_id and verify it belongs to user's organization
             try:
-                task = Task.objects.get(
+                task = Task.objects.select_related('project').get(
                     task_id=task_id.upper(),  # Use the stored task_id field
                     project__organization=organization  # Ensure task belongs to user's org
                 )
@@ -344,6 +454,11 @@ class UpdateTask(graphene.Mutation):
                 task.due_date = input.due_date
             
             task.save()
+            bump_org_version(organization.pk)
+            broadcast(
+                project_tasks_group(organization.slug, task.project.slug),
+                tasks_event('updated', [task_payload(task)], organization.slug, task.project.slug)
+            )
             return UpdateTask(task=task, success=True, errors=[])
         except Exception as e:
             return UpdateTask(success=False, errors=[str(e)])
@@ -362,18 +477,14 @@ class DeleteTask(graphene.Mutation):
             user = info.context.user
             
             # Check if user belongs to the organization
-            try:
-                organization_member = OrganizationMember.objects.get(
-                    user=user,
-                    organization__slug=org_slug
-                )
-                organization = organization_member.organization
-            except OrganizationMember.DoesNotExist:
+            membership = get_membership(user, org_slug, info.context)
+            if membership is None:
                 return DeleteTask(success=False, errors=["You don't have access to this organization"])
+            organization = membership.organization
             
             # SIMPLE: Get the task directly by task_id
             try:
-                task = Task.objects.get(
+                task = Task.objects.select_related('project').get(
                     task_id=task_id.upper(),
                     project__organization=organization
                 )
@@ -381,11 +492,234 @@ class DeleteTask(graphene.Mutation):
                 return DeleteTask(success=False, errors=["Task not found"])
             
             # Delete the task
+            payload = task_payload(task)
             task.delete()
+            bump_org_version(organization.pk)
+            broadcast(
+                project_tasks_group(organization.slug, task.project.slug),
+                tasks_event('deleted', [payload], organization.slug, task.project.slug)
+            )
             return DeleteTask(success=True, errors=[])
         except Exception as e:
             return DeleteTask(success=False, errors=[str(e)])
 
+# Bulk Task Mutations
+MAX_BULK_TASKS = 500
+
+def group_by_project(tasks):
+    """Event payloads of ``tasks`` keyed by project slug"""
+    grouped = {}
+    for task in tasks:
+        grouped.setdefault(task.project.slug, []).append(task_payload(task))
+    return grouped
+
+def resolve_assignees(organization, emails):
+    """Map each email to its user, or to an error message, with one query"""
+    emails = {email for email in emails if email}
+    if not emails:
+        return {}
+    users = User.objects.filter(email__in=emails).annotate(
+        is_member=Exists(OrganizationMember.objects.filter(user=OuterRef('pk'), organization=organization))
+    )
+    assignees = {email: "User with this email not found" for email in emails}
+    for user in users:
+        assignees[user.email] = user if user.is_member else "Assignee must be a member of the organization"
+    return assignees
+
+class BulkCreateTasks(graphene.Mutation):
+    class Arguments:
+        org_slug = graphene.String(required=True)
+        project_slug = graphene.String(required=True)
+        tasks = graphene.List(graphene.NonNull(BulkTaskInput), required=True)
+    
+    results = graphene.List(BulkTaskResult)
+    success = graphene.Boolean()
+    errors = graphene.List(graphene.String)
+    
+    @login_required
+    def mutate(self, info, org_slug, project_slug, tasks):
+        try:
+            user = info.context.user
+            
+            if len(tasks) > MAX_BULK_TASKS:
+                return BulkCreateTasks(success=False, errors=[f"At most {MAX_BULK_TASKS} tasks per request"])
+            
+            # Check if user belongs to the organization
+            membership = get_membership(user, org_slug, info.context)
+            if membership is None:
+                return BulkCreateTasks(success=False, errors=["You don't have access to this organization"])
+            organization = membership.organization
+            
+            # Get the project
+            try:
+                project = Project.objects.get(organization=organization, slug=project_slug)
+            except Project.DoesNotExist:
+                return BulkCreateTasks(success=False, errors=["Project not found"])
+            
+            assignees = resolve_assignees(organization, [item.assignee_email for item in tasks])
+            
+            results = []
+            new_tasks = []
+            for index, item in enumerate(tasks):
+                assignee = assignees.get(item.assignee_email) if item.assignee_email else None
+                if isinstance(assignee, str):
+                    results.append(BulkTaskResult(index=index, success=False, errors=[assignee]))
+                    continue
+                task = Task(
+                    project=project,
+                    title=item.title,
+                    description=item.description or "",
+                    status=item.status or "TODO",
+                    due_date=item.due_date,
+                    assignee=assignee
+                )
+                new_tasks.append(task)
+                results.append(BulkTaskResult(index=index, task=task, success=True, errors=[]))
+            
+            if new_tasks:
+                with transaction.atomic():
+                    numbers = TaskSequence.objects.allocate(project, len(new_tasks))
+                    for task, number in zip(new_tasks, numbers):
+                        task.task_id = project.make_task_id(number)
+                    Task.objects.bulk_create(new_tasks)
+                bump_org_version(organization.pk)
+                broadcast(
+                    project_tasks_group(organization.slug, project.slug),
+                    tasks_event('created', [task_payload(task) for task in new_tasks], organization.slug, project.slug)
+                )
+            
+            for result in results:
+                if result.task is not None:
+                    result.task_id = result.task.task_id
+            return BulkCreateTasks(results=results, success=len(new_tasks) == len(tasks), errors=[])
+        except Exception as e:
+            return BulkCreateTasks(success=False, errors=[str(e)])
+
+class BulkUpdateTasks(graphene.Mutation):
+    class Arguments:
+        org_slug = graphene.String(required=True)
+        tasks = graphene.List(graphene.NonNull(BulkUpdateTaskInput), required=True)
+    
+    results = graphene.List(BulkTaskResult)
+    success = graphene.Boolean()
+    errors = graphene.List(graphene.String)
+    
+    @login_required
+    def mutate(self, info, org_slug, tasks):
+        try:
+            user = info.context.user
+            
+            if len(tasks) > MAX_BULK_TASKS:
+                return BulkUpdateTasks(success=False, errors=[f"At most {MAX_BULK_TASKS} tasks per request"])
+            
+            # Check if user belongs to the organization
+            membership = get_membership(user, org_slug, info.context)
+            if membership is None:
+                return BulkUpdateTasks(success=False, errors=["You don't have access to this organization"])
+            organization = membership.organization
+            
+            existing = {
+                task.task_id: task
+                for task in Task.objects.filter(
+                    task_id__in=[item.task_id.upper() for item in tasks],
+                    project__organization=organization
+                ).select_related('project')
+            }
+            assignees = resolve_assignees(organization, [item.assignee_email for item in tasks])
+            
+            results = []
+            updated = {}
+            fields = set()
+            for index, item in enumerate(tasks):
+                task = existing.get(item.task_id.upper())
+                if task is None:
+                    results.append(BulkTaskResult(index=index, task_id=item.task_id, success=False, errors=["Task not found"]))
+                    continue
+                
+                if item.assignee_email is not None:
+                    if item.assignee_email == "":  # Allow clearing assignee
+                        task.assignee = None
+                    elif isinstance(assignees[item.assignee_email], str):
+                        results.append(BulkTaskResult(index=index, task_id=task.task_id, success=False, errors=[assignees[item.assignee_email]]))
+                        continue
+                    else:
+                        task.assignee = assignees[item.assignee_email]
+                    fields.add('assignee')
+                
+                for field in ('title', 'description', 'status', 'due_date'):
+                    if item.get(field) is not None:
+                        setattr(task, field, item.get(field))
+                        fields.add(field)
+                
+                updated[task.pk] = task
+                results.append(BulkTaskResult(index=index, task_id=task.task_id, task=task, success=True, errors=[]))
+            
+            if updated and fields:
+                with transaction.atomic():
+                    Task.objects.bulk_update(list(updated.values()), sorted(fields))
+                bump_org_version(organization.pk)
+                for project_slug, payloads in group_by_project(updated.values()).items():
+                    broadcast(
+                        project_tasks_group(organization.slug, project_slug),
+                        tasks_event('updated', payloads, organization.slug, project_slug)
+                    )
+            
+            return BulkUpdateTasks(results=results, success=all(result.success for result in results), errors=[])
+        except Exception as e:
+            return BulkUpdateTasks(success=False, errors=[str(e)])
+
+class BulkDeleteTasks(graphene.Mutation):
+    class Arguments:
+        org_slug = graphene.String(required=True)
+        task_ids = graphene.List(graphene.NonNull(graphene.String), required=True)
+    
+    results = graphene.List(BulkTaskResult)
+    success = graphene.Boolean()
+    errors = graphene.List(graphene.String)
+    
+    @login_required
+    def mutate(self, info, org_slug, task_ids):
+        try:
+            user = info.context.user
+            
+            if len(task_ids) > MAX_BULK_TASKS:
+                return BulkDeleteTasks(success=False, errors=[f"At most {MAX_BULK_TASKS} tasks per request"])
+            
+            # Check if user belongs to the organization
+            membership = get_membership(user, org_slug, info.context)
+            if membership is None:
+                return BulkDeleteTasks(success=False, errors=["You don't have access to this organization"])
+            organization = membership.organization
+            
+            with transaction.atomic():
+                tasks = Task.objects.filter(
+                    task_id__in=[task_id.upper() for task_id in task_ids],
+                    project__organization=organization
+                )
+                found = {task_id: project_slug for task_id, project_slug in tasks.values_list('task_id', 'project__slug')}
+                tasks.delete()
+            if found:
+                bump_org_version(organization.pk)
+            
+            deleted = {}
+            for task_id, project_slug in found.items():
+                deleted.setdefault(project_slug, []).append({'task_id': task_id})
+            for project_slug, payloads in deleted.items():
+                broadcast(
+                    project_tasks_group(organization.slug, project_slug),
+                    tasks_event('deleted', payloads, organization.slug, project_slug)
+                )
+            
+            results = [
+                BulkTaskResult(index=index, task_id=task_id.upper(), success=True, errors=[])
+                if task_id.upper() in found else
+                BulkTaskResult(index=index, task_id=task_id, success=False, errors=["Task not found"])
+                for index, task_id in enumerate(task_ids)
+            ]
+            return BulkDeleteTasks(results=results, success=all(result.success for result in results), errors=[])
+        except Exception as e:
+            return BulkDeleteTasks(success=False, errors=[str(e)])
+
 # Task Comment Mutation
 class CreateTaskComment(graphene.Mutation):
     class Arguments:
@@ -403,14 +737,10 @@ class CreateTaskComment(graphene.Mutation):
             user = info.context.user
             
             # Check if user belongs to the organization
-            try:
-                organization_member = OrganizationMember.objects.get(
-                    user=user,
-                    organization__slug=org_slug
-                )
-                organization = organization_member.organization
-            except OrganizationMember.DoesNotExist:
+            membership = get_membership(user, org_slug, info.context)
+            if membership is None:
                 return CreateTaskComment(success=False, errors=["You don't have access to this organization"])
+            organization = membership.organization
             
             # Get the task
             try:
@@ -427,27 +757,10 @@ class CreateTaskComment(graphene.Mutation):
                 content=content,
                 author=user
             )
+            bump_org_version(organization.pk)
             
             # Send real-time update via WebSocket
-            try:
-                channel_layer = get_channel_layer()
-                room_group_name = f'task_comments_{org_slug}_{task_id.upper()}'
-                
-                async_to_sync(channel_layer.group_send)(
-                    room_group_name,
-                    {
-                        'type': 'comment_message',
-                        'id': comment.id,
-                        'content': comment.content,
-                        'author_email': user.email,
-                        'author_id': user.id,
-                        'timestamp': comment.timestamp.isoformat(),
-                        'task_id': task_id.upper()
-                    }
-                )
-            except Exception as e:
-                # WebSocket might not be available, but comment is still saved
-                print(f"WebSocket error: {e}")
+            broadcast(task_comments_group(org_slug, task.task_id), comment_event(comment, org_slug, task.task_id))
             
             return CreateTaskComment(success=True, errors=[], comment=comment)
         except Exception as e:
@@ -461,70 +774,136 @@ class Query(graphene.ObjectType):
     task = graphene.Field(TaskType, org_slug=graphene.String(required=True), task_id=graphene.String(required=True))
     task_comments = graphene.List(TaskCommentType, org_slug=graphene.String(required=True), task_id=graphene.String(required=True))
     
+    # Paginated variants ordered by (created_at, id) / (timestamp, id)
+    projects_connection = graphene.Field(ProjectConnection, org_slug=graphene.String(required=True), first=graphene.Int(), after=graphene.String())
+    tasks_connection = graphene.Field(TaskConnection, org_slug=graphene.String(required=True), project_slug=graphene.String(required=True), first=graphene.Int(), after=graphene.String())
+    task_comments_connection = graphene.Field(TaskCommentConnection, org_slug=graphene.String(required=True), task_id=graphene.String(required=True), first=graphene.Int(), after=graphene.String())
+    
+    # Progress of a deleteProject that runs in the background
+    project_deletion = graphene.Field(ProjectDeletionType, org_slug=graphene.String(required=True), id=graphene.ID(required=True))
+    
+    # Status histograms, overdue and workload counts of the whole organization in one query
+    org_dashboard = graphene.Field(OrgDashboard, org_slug=graphene.String(required=True))
+    
+    # Full-text search over task titles, descriptions and comments, best match first
+    search_tasks = graphene.Field(TaskSearchConnection, org_slug=graphene.String(required=True), query=graphene.String(required=True), first=graphene.Int(), after=graphene.String())
+    
     @login_required
     def resolve_projects(self, info, org_slug):
-        user = info.context.user
         # Check if user has access to this organization
-        if not OrganizationMember.objects.filter(user=user, organization__slug=org_slug).exists():
-            raise Exception("You don't have access to this organization")
-        return Project.objects.filter(organization__slug=org_slug)
+        organization = require_membership(info, org_slug).organization
+        return Project.objects.filter(organization=organization)
     
     @login_required
     def resolve_project(self, info, org_slug, project_slug):
-        user = info.context.user
         # Check if user has access to this organization
-        if not OrganizationMember.objects.filter(user=user, organization__slug=org_slug).exists():
-            raise Exception("You don't have access to this organization")
+        organization = require_membership(info, org_slug).organization
         
         try:
-            return Project.objects.get(organization__slug=org_slug, slug=project_slug)
+            return Project.objects.get(organization=organization, slug=project_slug)
         except Project.DoesNotExist:
             return None
     
     @login_required
     def resolve_tasks(self, info, org_slug, project_slug):
-        user = info.context.user
         # Check if user has access to this organization
-        if not OrganizationMember.objects.filter(user=user, organization__slug=org_slug).exists():
-            raise Exception("You don't have access to this organization")
+        organization = require_membership(info, org_slug).organization
         
         try:
-            project = Project.objects.get(organization__slug=org_slug, slug=project_slug)
-            return Task.objects.filter(project=project)
+            project = Project.objects.get(organization=organization, slug=project_slug)
+            return with_related(Task.objects.filter(project=project), info, ['assignee'])
         except Project.DoesNotExist:
             return []
     
     @login_required
     def resolve_task(self, info, org_slug, task_id):
-        user = info.context.user
         # Check if user has access to this organization
-        if not OrganizationMember.objects.filter(user=user, organization__slug=org_slug).exists():
-            raise Exception("You don't have access to this organization")
+        organization = require_membership(info, org_slug).organization
         
         try:
             # SIMPLE: Get task directly by task_id and organization
-            return Task.objects.get(
+            return with_related(Task.objects.all(), info, ['assignee']).get(
                 task_id=task_id.upper(),
-                project__organization__slug=org_slug
+                project__organization=organization
             )
         except Task.DoesNotExist:
             return None
     
     @login_required
     def resolve_task_comments(self, info, org_slug, task_id):
-        user = info.context.user
         # Check if user has access to this organization
-        if not OrganizationMember.objects.filter(user=user, organization__slug=org_slug).exists():
-            raise Exception("You don't have access to this organization")
+        organization = require_membership(info, org_slug).organization
         
         try:
             task = Task.objects.get(
                 task_id=task_id.upper(),
-                project__organization__slug=org_slug
+                project__organization=organization
             )
-            return TaskComment.objects.filter(task=task).order_by('timestamp')
+            comments = with_related(TaskComment.objects.filter(task=task), info, ['author', 'task'])
+            return comments.order_by('timestamp')
         except Task.DoesNotExist:
             return []
+    
+    @login_required
+    def resolve_projects_connection(self, info, org_slug, first=None, after=None):
+        # Check if user has access to this organization
+        organization = require_membership(info, org_slug).organization
+        
+        projects = Project.objects.filter(organization=organization)
+        return paginate(projects, ProjectConnection, 'created_at', first, after)
+    
+    @login_required
+    def resolve_tasks_connection(self, info, org_slug, project_slug, first=None, after=None):
+        # Check if user has access to this organization
+        organization = require_membership(info, org_slug).organization
+        
+        tasks = Task.objects.filter(project__organization=organization, project__slug=project_slug)
+        tasks = with_related(tasks, info, ['assignee'], 'edges', 'node')
+        return paginate(tasks, TaskConnection, 'created_at', first, after)
+    
+    @login_required
+    def resolve_task_comments_connection(self, info, org_slug, task_id, first=None, after=None):
+        # Check if user has access to this organization
+        organization = require_membership(info, org_slug).organization
+        
+        comments = TaskComment.objects.filter(
+            task__task_id=task_id.upper(), task__project__organization=organization, task__project__deleted_at__isnull=True
+        )
+        comments = with_related(comments, info, ['author', 'task'], 'edges', 'node')
+        return paginate(comments, TaskCommentConnection, 'timestamp', first, after)
+    
+    @login_required
+    def resolve_project_deletion(self, info, org_slug, id):
+        # Check if user has access to this organization
+        organization = require_membership(info, org_slug).organization
+        return ProjectDeletion.objects.filter(organization=organization, pk=id).first()
+    
+    @login_required
+    def resolve_org_dashboard(self, info, org_slug):
+        # Check if user has access to this organization
+        organization = require_membership(info, org_slug).organization
+        return org_dashboard(organization)
+    
+    @login_required
+    def resolve_search_tasks(self, info, org_slug, query, first=None, after=None):
+        # Check if user has access to this organization
+        organization = require_membership(info, org_slug).organization
+        
+        tasks = with_related(Task.objects.all(), info, ['assignee'], 'edges', 'node')
+        rows, has_next_page, truncated = search_tasks(organization, query, first, after, tasks)
+        edges = [
+            TaskSearchConnection.Edge(
+                node=row, cursor=encode_search_cursor(row.rank, row.pk), rank=row.rank, snippet=row.snippet
+            )
+            for row in rows
+        ]
+        page_info = graphene.relay.PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=bool(after),
+            has_next_page=has_next_page,
+        )
+        return TaskSearchConnection(edges=edges, page_info=page_info, truncated=truncated)
 
 # Mutation Class
 class Mutation(graphene.ObjectType):
@@ -534,6 +913,9 @@ class Mutation(graphene.ObjectType):
     create_task = CreateTask.Field()
     update_task = UpdateTask.Field()
     delete_task = DeleteTask.Field()
+    bulk_create_tasks = BulkCreateTasks.Field()
+    bulk_update_tasks = BulkUpdateTasks.Field()
+    bulk_delete_tasks = BulkDeleteTasks.Field()
     create_task_comment = CreateTaskComment.Field()
 
 # Schema
@@ -0,0 +1,190 @@
+import base64
+import binascii
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, TextField, Value
+from django.db.models.functions import Concat, Replace
+from django.utils.html import escape
+
+from .models import SEARCH_CONFIG, Task, TaskComment
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+MAX_QUERY_LENGTH = 200
+# Matches ranked per source (tasks, comments). A broad term is only searched
+# among its newest this many task and comment matches, so every page of a
+# cursor chain ranks the same set; older matches are left out altogether and
+# the result says it was truncated.
+MAX_RANKED_HITS = 5000
+
+# ts_headline marks matches with these private-use characters, stripped from
+# the text first; the headline is HTML-escaped and they become <mark> tags
+MARK_START = '\ue000'
+MARK_STOP = '\ue001'
+
+HEADLINE_OPTIONS = {
+    'config': SEARCH_CONFIG,
+    'start_sel': MARK_START,
+    'stop_sel': MARK_STOP,
+    'max_words': 35,
+    'min_words': 15,
+    'max_fragments': 2,
+}
+
+# Both hit lists come from the GIN indexes, capped before ts_rank runs, and
+# are ranked in one pass: a task scores its own rank plus the rank of its
+# best matching comment. Each list fetches one hit over the cap to tell
+# whether it was truncated; the result always has a row carrying that flag,
+# with a NULL id when the page is empty.
+# Ranks are float8 throughout: ts_rank's real, widened to the double that a
+# cursor carries back, would not compare equal to itself.
+RANKED_HITS_SQL = """
+    WITH q AS (
+        SELECT websearch_to_tsquery(%(config)s::regconfig, %(text)s) AS query
+    ), task_hits AS (
+        SELECT t.id
+        FROM projects_task t, q
+        WHERE t.search_vector @@ q.query
+          AND t.project_id IN (SELECT id FROM projects_project WHERE organization_id = %(organization)s AND deleted_at IS NULL)
+        ORDER BY t.id DESC
+        LIMIT %(max_hits)s + 1
+    ), comment_hits AS (
+        SELECT c.id, c."timestamp"
+        FROM projects_taskcomment c JOIN projects_task t ON t.id = c.task_id, q
+        WHERE c.search_vector @@ q.query
+          AND t.project_id IN (SELECT id FROM projects_project WHERE organization_id = %(organization)s AND deleted_at IS NULL)
+        ORDER BY c.id DESC
+        LIMIT %(max_hits)s + 1
+    ), truncated AS (
+        SELECT (SELECT count(*) FROM task_hits) > %(max_hits)s
+            OR (SELECT count(*) FROM comment_hits) > %(max_hits)s AS truncated
+    ), hits AS (
+        SELECT t.id, ts_rank(t.search_vector, q.query)::float8 AS rank, true AS in_task
+        FROM (SELECT id FROM task_hits ORDER BY id DESC LIMIT %(max_hits)s) h
+        JOIN projects_task t ON t.id = h.id, q
+        UNION ALL
+        SELECT c.task_id, ts_rank(c.search_vector, q.query)::float8, false
+        FROM (SELECT id, "timestamp" FROM comment_hits ORDER BY id DESC LIMIT %(max_hits)s) h
+        JOIN projects_taskcomment c ON (c.id, c."timestamp") = (h.id, h."timestamp"), q
+    ), ranked AS (
+        SELECT id,
+               COALESCE(MAX(rank) FILTER (WHERE in_task), 0)
+                 + COALESCE(MAX(rank) FILTER (WHERE NOT in_task), 0) AS rank,
+               bool_or(in_task) AS in_task
+        FROM hits
+        GROUP BY id
+    )
+    SELECT page.id, page.rank, page.in_task, truncated.truncated
+    FROM truncated LEFT JOIN (
+        SELECT id, rank, in_task FROM ranked
+        {after}
+        ORDER BY rank DESC, id
+        LIMIT %(limit)s
+    ) page ON true
+    ORDER BY page.rank DESC, page.id
+"""
+
+
+def encode_search_cursor(rank, pk):
+    """Opaque cursor for a row's position in (rank desc, id) order"""
+    return base64.urlsafe_b64encode(f"{rank!r}|{pk}".encode()).decode()
+
+
+def decode_search_cursor(cursor):
+    try:
+        rank, pk = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+        return float(rank), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise Exception("Invalid cursor")
+
+
+def headline_source(expression):
+    """``expression`` without the characters that mark matches in headlines"""
+    return Replace(Replace(expression, Value(MARK_START)), Value(MARK_STOP))
+
+
+def highlight(headline):
+    """HTML-safe snippet: the escaped ``headline`` with <mark> around the matches"""
+    return escape(headline or '').replace(MARK_START, '<mark>').replace(MARK_STOP, '</mark>')
+
+
+def parse_query(text):
+    """Web-search syntax: words are ANDed, "quoted phrases", OR and -exclusions"""
+    return SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+
+
+def search_tasks(organization, text, first=None, after=None, queryset=None):
+    """
+    Tasks of ``organization`` matching ``text`` in their title/description or
+    in any of their comments, best first.
+
+    Returns ``(rows, has_next_page, truncated)``; each row is a Task from
+    ``queryset`` (e.g. with select_related applied) carrying ``rank`` and a
+    highlighted ``snippet``. Headlines are only computed for the returned
+    page. Terms matching more than MAX_RANKED_HITS tasks or comments only
+    search the newest of them; ``truncated`` says older matches were left out.
+    """
+    if first is None:
+        first = DEFAULT_PAGE_SIZE
+    if first < 0:
+        raise Exception("first must be a non-negative integer")
+    first = min(first, MAX_PAGE_SIZE)
+
+    text = (text or '').strip()[:MAX_QUERY_LENGTH]
+    if not text:
+        return [], False, False
+
+    params = {
+        'config': SEARCH_CONFIG,
+        'text': text,
+        'organization': organization.pk,
+        'max_hits': MAX_RANKED_HITS,
+        'limit': first + 1,
+    }
+    after_sql = ''
+    if after:
+        params['after_rank'], params['after_id'] = decode_search_cursor(after)
+        after_sql = "WHERE rank < %(after_rank)s::float8 OR (rank = %(after_rank)s::float8 AND id > %(after_id)s)"
+    with connection.cursor() as cursor:
+        cursor.execute(RANKED_HITS_SQL.format(after=after_sql), params)
+        hits = cursor.fetchall()
+    truncated = hits[0][3]
+    hits = [(task_id, rank, in_task) for task_id, rank, in_task, _ in hits if task_id is not None]
+    has_next_page = len(hits) > first
+    hits = hits[:first]
+    if not hits:
+        return [], has_next_page, truncated
+
+    query = parse_query(text)
+    queryset = Task.objects.all() if queryset is None else queryset
+    tasks = queryset.filter(id__in=[task_id for task_id, _, _ in hits]).defer('search_vector').annotate(
+        headline=SearchHeadline(
+            headline_source(Concat('title', Value(' — '), 'description', output_field=TextField())),
+            query, **HEADLINE_OPTIONS
+        )
+    ).in_bulk()
+
+    # Tasks that only matched through a comment get the comment as snippet
+    comment_only = [task_id for task_id, _, in_task in hits if not in_task]
+    comment_headlines = {}
+    if comment_only:
+        comment_headlines = dict(
+            TaskComment.objects.filter(task_id__in=comment_only, search_vector=query)
+            .annotate(
+                rank=SearchRank(F('search_vector'), query),
+                headline=SearchHeadline(headline_source(F('content')), query, **HEADLINE_OPTIONS),
+            )
+            .order_by('task_id', '-rank')
+            .distinct('task_id')
+            .values_list('task_id', 'headline')
+        )
+
+    rows = []
+    for task_id, rank, _ in hits:
+        task = tasks.get(task_id)
+        if task is None:
+            continue  # Deleted since the ranking query
+        task.rank = rank
+        task.snippet = highlight(comment_headlines.get(task_id, task.headline))
+        rows.append(task)
+    return rows, has_next_page, truncated
@@ -1,3 +1,1158 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, IntegrityError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from graphql_jwt.shortcuts import get_token
+from graphql_jwt.utils import get_payload
+
+from core.schema import schema
+from core.slugs import next_free_slug
+from jobs.models import Job
+from organizations.models import Organization
+from users.authorization import membership_cache
+from users.models import OrganizationMember, User
+from . import partitions, search
+from .dashboard import org_dashboard
+from .deletion import LOCK_CLASS, DeletionInProgress, ProjectDeleter, request_deletion, start_deletion
+from .events import comment_event, task_comments_group
+from .export import CSV, NDJSON, export_organization
+from .importer import TaskImporter, TaskImportError, fingerprint, open_binary, read_records, start_import
+from .jobs import delete_project
+from .models import CommentSequence, Project, ProjectDeletion, Task, TaskComment, TaskImport, TaskSequence
+from .pagination import decode_cursor, encode_cursor, paginate
+from .routing import websocket_urlpatterns
+from .search import search_tasks
+from .schema import TaskConnection
+from .websocket_auth import JWTAuthMiddlewareStack, TokenPrincipal, _cache_key, get_user_from_jwt, token_cache
+
+
+def make_project(slug='web'):
+    organization = Organization.objects.create(name=f'Org {slug}', slug=f'org-{slug}', contact_email=f'{slug}@example.com')
+    return Project.objects.create(organization=organization, name=slug.title(), slug=slug)
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        self.project = make_project()
+        self.tasks = [Task.objects.create(project=self.project, title=f'Task {i}') for i in range(7)]
+        # Three tasks share a timestamp, so the id has to break the tie
+        tied = timezone.now() - timedelta(days=1)
+        Task.objects.filter(pk__in=[task.pk for task in self.tasks[2:5]]).update(created_at=tied)
+        self.queryset = Task.objects.filter(project=self.project)
+        self.expected = list(self.queryset.order_by('created_at', 'id').values_list('pk', flat=True))
+
+    def pages(self, first):
+        after, seen = None, []
+        while True:
+            page = paginate(self.queryset, TaskConnection, 'created_at', first, after)
+            seen.append([edge.node.pk for edge in page.edges])
+            if not page.page_info.has_next_page:
+                return seen
+            after = page.page_info.end_cursor
+
+    def last_but(self, count):
+        task = Task.objects.get(pk=self.expected[-count - 1])
+        return task.created_at, task.pk
+
+    def test_cursor_round_trip(self):
+        task = self.tasks[3]
+        task.refresh_from_db()
+        self.assertEqual(decode_cursor(encode_cursor(task.created_at, task.pk)), (task.created_at, task.pk))
+
+    def test_invalid_cursor(self):
+        with self.assertRaisesMessage(Exception, "Invalid cursor"):
+            decode_cursor('not a cursor')
+
+    def test_pages_cover_every_row_once(self):
+        for first in (1, 2, 3, 7, 50):
+            pages = self.pages(first)
+            self.assertEqual([pk for page in pages for pk in page], self.expected, f"first={first}")
+            self.assertTrue(all(len(page) <= first for page in pages))
+
+    def test_page_info(self):
+        page = paginate(self.queryset, TaskConnection, 'created_at', 3)
+        self.assertTrue(page.page_info.has_next_page)
+        self.assertFalse(page.page_info.has_previous_page)
+        self.assertEqual(page.page_info.end_cursor, page.edges[-1].cursor)
+
+        last = paginate(self.queryset, TaskConnection, 'created_at', 3, encode_cursor(*self.last_but(3)))
+        self.assertEqual([edge.node.pk for edge in last.edges], self.expected[-3:])
+        self.assertFalse(last.page_info.has_next_page)
+        self.assertTrue(last.page_info.has_previous_page)
+
+    def test_first_is_validated(self):
+        with self.assertRaises(Exception):
+            paginate(self.queryset, TaskConnection, 'created_at', -1)
+        self.assertEqual(len(paginate(self.queryset, TaskConnection, 'created_at', 0).edges), 0)
+
+
+class TaskSequenceTests(TestCase):
+    def setUp(self):
+        self.project = make_project()
+
+    def test_allocate_returns_consecutive_ranges(self):
+        self.assertEqual(TaskSequence.objects.allocate(self.project), range(1, 2))
+        self.assertEqual(TaskSequence.objects.allocate(self.project, 3), range(2, 5))
+        self.assertEqual(TaskSequence.objects.allocate(self.project, 1), range(5, 6))
+        self.assertEqual(TaskSequence.objects.get(pk=self.project.pk).last_number, 5)
+
+    def test_projects_count_separately(self):
+        other = Project.objects.create(organization=self.project.organization, name='Api', slug='api')
+        TaskSequence.objects.allocate(self.project, 10)
+        self.assertEqual(TaskSequence.objects.allocate(other), range(1, 2))
+
+    def test_task_ids_follow_the_sequence(self):
+        first = Task.objects.create(project=self.project, title='One')
+        second = Task.objects.create(project=self.project, title='Two')
+        self.assertEqual([first.task_id, second.task_id], ['WEB-1', 'WEB-2'])
+
+        # Deleting the newest task doesn't hand its number out again
+        second.delete()
+        self.assertEqual(Task.objects.create(project=self.project, title='Three').task_id, 'WEB-3')
+
+    def test_explicit_task_id_is_kept(self):
+        task = Task.objects.create(project=self.project, title='Imported', task_id='WEB-100')
+        self.assertEqual(task.task_id, 'WEB-100')
+        self.assertFalse(TaskSequence.objects.filter(pk=self.project.pk).exists())
+
+
+class TaskCounterTests(TestCase):
+    def setUp(self):
+        self.project = make_project()
+        self.other = Project.objects.create(organization=self.project.organization, name='Api', slug='api')
+
+    def assertCounts(self, project, todo, in_progress, done):
+        project.refresh_from_db()
+        self.assertEqual((project.todo_count, project.in_progress_count, project.done_count), (todo, in_progress, done))
+
+    def test_save_and_delete(self):
+        task = Task.objects.create(project=self.project, title='Task')
+        self.assertCounts(self.project, 1, 0, 0)
+
+        task.status = 'IN_PROGRESS'
+        task.save()
+        self.assertCounts(self.project, 0, 1, 0)
+
+        task.project = self.other
+        task.status = 'DONE'
+        task.save()
+        self.assertCounts(self.project, 0, 0, 0)
+        self.assertCounts(self.other, 0, 0, 1)
+
+        task.delete()
+        self.assertCounts(self.other, 0, 0, 0)
+
+    def test_bulk_writes(self):
+        Task.objects.bulk_create([
+            Task(project=self.project, title=f'Task {i}', task_id=f'WEB-{i}', status=status)
+            for i, status in enumerate(['TODO', 'TODO', 'IN_PROGRESS', 'DONE'])
+        ])
+        self.assertCounts(self.project, 2, 1, 1)
+
+        Task.objects.filter(project=self.project, status='TODO').update(status='DONE')
+        self.assertCounts(self.project, 0, 1, 3)
+
+        # Updates that don't touch status or project leave the counters alone
+        Task.objects.filter(project=self.project).update(title='Renamed')
+        self.assertCounts(self.project, 0, 1, 3)
+
+        Task.objects.filter(project=self.project, status='DONE').update(project=self.other)
+        self.assertCounts(self.project, 0, 1, 0)
+        self.assertCounts(self.other, 0, 0, 3)
+
+        Task.objects.filter(project__organization=self.project.organization).delete()
+        self.assertCounts(self.project, 0, 0, 0)
+        self.assertCounts(self.other, 0, 0, 0)
+
+    def test_bulk_update(self):
+        tasks = [Task.objects.create(project=self.project, title=f'Task {i}') for i in range(3)]
+        for task in tasks[:2]:
+            task.status = 'DONE'
+        Task.objects.bulk_update(tasks, ['status'])
+        self.assertCounts(self.project, 1, 0, 2)
+
+    def test_reconcile(self):
+        Task.objects.create(project=self.project, title='Task', status='DONE')
+        Project.objects.filter(pk=self.project.pk).update(todo_count=5, done_count=0)
+
+        out = StringIO()
+        call_command('reconcile_task_counts', stdout=out)
+        self.assertIn("Fixed web: TODO=0, IN_PROGRESS=0, DONE=1", out.getvalue())
+        self.assertIn("Checked 2 projects, fixed 1", out.getvalue())
+        self.assertCounts(self.project, 0, 0, 1)
+
+        self.assertEqual(Project.objects.all().reconcile_task_counts(), [])
+
+
+class CommentSequenceTests(TestCase):
+    def setUp(self):
+        self.project = make_project()
+        self.task = Task.objects.create(project=self.project, title='Task')
+
+    def test_comments_are_numbered_per_task(self):
+        other = Task.objects.create(project=self.project, title='Other')
+        seqs = [TaskComment.objects.create(task=self.task, content=f'Comment {i}').seq for i in range(3)]
+        self.assertEqual(seqs, [1, 2, 3])
+        self.assertEqual(TaskComment.objects.create(task=other, content='First').seq, 1)
+        self.assertEqual(CommentSequence.objects.get(pk=self.task.pk).last_number, 3)
+
+    def test_failed_insert_leaves_no_gap(self):
+        TaskComment.objects.create(task=self.task, content='First')
+        with self.assertRaises(IntegrityError):
+            TaskComment.objects.create(task=self.task, content=None)
+        self.assertEqual(TaskComment.objects.create(task=self.task, content='Second').seq, 2)
+
+    def test_saving_again_keeps_the_seq(self):
+        comment = TaskComment.objects.create(task=self.task, content='First')
+        comment.content = 'Edited'
+        comment.save()
+        self.assertEqual(comment.seq, 1)
+        self.assertEqual(TaskComment.objects.create(task=self.task, content='Second').seq, 2)
+
+
+# Broadcasts go to an in-memory layer rather than another database connection
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class BulkTaskMutationTests(TestCase):
+    def setUp(self):
+        self.project = make_project()
+        self.organization = self.project.organization
+        self.user = User.objects.create_user(email='owner@example.com', password='secret', name='Owner')
+        OrganizationMember.objects.create(user=self.user, organization=self.organization, role='ADMIN')
+        self.outsider = User.objects.create_user(email='outsider@example.com', password='secret', name='Outsider')
+
+    def execute(self, query, **variables):
+        request = RequestFactory().post('/graphql/')
+        request.user = self.user
+        result = schema.execute(query, variables={'orgSlug': self.organization.slug, **variables}, context_value=request)
+        self.assertIsNone(result.errors)
+        return next(iter(result.data.values()))
+
+    def bulk_create(self, tasks):
+        return self.execute("""
+            mutation($orgSlug: String!, $projectSlug: String!, $tasks: [BulkTaskInput!]!) {
+              bulkCreateTasks(orgSlug: $orgSlug, projectSlug: $projectSlug, tasks: $tasks) {
+                success errors results { index taskId success errors }
+              }
+            }
+        """, projectSlug=self.project.slug, tasks=tasks)
+
+    def test_create_allocates_consecutive_task_ids(self):
+        Task.objects.create(project=self.project, title='Existing')
+        data = self.bulk_create([{'title': f'Task {i}'} for i in range(3)])
+        self.assertTrue(data['success'])
+        self.assertEqual([result['taskId'] for result in data['results']], ['WEB-2', 'WEB-3', 'WEB-4'])
+        self.assertEqual(Task.objects.create(project=self.project, title='Next').task_id, 'WEB-5')
+
+    def test_create_reports_errors_per_item(self):
+        data = self.bulk_create([
+            {'title': 'Mine', 'assigneeEmail': self.user.email},
+            {'title': 'Unknown', 'assigneeEmail': 'nobody@example.com'},
+            {'title': 'Outsider', 'assigneeEmail': self.outsider.email},
+        ])
+        self.assertFalse(data['success'])
+        self.assertEqual([result['success'] for result in data['results']], [True, False, False])
+        self.assertEqual(data['results'][1]['errors'], ["User with this email not found"])
+        self.assertEqual(data['results'][2]['errors'], ["Assignee must be a member of the organization"])
+        self.assertEqual(Task.objects.get(project=self.project).assignee, self.user)
+
+    def test_update(self):
+        first = Task.objects.create(project=self.project, title='First')
+        second = Task.objects.create(project=self.project, title='Second')
+        data = self.execute("""
+            mutation($orgSlug: String!, $tasks: [BulkUpdateTaskInput!]!) {
+              bulkUpdateTasks(orgSlug: $orgSlug, tasks: $tasks) {
+                success errors results { index taskId success errors }
+              }
+            }
+        """, tasks=[
+            {'taskId': first.task_id.lower(), 'status': 'DONE'},
+            {'taskId': second.task_id, 'title': 'Renamed', 'assigneeEmail': self.outsider.email},
+            {'taskId': 'WEB-99', 'status': 'DONE'},
+        ])
+        self.assertFalse(data['success'])
+        self.assertEqual([result['success'] for result in data['results']], [True, False, False])
+        self.assertEqual(data['results'][2]['errors'], ["Task not found"])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, second.title), ('DONE', 'Second'))
+
+    def test_delete(self):
+        task = Task.objects.create(project=self.project, title='Doomed')
+        data = self.execute("""
+            mutation($orgSlug: String!, $taskIds: [String!]!) {
+              bulkDeleteTasks(orgSlug: $orgSlug, taskIds: $taskIds) {
+                success errors results { index taskId success errors }
+              }
+            }
+        """, taskIds=[task.task_id, 'WEB-99'])
+        self.assertEqual(data['results'], [
+            {'index': 0, 'taskId': 'WEB-1', 'success': True, 'errors': []},
+            {'index': 1, 'taskId': 'WEB-99', 'success': False, 'errors': ["Task not found"]},
+        ])
+        self.assertFalse(Task.objects.filter(pk=task.pk).exists())
+
+    def test_requires_membership(self):
+        self.user = self.outsider
+        data = self.bulk_create([{'title': 'Nope'}])
+        self.assertEqual(data['errors'], ["You don't have access to this organization"])
+        self.assertFalse(Task.objects.exists())
+
+
+class TaskImporterTests(TestCase):
+    def setUp(self):
+        self.project = make_project()
+        self.organization = self.project.organization
+
+    def records(self, count):
+        return [{'project': 'web', 'title': f'Task {i}'} for i in range(1, count + 1)]
+
+    def interrupted(self, records, after):
+        for number, record in enumerate(records, 1):
+            if number > after:
+                raise RuntimeError("Connection lost")
+            yield record
+
+    def test_resume_skips_committed_records(self):
+        task_import = start_import(self.organization, 'tasks.ndjson', NDJSON, 'abc')
+        with self.assertRaisesMessage(RuntimeError, "Connection lost"):
+            TaskImporter(task_import, batch_size=2).run(self.interrupted(self.records(5), after=4))
+        task_import.refresh_from_db()
+        self.assertEqual((task_import.status, task_import.records_read, task_import.imported), ('FAILED', 4, 4))
+
+        task_import = start_import(self.organization, 'tasks.ndjson', NDJSON, 'abc', resume=task_import.pk)
+        TaskImporter(task_import, batch_size=2).run(self.records(5))
+        task_import.refresh_from_db()
+        self.assertEqual((task_import.status, task_import.records_read, task_import.imported), ('COMPLETED', 5, 5))
+        self.assertEqual(
+            list(Task.objects.order_by('task_id').values_list('task_id', 'title')),
+            [(f'WEB-{i}', f'Task {i}') for i in range(1, 6)],
+        )
+
+    def test_resume_checks_the_input(self):
+        task_import = start_import(self.organization, 'tasks.csv', CSV, 'abc')
+        with self.assertRaisesMessage(TaskImportError, "was started with a different file"):
+            start_import(self.organization, 'tasks.csv', CSV, 'def', resume=task_import.pk)
+        with self.assertRaisesMessage(TaskImportError, "was started with a different file"):
+            start_import(self.organization, 'tasks.ndjson', NDJSON, 'abc', resume=task_import.pk)
+
+        TaskImporter(task_import).run([])
+        with self.assertRaisesMessage(TaskImportError, "already completed"):
+            start_import(self.organization, 'tasks.csv', CSV, 'abc', resume=task_import.pk)
+
+        other = Organization.objects.create(name='Other', slug='other', contact_email='other@example.com')
+        with self.assertRaisesMessage(TaskImportError, "not found"):
+            start_import(other, 'tasks.csv', CSV, 'abc', resume=task_import.pk)
+
+    def test_fingerprint_rewinds(self):
+        file = BytesIO(b'title\nOne\n')
+        self.assertEqual(fingerprint(file), fingerprint(BytesIO(b'title\nOne\n')))
+        self.assertNotEqual(fingerprint(file), fingerprint(BytesIO(b'title\nTwo\n')))
+        self.assertEqual(file.read(), b'title\nOne\n')
+
+    def test_rejected_records_are_reported(self):
+        data = gzip.compress(
+            b'{"project": "web", "title": "Good", "status": "done"}\n'
+            b'{"project": "web", "title": "Bad", "status": "LATER"}\n'
+            b'not json\n'
+            b'{"type": "project", "slug": "web"}\n'
+            b'{"project": "api", "title": "Elsewhere"}\n'
+        )
+        task_import = start_import(self.organization, 'tasks.ndjson.gz', NDJSON, 'abc')
+        TaskImporter(task_import).run(read_records(open_binary(BytesIO(data), 'tasks.ndjson.gz'), NDJSON))
+
+        task_import = TaskImport.objects.get(pk=task_import.pk)
+        self.assertEqual((task_import.imported, task_import.failed, task_import.skipped), (1, 3, 1))
+        self.assertEqual([error['record'] for error in task_import.errors], [2, 3, 5])
+        self.assertEqual(task_import.errors[2]['error'], "Project 'api' not found")
+        self.assertEqual(Task.objects.get().status, 'DONE')
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.project = make_project()
+        self.organization = self.project.organization
+
+    def search(self, text, **kwargs):
+        return search_tasks(self.organization, text, **kwargs)
+
+    def test_only_the_organizations_tasks(self):
+        match = Task.objects.create(project=self.project, title='Deploy the gateway')
+        Task.objects.create(project=self.project, title='Unrelated')
+        other = make_project('api')
+        Task.objects.create(project=other, title='Deploy the gateway')
+
+        rows, has_next_page, truncated = self.search('gateway')
+        self.assertEqual([row.pk for row in rows], [match.pk])
+        self.assertFalse(has_next_page)
+        self.assertFalse(truncated)
+
+    def test_comment_matches(self):
+        task = Task.objects.create(project=self.project, title='Outage')
+        TaskComment.objects.create(task=task, content='Restarted the gateway twice')
+        rows, _, _ = self.search('gateway')
+        self.assertEqual([row.pk for row in rows], [task.pk])
+        self.assertIn('<mark>gateway</mark>', rows[0].snippet)
+
+    def test_deleted_projects_are_excluded(self):
+        Task.objects.create(project=self.project, title='Deploy the gateway')
+        Project.objects.filter(pk=self.project.pk).update(deleted_at=timezone.now())
+        self.assertEqual(self.search('gateway')[0], [])
+
+    def test_pages_with_tied_ranks(self):
+        tasks = [Task.objects.create(project=self.project, title=f'Gateway {i}') for i in range(7)]
+        seen, after = [], None
+        while True:
+            rows, has_next_page, _ = self.search('gateway', first=3, after=after)
+            seen.extend(row.pk for row in rows)
+            if not has_next_page:
+                break
+            after = search.encode_search_cursor(rows[-1].rank, rows[-1].pk)
+        self.assertEqual(len({row.rank for row in self.search('gateway', first=10)[0]}), 1)
+        self.assertEqual(seen, sorted(task.pk for task in tasks))
+
+    def test_snippets_are_escaped(self):
+        Task.objects.create(
+            project=self.project, title='Gateway', description='<script>alert(1)</script> if 1 < 2 && "x" gateway',
+        )
+        snippet = self.search('gateway')[0][0].snippet
+        self.assertNotIn('<script', snippet)
+        self.assertIn('1 &lt; 2 &amp;&amp; &quot;x&quot;', snippet)
+        self.assertEqual(snippet.count('<mark>'), 2)
+        self.assertEqual(snippet.count('</mark>'), 2)
+
+    def test_broad_terms_are_truncated(self):
+        tasks = [Task.objects.create(project=self.project, title=f'Gateway {i}') for i in range(4)]
+        with mock.patch.object(search, 'MAX_RANKED_HITS', 3):
+            rows, _, truncated = self.search('gateway')
+            self.assertTrue(truncated)
+            self.assertEqual(sorted(row.pk for row in rows), [task.pk for task in tasks[1:]])
+            # Truncation is reported on pages past the last match too
+            after = search.encode_search_cursor(0.0, 0)
+            self.assertEqual(self.search('gateway', after=after), ([], False, True))
+        with mock.patch.object(search, 'MAX_RANKED_HITS', 4):
+            self.assertFalse(self.search('gateway')[2])
+
+
+class ProjectDeletionTests(TestCase):
+    def setUp(self):
+        self.project = make_project()
+        self.organization = self.project.organization
+        self.tasks = [Task.objects.create(project=self.project, title=f'Task {i}') for i in range(5)]
+        for task in self.tasks[:2]:
+            for i in range(3):
+                TaskComment.objects.create(task=task, content=f'Comment {i}')
+        self.kept = Task.objects.create(project=make_project('api'), title='Elsewhere')
+
+    def assertGone(self, deletion):
+        deletion.refresh_from_db()
+        self.assertEqual((deletion.status, deletion.tasks_deleted, deletion.comments_deleted), ('COMPLETED', 5, 6))
+        self.assertFalse(Project.all_objects.filter(pk=self.project.pk).exists())
+        self.assertFalse(Task.all_objects.filter(project_id=self.project.pk).exists())
+        self.assertFalse(TaskComment.objects.filter(task_id__in=[task.pk for task in self.tasks]).exists())
+        self.assertFalse(TaskSequence.objects.filter(pk=self.project.pk).exists())
+        self.assertTrue(Task.objects.filter(pk=self.kept.pk).exists())
+
+    def test_request_hides_the_project(self):
+        deletion = request_deletion(self.project)
+        self.assertEqual((deletion.status, deletion.tasks_total, deletion.project_slug), ('RUNNING', 5, 'web'))
+        self.assertFalse(Project.objects.filter(pk=self.project.pk).exists())
+        self.assertFalse(Task.objects.filter(project_id=self.project.pk).exists())
+        # Asking again returns the same deletion
+        self.assertEqual(request_deletion(self.project), deletion)
+
+    def test_batches(self):
+        deletion = request_deletion(self.project)
+        progress = []
+        ProjectDeleter(
+            deletion, batch_size=2, comment_batch_size=2,
+            on_progress=lambda deletion, tasks, seconds: progress.append((tasks, deletion.tasks_deleted)),
+        ).run()
+        self.assertEqual(progress, [(2, 2), (2, 4), (1, 5)])
+        self.assertGone(deletion)
+
+    def test_resume_after_interruption(self):
+        deletion = request_deletion(self.project)
+
+        def interrupt(deletion, tasks, seconds):
+            raise DatabaseError("Connection lost")
+
+        with self.assertRaises(DatabaseError):
+            ProjectDeleter(deletion, batch_size=2, on_progress=interrupt).run()
+        deletion.refresh_from_db()
+        self.assertEqual((deletion.status, deletion.error, deletion.tasks_deleted), ('FAILED', "Connection lost", 2))
+
+        ProjectDeleter(deletion, batch_size=2).run()
+        self.assertGone(deletion)
+        self.assertEqual(deletion.error, '')
+
+    def test_one_run_per_deletion(self):
+        deletion = request_deletion(self.project)
+        other = connection.copy()
+        try:
+            with other.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_lock(%s, %s)", [LOCK_CLASS, deletion.pk])
+                with self.assertRaisesMessage(DeletionInProgress, f"Deletion {deletion.pk} is already running"):
+                    start_deletion(deletion)
+                # Released explicitly: the server may notice the closed connection late
+                cursor.execute("SELECT pg_advisory_unlock(%s, %s)", [LOCK_CLASS, deletion.pk])
+        finally:
+            other.close()
+        deletion.refresh_from_db()
+        self.assertEqual((deletion.status, deletion.tasks_deleted), ('RUNNING', 0))
+
+        start_deletion(deletion)
+        self.assertGone(deletion)
+
+    def test_mutation_reports_a_deletion_running_elsewhere(self):
+        user = User.objects.create_user(email='owner@example.com', password='secret', name='Owner')
+        OrganizationMember.objects.create(user=user, organization=self.organization, role='ADMIN')
+        request = RequestFactory().post('/graphql/')
+        request.user = user
+        with mock.patch('projects.schema.start_deletion', side_effect=DeletionInProgress("Deletion 1 is already running")):
+            result = schema.execute(
+                'mutation { deleteProject(organizationSlug: "org-web", projectSlug: "web") { success errors deletion { status } } }',
+                context_value=request,
+            )
+        self.assertEqual(result.data['deleteProject'], {
+            'success': False, 'errors': ["Deletion 1 is already running"], 'deletion': {'status': 'RUNNING'},
+        })
+
+    def test_slug_is_taken_until_the_rows_are_gone(self):
+        deletion = request_deletion(self.project)
+        projects = Project.all_objects.filter(organization=self.organization)
+        self.assertEqual(next_free_slug(projects, 'web'), 'web-1')
+        self.assertEqual(Project.objects.create(organization=self.organization, name='Web').slug, 'web-1')
+
+        ProjectDeleter(deletion).run()
+        self.assertEqual(next_free_slug(projects, 'web'), 'web')
+
+    def test_small_projects_are_deleted_inline(self):
+        deletion = request_deletion(self.project)
+        self.assertIsNone(start_deletion(deletion))
+        self.assertGone(deletion)
+        self.assertFalse(Job.objects.exists())
+
+    def test_big_projects_are_deleted_by_a_job(self):
+        deletion = request_deletion(self.project)
+        with mock.patch('projects.deletion.INLINE_MAX_TASKS', 4):
+            job = start_deletion(deletion)
+            self.assertEqual((job.name, job.args), ('projects.delete_project', {'deletion_id': deletion.pk}))
+            # Only one job per deletion
+            self.assertEqual(start_deletion(deletion), job)
+        self.assertTrue(Task.all_objects.filter(project_id=self.project.pk).exists())
+
+        self.assertEqual(delete_project(job, **job.args), {'tasks_deleted': 5, 'comments_deleted': 6})
+        self.assertGone(deletion)
+
+    def test_database_errors_are_recorded(self):
+        deletion = request_deletion(self.project)
+        with mock.patch.object(ProjectDeleter, 'delete_batch', side_effect=DatabaseError("Disk full")):
+            with self.assertLogs('projects.deletion', 'ERROR'):
+                self.assertIsNone(start_deletion(deletion))
+        self.assertEqual((deletion.status, deletion.error), ('FAILED', "Disk full"))
+
+        with mock.patch.object(ProjectDeleter, 'delete_batch', side_effect=RuntimeError("Bug")):
+            with self.assertRaisesMessage(RuntimeError, "Bug"):
+                start_deletion(deletion)
+        deletion.refresh_from_db()
+        self.assertEqual((deletion.status, deletion.error), ('FAILED', "Bug"))
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.project = make_project()
+        self.organization = self.project.organization
+        self.user = User.objects.create_user(email='owner@example.com', password='secret', name='Owner')
+        OrganizationMember.objects.create(user=self.user, organization=self.organization, role='ADMIN')
+        self.task = Task.objects.create(project=self.project, title='Ship, "it"', assignee=self.user, status='DONE')
+        TaskComment.objects.create(task=self.task, author=self.user, content='Shipped\nfor real')
+        Task.objects.create(project=make_project('api'), title='Elsewhere')
+
+    def export(self, fmt, compress=False):
+        return b''.join(export_organization(self.organization, fmt, compress))
+
+    def test_ndjson(self):
+        records = [json.loads(line) for line in self.export(NDJSON).decode().splitlines()]
+        self.assertEqual([record['type'] for record in records], ['project', 'task', 'comment'])
+        project, task, comment = records
+        self.assertEqual((project['slug'], project['name']), ('web', 'Web'))
+        self.assertEqual(
+            {key: task[key] for key in ('project', 'task_id', 'title', 'status', 'assignee')},
+            {'project': 'web', 'task_id': 'WEB-1', 'title': 'Ship, "it"', 'status': 'DONE', 'assignee': 'owner@example.com'},
+        )
+        self.assertEqual((comment['task_id'], comment['seq'], comment['content']), ('WEB-1', 1, 'Shipped\nfor real'))
+
+    def test_csv(self):
+        rows = list(csv.DictReader(self.export(CSV).decode().splitlines(keepends=True)))
+        self.assertEqual([row['type'] for row in rows], ['project', 'task', 'comment'])
+        project, task, comment = rows
+        # A project's slug goes in the project column, like its tasks' and comments'
+        self.assertEqual([row['project'] for row in rows], ['web', 'web', 'web'])
+        self.assertEqual((project['name'], project['title']), ('Web', ''))
+        self.assertEqual((task['title'], task['assignee']), ('Ship, "it"', 'owner@example.com'))
+        self.assertEqual(task['created_at'], self.task.created_at.isoformat())
+        self.assertEqual((comment['seq'], comment['author'], comment['content']), ('1', 'owner@example.com', 'Shipped\nfor real'))
+
+    def test_gzip(self):
+        self.assertEqual(gzip.decompress(self.export(NDJSON, compress=True)), self.export(NDJSON))
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            export_organization(self.organization, 'xml')
+
+
+class ExportViewTests(TransactionTestCase):
+    """The view checks access and streams on other threads, so the data is committed"""
+
+    def setUp(self):
+        membership_cache.clear()
+        self.project = make_project()
+        self.organization = self.project.organization
+        Task.objects.create(project=self.project, title='Task')
+
+    def user(self, role):
+        user = User.objects.create_user(email=f'{role.lower()}@example.com', password='secret', name=role)
+        OrganizationMember.objects.create(user=user, organization=self.organization, role=role)
+        return user
+
+    async def get(self, user=None, **params):
+        headers = {'Authorization': f'JWT {await database_sync_to_async(get_token)(user)}'} if user else {}
+        return await self.async_client.get(f'/export/{self.organization.slug}/', params, headers=headers)
+
+    async def content(self, response):
+        return b''.join([chunk async for chunk in response.streaming_content])
+
+    async def test_admins_only(self):
+        member = await database_sync_to_async(self.user)('MEMBER')
+        for user in (None, member):
+            response = await self.get(user)
+            self.assertEqual(response.status_code, 403)
+            self.assertEqual(json.loads(response.content), {'error': "Only organization admins can export it"})
+
+    async def test_export(self):
+        admin = await database_sync_to_async(self.user)('ADMIN')
+        response = await self.get(admin, format='csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="org-web.csv"')
+        self.assertEqual(len((await self.content(response)).decode().splitlines()), 3)
+
+        response = await self.get(admin, gzip='1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="org-web.ndjson.gz"')
+        self.assertEqual(len(gzip.decompress(await self.content(response)).splitlines()), 2)
+
+        response = await self.get(admin, format='xml')
+        self.assertEqual(response.status_code, 400)
+
+
+class PartitionTests(TestCase):
+    def setUp(self):
+        self.task = Task.objects.create(project=make_project(), title='Task')
+        self.this_month = partitions.month_start(timezone.now())
+
+    def comment(self, moment=None):
+        comment = TaskComment.objects.create(task=self.task, content='Comment')
+        if moment is not None:
+            TaskComment.objects.filter(pk=comment.pk).update(timestamp=moment)
+        # Fire the deferred foreign key checks, which would stop a partition being detached
+        connection.check_constraints()
+        return comment
+
+    def partition_of(self, comment):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT tableoid::regclass::text FROM projects_taskcomment WHERE id = %s", [comment.pk])
+            return cursor.fetchone()[0]
+
+    def partition_names(self):
+        with connection.cursor() as cursor:
+            return [partition.name for partition in partitions.list_partitions(cursor)]
+
+    def test_months_ahead_exist(self):
+        months = [partitions.add_months(self.this_month, n) for n in range(4)]
+        self.assertEqual(
+            self.partition_names(),
+            [partitions.partition_name(month) for month in months] + [partitions.DEFAULT_PARTITION],
+        )
+        self.assertEqual(self.partition_of(self.comment()), partitions.partition_name(self.this_month))
+
+    def test_create_partition_moves_rows_from_the_default_one(self):
+        month = partitions.add_months(self.this_month, 12)
+        comment = self.comment(month + timedelta(days=3))
+        self.assertEqual(self.partition_of(comment), partitions.DEFAULT_PARTITION)
+
+        self.assertTrue(partitions.create_partition(month))
+        self.assertEqual(self.partition_of(comment), partitions.partition_name(month))
+        self.assertEqual(TaskComment.objects.get(pk=comment.pk).content, 'Comment')
+        self.assertFalse(partitions.create_partition(month + timedelta(days=10)))
+
+    def test_command_creates_partitions_ahead(self):
+        out = StringIO()
+        call_command('comment_partitions', '--ahead', '5', stdout=out)
+        self.assertIn(f"Created the partition for {partitions.add_months(self.this_month, 5):%Y-%m}", out.getvalue())
+        self.assertIn(partitions.partition_name(partitions.add_months(self.this_month, 4)), self.partition_names())
+
+    def test_command_archives_expired_partitions(self):
+        old = partitions.add_months(self.this_month, -3)
+        partitions.create_partition(old)
+        archived = self.comment(old + timedelta(days=2))
+        kept = self.comment()
+        name = partitions.partition_name(old)
+
+        with tempfile.TemporaryDirectory() as directory:
+            out = StringIO()
+            call_command('comment_partitions', '--retain-months', '2', '--archive-dir', directory, '--dry-run', stdout=out)
+            self.assertIn(f"Would archive {name}", out.getvalue())
+            self.assertIn(name, self.partition_names())
+
+            call_command('comment_partitions', '--retain-months', '2', '--archive-dir', directory, stdout=StringIO())
+            with gzip.open(os.path.join(directory, f'{name}.csv.gz'), 'rt') as archive:
+                rows = list(csv.DictReader(archive))
+
+        self.assertEqual([(int(row['id']), row['content']) for row in rows], [(archived.pk, 'Comment')])
+        self.assertNotIn(name, self.partition_names())
+        with connection.cursor() as cursor:
+            self.assertEqual(partitions.detached_partitions(cursor), [])
+        self.assertEqual(list(TaskComment.objects.values_list('pk', flat=True)), [kept.pk])
+
+    def test_command_detach_only(self):
+        old = partitions.add_months(self.this_month, -3)
+        partitions.create_partition(old)
+        self.comment(old)
+        name = partitions.partition_name(old)
+
+        with self.assertRaises(CommandError):
+            call_command('comment_partitions', '--retain-months', '2', stdout=StringIO())
+        call_command('comment_partitions', '--retain-months', '2', '--detach-only', stdout=StringIO())
+        self.assertNotIn(name, self.partition_names())
+        self.assertFalse(TaskComment.objects.exists())
+        with connection.cursor() as cursor:
+            self.assertEqual(partitions.detached_partitions(cursor), [name])
+            cursor.execute(f"SELECT count(*) FROM {name}")
+            self.assertEqual(cursor.fetchone(), (1,))
+        # Its foreign keys went with it
+        self.task.delete()
+
+
+class CommentPartitionMigrationTests(TransactionTestCase):
+    before = [('projects', '0010_task_import')]
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='author@example.com', password='secret', name='Author')
+        self.task = Task.objects.create(project=make_project(), title='Task')
+        self.this_month = partitions.month_start(timezone.now())
+        self.addCleanup(self.migrate, None)
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets or executor.loader.graph.leaf_nodes())
+
+    def insert(self, seq, moment, content='Comment'):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO projects_taskcomment (task_id, seq, content, author_id, "timestamp")
+                VALUES (%s, %s, %s, %s, %s) RETURNING id
+            """, [self.task.pk, seq, content, self.user.pk, moment])
+            return cursor.fetchone()[0]
+
+    def placement(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT id, tableoid::regclass::text, content FROM projects_taskcomment ORDER BY id")
+            return cursor.fetchall()
+
+    def test_existing_comments_are_split_by_month(self):
+        recent = TaskComment.objects.create(task=self.task, author=self.user, content='Recent')
+        self.migrate(self.before)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE relname = 'projects_taskcomment'")
+            self.assertEqual(cursor.fetchone(), ('r',))
+        months = [partitions.add_months(self.this_month, n) for n in (-14, -13, -2)]
+        ids = [self.insert(seq, month + timedelta(days=seq)) for seq, month in enumerate(months, 2)]
+
+        self.migrate(None)
+        expected = [(recent.pk, partitions.partition_name(self.this_month), 'Recent')]
+        expected += [(pk, partitions.partition_name(month), 'Comment') for pk, month in zip(ids, months)]
+        self.assertEqual(self.placement(), expected)
+        ahead = [partitions.add_months(self.this_month, n) for n in range(4)]
+        with connection.cursor() as cursor:
+            self.assertEqual(
+                [partition.name for partition in partitions.list_partitions(cursor)],
+                [partitions.partition_name(month) for month in months + ahead] + [partitions.DEFAULT_PARTITION],
+            )
+            cursor.execute("""
+                SELECT conname, convalidated FROM pg_constraint
+                WHERE conrelid = 'projects_taskcomment'::regclass AND contype = 'f' ORDER BY conname
+            """)
+            self.assertEqual(cursor.fetchall(), [
+                ('projects_taskcomment_author_id_464e8986_fk_users_user_id', True),
+                ('projects_taskcomment_task_id_3c75a98e_fk_projects_task_id', True),
+            ])
+        # The id sequence carried over
+        self.assertGreater(TaskComment.objects.create(task=self.task, content='New').pk, max(ids))
+
+    def test_changes_during_the_copy_are_kept(self):
+        self.migrate(self.before)
+        first, second = self.insert(1, timezone.now()), self.insert(2, timezone.now())
+        migration = import_module('projects.migrations.0011_comment_partitions')
+        copy_rows = migration._copy_rows
+        written = []
+
+        def copy_and_write(cursor, after, until):
+            last = copy_rows(cursor, after, until)
+            if not written:
+                # The first row is copied already and the second not yet
+                cursor.execute("UPDATE projects_taskcomment SET content = 'Edited' WHERE id = %s", [first])
+                cursor.execute("DELETE FROM projects_taskcomment WHERE id = %s", [second])
+                written.append(self.insert(3, timezone.now(), 'Late'))
+            return last
+
+        with mock.patch.object(migration, 'BATCH_SIZE', 1), mock.patch.object(migration, 'LOCKED_REPLAY_MAX', 1), \
+                mock.patch.object(migration, '_copy_rows', copy_and_write):
+            self.migrate(None)
+        partition = partitions.partition_name(self.this_month)
+        self.assertEqual(self.placement(), [(first, partition, 'Edited'), (written[0], partition, 'Late')])
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('projects_taskcomment_changes'), to_regclass('projects_taskcomment_partitioned')")
+            self.assertEqual(cursor.fetchone(), (None, None))
+
+
+class OrgDashboardTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name='Acme', slug='acme', contact_email='acme@example.com')
+        self.alice = User.objects.create_user(email='alice@example.com', password='secret', name='Alice')
+        self.bob = User.objects.create_user(email='bob@example.com', password='secret', name='Bob')
+        web, api = [
+            Project.objects.create(organization=self.organization, name=name, slug=name.lower())
+            for name in ('Web', 'Api')
+        ]
+        Project.objects.create(organization=self.organization, name='Docs', slug='docs')
+        # A Wednesday; its week starts on Monday the 12th
+        self.now = datetime(2026, 10, 14, 12, tzinfo=dt_timezone.utc)
+        for project, status, assignee, due in [
+            (web, 'TODO', self.alice, self.now - timedelta(days=1)),
+            (web, 'IN_PROGRESS', self.alice, self.now + timedelta(days=10)),
+            (web, 'DONE', self.bob, self.now - timedelta(days=8)),
+            (web, 'TODO', None, None),
+            (api, 'DONE', self.alice, self.now - timedelta(days=1)),
+            (api, 'TODO', self.bob, self.now - timedelta(days=13)),
+            (api, 'IN_PROGRESS', self.bob, self.now + timedelta(days=2)),
+        ]:
+            Task.objects.create(project=project, title='Task', status=status, assignee=assignee, due_date=due)
+        Task.objects.create(project=make_project('other'), title='Elsewhere', assignee=self.alice)
+
+    def counts(self, entry):
+        return {key: entry[key] for key in ('todo', 'in_progress', 'done', 'total', 'overdue', 'due_this_week')}
+
+    def test_dashboard(self):
+        with self.assertNumQueries(1):
+            dashboard = org_dashboard(self.organization, now=self.now)
+
+        self.assertEqual(dashboard['week_start'], datetime(2026, 10, 12, tzinfo=dt_timezone.utc))
+        self.assertEqual(
+            self.counts(dashboard['totals']),
+            {'todo': 3, 'in_progress': 2, 'done': 2, 'total': 7, 'overdue': 2, 'due_this_week': 2},
+        )
+        self.assertEqual(
+            [(project['slug'], self.counts(project)) for project in dashboard['projects']],
+            [
+                ('api', {'todo': 1, 'in_progress': 1, 'done': 1, 'total': 3, 'overdue': 1, 'due_this_week': 1}),
+                ('docs', {'todo': 0, 'in_progress': 0, 'done': 0, 'total': 0, 'overdue': 0, 'due_this_week': 0}),
+                ('web', {'todo': 2, 'in_progress': 1, 'done': 1, 'total': 4, 'overdue': 1, 'due_this_week': 1}),
+            ],
+        )
+        # Open tasks first, then email; unassigned tasks last, under no email
+        self.assertEqual(
+            [(assignee['email'], assignee['name'], self.counts(assignee)) for assignee in dashboard['assignees']],
+            [
+                ('alice@example.com', 'Alice',
+                 {'todo': 1, 'in_progress': 1, 'done': 1, 'total': 3, 'overdue': 1, 'due_this_week': 1}),
+                ('bob@example.com', 'Bob',
+                 {'todo': 1, 'in_progress': 1, 'done': 1, 'total': 3, 'overdue': 1, 'due_this_week': 1}),
+                (None, None, {'todo': 1, 'in_progress': 0, 'done': 0, 'total': 1, 'overdue': 0, 'due_this_week': 0}),
+            ],
+        )
+
+    def test_empty_organization(self):
+        organization = Organization.objects.create(name='Empty', slug='empty', contact_email='empty@example.com')
+        with self.assertNumQueries(1):
+            dashboard = org_dashboard(organization, now=self.now)
+        self.assertEqual((dashboard['projects'], dashboard['assignees'], dashboard['totals']['total']), ([], [], 0))
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class CommentReplayTests(TransactionTestCase):
+    # The consumer reads through database_sync_to_async, on another thread
+    def setUp(self):
+        membership_cache.clear()
+        token_cache.clear()
+        self.user = User.objects.create_user(email='member@example.com', password='secret', name='Member')
+        project = make_project()
+        OrganizationMember.objects.create(user=self.user, organization=project.organization, role='MEMBER')
+        self.task = Task.objects.create(project=project, title='Task')
+        self.comments = [
+            TaskComment.objects.create(task=self.task, author=self.user, content=f'Comment {n}') for n in range(1, 6)
+        ]
+        self.path = f'/ws/tasks/org-web/{self.task.task_id}/comments/'
+        self.application = JWTAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+
+    async def connect(self, query=''):
+        token = await database_sync_to_async(get_token)(self.user)
+        communicator = WebsocketCommunicator(self.application, f'{self.path}?token={token}{query}')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual((await communicator.receive_json_from())['type'], 'system')
+        return communicator
+
+    async def replayed(self, communicator):
+        chunks = []
+        while True:
+            frame = await communicator.receive_json_from(timeout=5)
+            if frame['type'] == 'replay_complete':
+                return chunks, frame['last_seq']
+            self.assertEqual(frame['type'], 'replay')
+            chunks.append([comment['seq'] for comment in frame['comments']])
+
+    async def test_replay_in_chunks(self):
+        with mock.patch('projects.consumers.REPLAY_CHUNK_SIZE', 2):
+            communicator = await self.connect('&since_seq=0')
+            self.assertEqual(await self.replayed(communicator), ([[1, 2], [3, 4], [5]], 5))
+            await communicator.disconnect()
+
+            # since is a comment id: everything after the comment the client saw
+            communicator = await self.connect(f'&since={self.comments[2].pk}')
+            self.assertEqual(await self.replayed(communicator), ([[4, 5]], 5))
+            await communicator.disconnect()
+
+    async def test_nothing_to_replay(self):
+        communicator = await self.connect('&since_seq=5')
+        self.assertEqual(await self.replayed(communicator), ([], 5))
+        await communicator.disconnect()
+
+        # Without a cursor the client loads history over GraphQL
+        communicator = await self.connect()
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_live_events_already_replayed_are_dropped(self):
+        communicator = await self.connect('&since_seq=3')
+        self.assertEqual(await self.replayed(communicator), ([[4, 5]], 5))
+
+        later = await database_sync_to_async(TaskComment.objects.create)(task=self.task, author=self.user, content='Later')
+        group = task_comments_group('org-web', self.task.task_id)
+        for comment in (self.comments[3], self.comments[4], later):
+            await get_channel_layer().group_send(group, comment_event(comment, 'org-web', self.task.task_id, self.user))
+        frame = await communicator.receive_json_from()
+        self.assertEqual((frame['seq'], frame['content']), (6, 'Later'))
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_reconnect_after_a_gap(self):
+        communicator = await self.connect('&since_seq=5')
+        await self.replayed(communicator)
+        # The client saw seq 2 last, then an event for seq 6: it closes with
+        # 4000 and reconnects from the last comment it has
+        later = await database_sync_to_async(TaskComment.objects.create)(task=self.task, author=self.user, content='Later')
+        await communicator.disconnect(code=4000)
+
+        communicator = await self.connect(f'&since={self.comments[1].pk}')
+        self.assertEqual(await self.replayed(communicator), ([[3, 4, 5, 6]], later.seq))
+        await communicator.disconnect()
+
+    async def test_invalid_cursor(self):
+        communicator = await self.connect('&since=abc')
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'error', 'error': 'Invalid since cursor'})
+        await communicator.disconnect()
+
+    async def test_failed_replay_closes_with_4000(self):
+        with mock.patch('projects.consumers.TaskCommentConsumer.comments_after', side_effect=DatabaseError), \
+                self.assertLogs('projects.consumers', 'ERROR'):
+            communicator = await self.connect('&since_seq=0')
+            self.assertEqual(await communicator.receive_output(), {'type': 'websocket.close', 'code': 4000})
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class StreamConsumerTests(TransactionTestCase):
+    def setUp(self):
+        membership_cache.clear()
+        token_cache.clear()
+        self.user = User.objects.create_user(email='member@example.com', password='secret', name='Member')
+        self.project = make_project()
+        OrganizationMember.objects.create(user=self.user, organization=self.project.organization, role='MEMBER')
+        self.task = Task.objects.create(project=self.project, title='Task')
+        other = make_project('other')
+        self.other_task = Task.objects.create(project=other, title='Elsewhere')
+        self.application = JWTAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+
+    async def connect(self):
+        token = await database_sync_to_async(get_token)(self.user)
+        communicator = WebsocketCommunicator(self.application, f'/ws/stream/?token={token}')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual((await communicator.receive_json_from())['type'], 'system')
+        return communicator
+
+    async def request(self, communicator, **message):
+        await communicator.send_json_to(message)
+        return await communicator.receive_json_from(timeout=5)
+
+    async def subscribe_task(self, communicator, task, org_slug='org-web'):
+        return await self.request(
+            communicator, action='subscribe', stream='task', org_slug=org_slug, task_id=task.task_id.lower()
+        )
+
+    async def test_anonymous_is_rejected(self):
+        communicator = WebsocketCommunicator(self.application, '/ws/stream/')
+        self.assertEqual(await communicator.connect(), (False, 4001))
+
+    async def test_subscribe_and_unsubscribe(self):
+        communicator = await self.connect()
+        task_key = f'task:org-web:{self.task.task_id}'
+        self.assertEqual(await self.subscribe_task(communicator, self.task), {'type': 'subscribed', 'stream': task_key})
+        self.assertEqual(
+            await self.request(communicator, action='subscribe', stream='project', org_slug='org-web', project_slug='web'),
+            {'type': 'subscribed', 'stream': 'project:org-web:web'},
+        )
+
+        comment = await database_sync_to_async(TaskComment.objects.create)(task=self.task, author=self.user, content='Hi')
+        group = task_comments_group('org-web', self.task.task_id)
+        await get_channel_layer().group_send(group, comment_event(comment, 'org-web', self.task.task_id, self.user))
+        frame = await communicator.receive_json_from()
+        self.assertEqual((frame['type'], frame['stream'], frame['content']), ('comment', task_key, 'Hi'))
+
+        self.assertEqual(
+            await self.request(communicator, action='unsubscribe', stream=task_key),
+            {'type': 'unsubscribed', 'stream': task_key},
+        )
+        await get_channel_layer().group_send(group, comment_event(comment, 'org-web', self.task.task_id, self.user))
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_other_organizations_are_rejected(self):
+        communicator = await self.connect()
+        key = f'task:org-other:{self.other_task.task_id}'
+        self.assertEqual(
+            await self.subscribe_task(communicator, self.other_task, 'org-other'),
+            {'type': 'error', 'stream': key, 'error': 'Access denied'},
+        )
+        # Nor can a task of another organization be reached through one the user is in
+        self.assertEqual(
+            (await self.subscribe_task(communicator, self.other_task))['error'], 'Access denied',
+        )
+        self.assertEqual(
+            await self.request(communicator, action='subscribe', stream='project', org_slug='org-other', project_slug='other'),
+            {'type': 'error', 'stream': 'project:org-other:other', 'error': 'Access denied'},
+        )
+        self.assertEqual(
+            await self.request(communicator, action='subscribe', stream='board', org_slug='org-web'),
+            {'type': 'error', 'error': 'Unknown stream: board'},
+        )
+        await communicator.disconnect()
+
+    async def test_subscription_cap(self):
+        second = await database_sync_to_async(Task.objects.create)(project=self.project, title='Second')
+        with mock.patch('projects.consumers.StreamConsumer.MAX_SUBSCRIPTIONS', 2):
+            communicator = await self.connect()
+            self.assertEqual((await self.subscribe_task(communicator, self.task))['type'], 'subscribed')
+            self.assertEqual((await self.subscribe_task(communicator, second))['type'], 'subscribed')
+            self.assertEqual(
+                await self.request(communicator, action='subscribe', stream='project', org_slug='org-web', project_slug='web'),
+                {'type': 'error', 'stream': 'project:org-web:web', 'error': 'Too many subscriptions'},
+            )
+            # Subscribing again to a stream already held doesn't count
+            self.assertEqual((await self.subscribe_task(communicator, self.task))['type'], 'subscribed')
+
+            await self.request(communicator, action='unsubscribe', stream=f'task:org-web:{second.task_id}')
+            self.assertEqual(
+                await self.request(communicator, action='subscribe', stream='project', org_slug='org-web', project_slug='web'),
+                {'type': 'subscribed', 'stream': 'project:org-web:web'},
+            )
+            await communicator.disconnect()
+
+
+class WebSocketTokenCacheTests(TransactionTestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create_user(email='member@example.com', password='secret', name='Member')
+        self.token = get_token(self.user)
+
+    def tearDown(self):
+        token_cache.clear()
+
+    async def test_hit_skips_verification(self):
+        with mock.patch('projects.websocket_auth.get_payload', wraps=get_payload) as verify:
+            principal = await get_user_from_jwt(f'JWT {self.token}')
+            self.assertEqual((principal.id, principal.email), (self.user.pk, 'member@example.com'))
+            self.assertIs(await get_user_from_jwt(self.token), principal)
+        verify.assert_called_once()
+
+    async def test_failures_are_not_cached(self):
+        with mock.patch('projects.websocket_auth.get_payload', wraps=get_payload) as verify:
+            self.assertTrue((await get_user_from_jwt('not-a-token')).is_anonymous)
+            self.assertTrue((await get_user_from_jwt('not-a-token')).is_anonymous)
+        self.assertEqual(verify.call_count, 2)
+
+    async def test_ttl_is_capped_by_exp(self):
+        with override_settings(GRAPHQL_JWT={'JWT_EXPIRATION_DELTA': timedelta(seconds=5)}):
+            token = await database_sync_to_async(get_token)(self.user)
+        with mock.patch.object(token_cache, 'set', wraps=token_cache.set) as cache_set:
+            await get_user_from_jwt(token)
+        ttl = cache_set.call_args.kwargs['ttl']
+        self.assertLessEqual(ttl, 5)
+        self.assertGreater(ttl, 0)
+
+        # Past exp the entry is gone, well inside the cache-wide TTL, so the
+        # token is verified again
+        expired = time.monotonic() + ttl + 1
+        with mock.patch('core.caching.time.monotonic', return_value=expired), \
+                mock.patch('projects.websocket_auth.get_payload', wraps=get_payload) as verify:
+            await get_user_from_jwt(token)
+        verify.assert_called_once()
+
+    async def test_expired_tokens_are_not_cached(self):
+        with mock.patch('projects.websocket_auth.verify_token', mock.AsyncMock(
+            return_value=(TokenPrincipal.from_user(self.user), time.time() - 1)
+        )):
+            self.assertEqual((await get_user_from_jwt(self.token)).id, self.user.pk)
+        self.assertIsNone(token_cache.get(_cache_key(self.token)))
+
+    async def test_deactivated_users_are_evicted(self):
+        await get_user_from_jwt(self.token)
+        key = _cache_key(self.token)
+        self.user.name = 'Renamed'
+        await database_sync_to_async(self.user.save)()
+        self.assertIsNotNone(token_cache.get(key))
+
+        self.user.is_active = False
+        await database_sync_to_async(self.user.save)()
+        self.assertIsNone(token_cache.get(key))
+        self.assertTrue((await get_user_from_jwt(self.token)).is_anonymous)
+
+    async def test_deleted_users_are_evicted(self):
+        other = await database_sync_to_async(User.objects.create_user)(
+            email='other@example.com', password='secret', name='Other'
+        )
+        other_token = await database_sync_to_async(get_token)(other)
+        await get_user_from_jwt(self.token)
+        await get_user_from_jwt(other_token)
+
+        await database_sync_to_async(self.user.delete)()
+        self.assertIsNone(token_cache.get(_cache_key(self.token)))
+        self.assertIsNotNone(token_cache.get(_cache_key(other_token)))
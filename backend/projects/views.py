@@ -1,3 +1,151 @@
-from django.shortcuts import render
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
-# Create your views here.
+from channels.db import database_sync_to_async
+from django.contrib.auth import authenticate
+from django.db import connection
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_POST
+from graphql_jwt.exceptions import JSONWebTokenError
+
+from users.authorization import get_membership
+from .export import CONTENT_TYPES, FORMATS, NDJSON, export_filename, export_organization
+from .importer import TaskImporter, TaskImportError, fingerprint, guess_format, open_binary, read_records, start_import
+from .models import TaskImport
+
+
+def _membership(request, org_slug):
+    try:
+        user = authenticate(request=request)
+    except JSONWebTokenError:
+        user = None
+    if user is not None:
+        request.user = user
+    return get_membership(user, org_slug)
+
+
+def _admin_membership(request, org_slug):
+    membership = _membership(request, org_slug)
+    if membership is None or membership.role != 'ADMIN':
+        return None
+    return membership
+
+
+async def _stream_on_own_thread(chunks):
+    """
+    Serve a sync generator that holds a transaction and server-side cursors.
+    Every step runs on one thread of its own, whose connection is closed at
+    the end; StreamingHttpResponse would otherwise buffer the whole thing.
+    """
+    loop = asyncio.get_running_loop()
+    thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export')
+
+    def close():
+        chunks.close()
+        connection.close()
+
+    try:
+        while True:
+            chunk = await loop.run_in_executor(thread, next, chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        await loop.run_in_executor(thread, close)
+        thread.shutdown(wait=False)
+
+
+@require_GET
+async def export_organization_view(request, org_slug):
+    """
+    ``GET /export/<org_slug>/?format=ndjson|csv&gzip=1`` streams the whole
+    organization; organization admins only, authenticated by JWT
+    """
+    fmt = request.GET.get('format', NDJSON)
+    if fmt not in FORMATS:
+        return JsonResponse({'error': f"format must be one of {', '.join(FORMATS)}"}, status=400)
+    compress = request.GET.get('gzip', '').lower() in ('1', 'true', 'yes')
+
+    membership = await database_sync_to_async(_admin_membership)(request, org_slug)
+    if membership is None:
+        return JsonResponse({'error': "Only organization admins can export it"}, status=403)
+
+    organization = membership.organization
+    chunks = export_organization(organization, fmt, compress)
+    response = StreamingHttpResponse(_stream_on_own_thread(chunks), content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(organization, fmt, compress)}"'
+    if compress:
+        # A .gz file to download, not a transfer encoding clients should undo
+        response['Content-Type'] = 'application/gzip'
+    return response
+
+
+def task_import_payload(task_import):
+    return {
+        'id': task_import.pk,
+        'source': task_import.source,
+        'status': task_import.status,
+        'records_read': task_import.records_read,
+        'imported': task_import.imported,
+        'skipped': task_import.skipped,
+        'failed': task_import.failed,
+        'errors': task_import.errors,
+        'error': task_import.error,
+    }
+
+
+def _import_upload(request, org_slug):
+    membership = _membership(request, org_slug)
+    if membership is None:
+        return JsonResponse({'error': "You don't have access to this organization"}, status=403)
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'error': "Upload the tasks as the 'file' field of a multipart form"}, status=400)
+    fmt = request.POST.get('format') or guess_format(upload.name)
+    if fmt is None:
+        return JsonResponse({'error': f"format must be one of {', '.join(FORMATS)}"}, status=400)
+    resume = request.POST.get('resume')
+
+    try:
+        task_import = start_import(
+            membership.organization, upload.name, fmt, fingerprint(upload), request.user,
+            int(resume) if resume else None,
+        )
+    except (TaskImportError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    importer = TaskImporter(task_import, default_project=request.POST.get('project') or None)
+    try:
+        importer.run(read_records(open_binary(upload, upload.name), fmt))
+    except Exception:
+        # Recorded on the import; the client can retry with resume=<id>
+        pass
+    return JsonResponse(task_import_payload(task_import), status=200 if task_import.status == 'COMPLETED' else 500)
+
+
+@require_POST
+async def import_tasks_view(request, org_slug):
+    """
+    ``POST /import/<org_slug>/tasks/`` with a multipart ``file`` (CSV or
+    NDJSON, optionally .gz) and optional ``format``, ``project`` and
+    ``resume`` fields. Any member may import; the response is the import's
+    progress once it has finished or failed.
+    """
+    # Uploads are spooled to disk by Django and read back as a stream, off the event loop
+    run = database_sync_to_async(_import_upload, thread_sensitive=False)
+    return await run(request, org_slug)
+
+
+def _task_import_status(request, org_slug, import_id):
+    membership = _membership(request, org_slug)
+    if membership is None:
+        return JsonResponse({'error': "You don't have access to this organization"}, status=403)
+    task_import = TaskImport.objects.filter(pk=import_id, organization=membership.organization).first()
+    if task_import is None:
+        return JsonResponse({'error': "Import not found"}, status=404)
+    return JsonResponse(task_import_payload(task_import))
+
+
+@require_GET
+async def task_import_status_view(request, org_slug, import_id):
+    """``GET /import/<org_slug>/tasks/<id>/``: progress of an import, e.g. while it runs"""
+    return await database_sync_to_async(_task_import_status)(request, org_slug, import_id)
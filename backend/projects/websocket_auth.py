@@ -1,81 +1,122 @@
 # websocket_auth.py
-from django.contrib.auth.models import AnonymousUser
+import hashlib
+import logging
+import time
+from urllib.parse import parse_qs
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from channels.db import database_sync_to_async
 from channels.middleware import BaseMiddleware
-import jwt
-from django.conf import settings
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.utils import get_payload, get_user_by_payload
+
+from core.caching import TTLCache
+
+logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
 
-try:
-    from graphql_jwt.shortcuts import get_user_by_token
-    from graphql_jwt.settings import jwt_settings
-    GRAPHQL_JWT_AVAILABLE = True
-except ImportError:
-    GRAPHQL_JWT_AVAILABLE = False
+class TokenPrincipal:
+    """
+    The parts of a user that the consumers need, kept for verified tokens so
+    a reconnect does not have to load the user again.
+    """
+
+    __slots__ = ('id', 'email', 'name', 'is_active')
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, email, name, is_active=True):
+        self.id = id
+        self.email = email
+        self.name = name
+        self.is_active = is_active
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return self.email
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.email, user.name, user.is_active)
+
+
+_cache_settings = getattr(settings, 'WEBSOCKET_TOKEN_CACHE', {})
+token_cache = TTLCache(
+    maxsize=_cache_settings.get('MAXSIZE', 10000),
+    ttl=_cache_settings.get('TTL', 60),
+)
+
+
+def _cache_key(token):
+    # Don't keep raw bearer tokens around in process memory
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _strip_prefix(token):
+    return token[4:] if token.startswith('JWT ') else token
 
-User = get_user_model()
 
 @database_sync_to_async
-def get_user_from_jwt(token):
-    """Decode JWT token and get user using graphql-jwt"""
+def verify_token(token):
+    """
+    Decode ``token`` and load its user. Returns ``(principal, exp)`` or
+    ``(None, None)`` if the token is invalid, expired or the user is gone.
+    """
     try:
+        payload = get_payload(token)
+        user = get_user_by_payload(payload)
+    except JSONWebTokenError as e:
+        logger.info(f"Rejected WebSocket token: {e}")
+        return None, None
+    if user is None:
+        return None, None
+    return TokenPrincipal.from_user(user), payload.get('exp')
 
-        
-        if token.startswith('JWT '):
-            token = token[4:]
 
-        
-        if GRAPHQL_JWT_AVAILABLE:
+async def get_user_from_jwt(token):
+    """Return the principal for ``token``, verifying it only on a cache miss"""
+    token = _strip_prefix(token)
+    key = _cache_key(token)
 
-            user = get_user_by_token(token)
+    principal = token_cache.get(key)
+    if principal is not None:
+        return principal
 
-            return user
-        else:
-            print("graphql_jwt not available, using manual decode")
-            # Fallback to manual decoding
-            # Try to get JWT settings from graphql_jwt if available
-            secret = getattr(settings, 'GRAPHQL_JWT', {}).get('JWT_SECRET_KEY', settings.SECRET_KEY)
-            algorithm = getattr(settings, 'GRAPHQL_JWT', {}).get('JWT_ALGORITHM', 'HS256')
-            
-            payload = jwt.decode(
-                token,
-                secret,
-                algorithms=[algorithm]
-            )
-           
-            
-            # Get user by email or user_id from payload
-            email = payload.get('email')
-            user_id = payload.get('user_id')
-            username = payload.get('username')
-            
-            print(f"Email: {email}, User ID: {user_id}, Username: {username}")
-            
-            if user_id:
-                user = User.objects.get(id=user_id)
-            elif email:
-                user = User.objects.get(email=email)
-            elif username:
-                user = User.objects.get(username=username)
-            else:
-                print("No user identifier found in payload")
-                return AnonymousUser()
-                
-            
-            return user
-            
-    except Exception as e:
-        print(f"JWT decode error: {type(e).__name__}: {e}")
-        import traceback
-        traceback.print_exc()
-    
-    print("Returning AnonymousUser")
-    return AnonymousUser()
+    principal, exp = await verify_token(token)
+    if principal is None:
+        # Failures aren't cached: random tokens would only push out good ones
+        return AnonymousUser()
+
+    ttl = token_cache.ttl
+    if exp is not None:
+        ttl = min(ttl, exp - time.time())
+    if ttl > 0:
+        token_cache.set(key, principal, ttl=ttl)
+    return principal
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    # A deactivated user's tokens stop working in this process at once;
+    # other processes pick it up when their entries expire
+    if not instance.is_active:
+        token_cache.delete_where(lambda key, principal: principal.id == instance.id)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    token_cache.delete_where(lambda key, principal: principal.id == instance.id)
 
-from urllib.parse import parse_qs
 
 class JWTAuthMiddleware(BaseMiddleware):
     async def __call__(self, scope, receive, send):
@@ -101,4 +142,4 @@ class JWTAuthMiddleware(BaseMiddleware):
 
 def JWTAuthMiddlewareStack(inner):
     """Convenience function to create the middleware stack"""
-    return JWTAuthMiddleware(inner)
\ No newline at end of file
+    return JWTAuthMiddleware(inner)
@@ -0,0 +1,72 @@
+from collections import namedtuple
+
+from django.conf import settings
+
+from core.caching import TTLCache
+from .models import OrganizationMember
+
+# What a resolver needs to know after an access check
+Membership = namedtuple('Membership', ['organization', 'role'])
+
+_MISSING = object()
+
+_cache_settings = getattr(settings, 'ORG_MEMBERSHIP_CACHE', {})
+membership_cache = TTLCache(
+    maxsize=_cache_settings.get('MAXSIZE', 10000),
+    ttl=_cache_settings.get('TTL', 30),
+)
+
+
+def get_membership(user, org_slug, request=None):
+    """
+    Resolve ``(user, org_slug)`` to a ``Membership`` or ``None``.
+
+    Lookups are memoized on ``request`` for the rest of the GraphQL document
+    and in a short-lived process-wide LRU shared by HTTP and WebSocket
+    handlers. Membership and organization changes invalidate the shared
+    entries (see ``users.signals``); other processes converge within the TTL.
+    """
+    if user is None or not user.is_authenticated:
+        return None
+
+    key = (user.pk, org_slug)
+    memo = None
+    if request is not None:
+        memo = request.__dict__.setdefault('_org_memberships', {})
+        if key in memo:
+            return memo[key]
+
+    membership = membership_cache.get(key, _MISSING)
+    if membership is _MISSING:
+        member = (
+            OrganizationMember.objects
+            .select_related('organization')
+            .filter(user_id=user.pk, organization__slug=org_slug)
+            .first()
+        )
+        membership = Membership(member.organization, member.role) if member else None
+        membership_cache.set(key, membership)
+
+    if memo is not None:
+        memo[key] = membership
+    return membership
+
+
+def require_membership(info, org_slug):
+    """Query-side access check: return the membership or raise"""
+    membership = get_membership(info.context.user, org_slug, info.context)
+    if membership is None:
+        raise Exception("You don't have access to this organization")
+    return membership
+
+
+def invalidate_user(user_id):
+    membership_cache.delete_where(lambda key, membership: key[0] == user_id)
+
+
+def invalidate_organization(organization):
+    # Match on id as well so entries cached under a renamed slug go too
+    membership_cache.delete_where(
+        lambda key, membership: key[1] == organization.slug
+        or (membership is not None and membership.organization.pk == organization.pk)
+    )
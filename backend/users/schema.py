@@ -3,6 +3,7 @@ import graphene
 from graphene_django import DjangoObjectType
 from graphql_jwt.decorators import login_required
 from .models import User, OrganizationMember
+from .authorization import require_membership
 from organizations.models import Organization
 
 class UserType(DjangoObjectType):
@@ -119,17 +120,15 @@ class Query(graphene.ObjectType):
     def resolve_my_organizations(self, info):  
         user = info.context.user
         return [member.organization for member in 
-                OrganizationMember.objects.filter(user=user)]
+                OrganizationMember.objects.filter(user=user).select_related('organization')]
     
     # ADD THIS RESOLVER
     @login_required
     def resolve_organization_members(self, info, org_slug):
-        user = info.context.user
         # Check if user has access to this organization
-        if not OrganizationMember.objects.filter(user=user, organization__slug=org_slug).exists():
-            raise Exception("You don't have access to this organization")
+        organization = require_membership(info, org_slug).organization
         
-        return OrganizationMember.objects.filter(organization__slug=org_slug).select_related('user')
+        return OrganizationMember.objects.filter(organization=organization).select_related('user')
 
 class Mutation(graphene.ObjectType):
     register_user = RegisterUser.Field()
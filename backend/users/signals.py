@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.result_cache import bump_org_version
+from organizations.models import Organization
+from .authorization import invalidate_organization, invalidate_user
+from .models import OrganizationMember
+
+
+@receiver([post_save, post_delete], sender=OrganizationMember)
+def membership_changed(sender, instance, **kwargs):
+    # Dropping every entry of the user avoids loading the organization here,
+    # which may already be gone when the delete cascades from it
+    invalidate_user(instance.user_id)
+    bump_org_version(instance.organization_id)
+
+
+@receiver([post_save, post_delete], sender=Organization)
+def organization_changed(sender, instance, **kwargs):
+    invalidate_organization(instance)
+    bump_org_version(instance.pk)
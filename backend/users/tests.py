@@ -1,3 +1,56 @@
-from django.test import TestCase
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, TestCase
 
-# Create your tests here.
+from organizations.models import Organization
+from .authorization import get_membership, membership_cache
+from .models import OrganizationMember, User
+
+
+class MembershipCacheTests(TestCase):
+    def setUp(self):
+        membership_cache.clear()
+        self.organization = Organization.objects.create(name='Acme', slug='acme', contact_email='acme@example.com')
+        self.user = User.objects.create_user(email='member@example.com', password='secret', name='Member')
+        self.member = OrganizationMember.objects.create(user=self.user, organization=self.organization, role='MEMBER')
+
+    def tearDown(self):
+        membership_cache.clear()
+
+    def test_lookup_is_shared_between_requests(self):
+        with self.assertNumQueries(1):
+            membership = get_membership(self.user, 'acme', RequestFactory().get('/'))
+        self.assertEqual((membership.organization, membership.role), (self.organization, 'MEMBER'))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_membership(self.user, 'acme', RequestFactory().get('/')), membership)
+
+    def test_request_memo(self):
+        request = RequestFactory().get('/')
+        get_membership(self.user, 'acme', request)
+        membership_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_membership(self.user, 'acme', request).role, 'MEMBER')
+
+    def test_non_members_are_cached_too(self):
+        self.assertIsNone(get_membership(self.user, 'globex'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_membership(self.user, 'globex'))
+        self.assertIsNone(get_membership(AnonymousUser(), 'acme'))
+
+    def test_membership_changes_invalidate(self):
+        get_membership(self.user, 'acme')
+        self.member.role = 'ADMIN'
+        self.member.save()
+        self.assertEqual(get_membership(self.user, 'acme').role, 'ADMIN')
+
+        self.member.delete()
+        self.assertIsNone(get_membership(self.user, 'acme'))
+
+        OrganizationMember.objects.create(user=self.user, organization=self.organization)
+        self.assertEqual(get_membership(self.user, 'acme').role, 'MEMBER')
+
+    def test_renamed_organization_invalidates(self):
+        get_membership(self.user, 'acme')
+        self.organization.slug = 'acme-corp'
+        self.organization.save()
+        self.assertIsNone(get_membership(self.user, 'acme'))
+        self.assertEqual(get_membership(self.user, 'acme-corp').organization.slug, 'acme-corp')
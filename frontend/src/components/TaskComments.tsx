@@ -47,10 +47,19 @@ const TaskComments: React.FC<TaskCommentsProps> = ({ orgSlug, taskId }) => {
     });
   }, []);
 
+  // Lets a reconnecting socket ask only for comments newer than what is on screen
+  const commentsRef = useRef<TaskComment[]>([]);
+  commentsRef.current = comments;
+  const getLastCommentId = useCallback(() => {
+    const last = commentsRef.current[commentsRef.current.length - 1];
+    return last?.id;
+  }, []);
+
   const { isConnected, error: wsError, sendMessage } = useWebSocket({
     orgSlug,
     taskId,
-    onNewComment: handleNewComment
+    onNewComment: handleNewComment,
+    getLastCommentId
   });
 
   const handleSubmitComment = async (e: React.FormEvent) => {
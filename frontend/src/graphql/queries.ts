@@ -70,6 +70,43 @@ export const GET_PROJECT = gql`
   }
 `;
 
+export const GET_ORG_DASHBOARD = gql`
+  query GetOrgDashboard($orgSlug: String!) {
+    orgDashboard(orgSlug: $orgSlug) {
+      generatedAt
+      totals {
+        todo
+        inProgress
+        done
+        total
+        overdue
+        dueThisWeek
+      }
+      projects {
+        slug
+        name
+        status
+        todo
+        inProgress
+        done
+        total
+        overdue
+        dueThisWeek
+      }
+      assignees {
+        email
+        name
+        todo
+        inProgress
+        done
+        total
+        overdue
+        dueThisWeek
+      }
+    }
+  }
+`;
+
 //  task-related queries
 export const GET_TASKS = gql`
   query GetTasks($orgSlug: String!, $projectSlug: String!) {
@@ -259,6 +296,7 @@ export const GET_TASK_COMMENTS = gql`
   query GetTaskComments($orgSlug: String!, $taskId: String!) {
     taskComments(orgSlug: $orgSlug, taskId: $taskId) {
       id
+      seq
       content
       author {
         id
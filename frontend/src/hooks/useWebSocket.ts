@@ -5,9 +5,31 @@ interface UseWebSocketProps {
   orgSlug: string;
   taskId: string;
   onNewComment: (comment: TaskComment) => void;
+  // Id of the newest comment already shown; the server replays anything after it
+  getLastCommentId?: () => string | undefined;
 }
 
-export const useWebSocket = ({ orgSlug, taskId, onNewComment }: UseWebSocketProps) => {
+interface CommentFrame {
+  id: string;
+  seq: number;
+  content: string;
+  author: { id: string; email: string };
+  timestamp: string;
+}
+
+const toComment = (data: CommentFrame): TaskComment => ({
+  id: data.id,
+  seq: data.seq,
+  content: data.content,
+  author: {
+    id: data.author.id,
+    name: data.author.email.split('@')[0],
+    email: data.author.email
+  },
+  timestamp: data.timestamp
+});
+
+export const useWebSocket = ({ orgSlug, taskId, onNewComment, getLastCommentId }: UseWebSocketProps) => {
   const [isConnected, setIsConnected] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const ws = useRef<WebSocket | null>(null);
@@ -18,6 +40,10 @@ export const useWebSocket = ({ orgSlug, taskId, onNewComment }: UseWebSocketProp
   // Store the callback in a ref to avoid dependency changes
   const onNewCommentRef = useRef(onNewComment);
   onNewCommentRef.current = onNewComment;
+  const getLastCommentIdRef = useRef(getLastCommentId);
+  getLastCommentIdRef.current = getLastCommentId;
+  // Highest comment seq received, used to spot gaps in the live stream
+  const lastSeq = useRef<number | null>(null);
 
   const disconnect = useCallback(() => {
     if (reconnectTimeout.current) {
@@ -52,7 +78,10 @@ export const useWebSocket = ({ orgSlug, taskId, onNewComment }: UseWebSocketProp
     }
 
     const token = rawToken.startsWith('JWT ') ? rawToken.slice(4) : rawToken;
-    const wsUrl = `ws://localhost:8000/ws/tasks/${orgSlug}/${taskId}/comments/?token=${token}`;
+    const since = getLastCommentIdRef.current?.();
+    const sinceParam = since ? `&since=${since}` : '';
+    const wsUrl = `ws://localhost:8000/ws/tasks/${orgSlug}/${taskId}/comments/?token=${token}${sinceParam}`;
+    lastSeq.current = null;
 
     try {
       ws.current = new WebSocket(wsUrl);
@@ -83,18 +112,28 @@ export const useWebSocket = ({ orgSlug, taskId, onNewComment }: UseWebSocketProp
             return;
           }
           
+          // Backlog missed while disconnected, sent in chunks before live events
+          if (data.type === 'replay') {
+            data.comments.forEach((frame: CommentFrame) => {
+              lastSeq.current = frame.seq;
+              onNewCommentRef.current(toComment(frame));
+            });
+            return;
+          }
+
+          if (data.type === 'replay_complete') {
+            lastSeq.current = data.last_seq;
+            return;
+          }
+
           if (data.content && data.author) {
-            const comment: TaskComment = {
-              id: data.id,
-              content: data.content,
-              author: {
-                id: data.author.id,
-                name: data.author.email.split('@')[0],
-                email: data.author.email
-              },
-              timestamp: data.timestamp
-            };
-            onNewCommentRef.current(comment);
+            if (lastSeq.current !== null && data.seq > lastSeq.current + 1) {
+              // Missed at least one event: reconnect and let the server replay the gap
+              ws.current?.close(4000, 'Sequence gap');
+              return;
+            }
+            lastSeq.current = data.seq;
+            onNewCommentRef.current(toComment(data));
           }
         } catch (err) {
           console.error('WebSocket message parse error:', err);
@@ -2,6 +2,7 @@
 import { ApolloClient, InMemoryCache, createHttpLink, from } from '@apollo/client';
 import { setContext } from '@apollo/client/link/context';
 import { onError } from '@apollo/client/link/error';
+import { createPersistedQueryLink } from '@apollo/client/link/persisted-queries';
 
 const httpLink = createHttpLink({
   uri: 'http://localhost:8000/graphql/',
@@ -17,6 +18,16 @@ const authLink = setContext((_, { headers }) => {
   };
 });
 
+// Send only the query hash; the server asks for the full text if it hasn't seen it
+const sha256 = async (query: string) => {
+  const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(query));
+  return Array.from(new Uint8Array(digest))
+    .map((byte) => byte.toString(16).padStart(2, '0'))
+    .join('');
+};
+
+const persistedQueryLink = createPersistedQueryLink({ sha256 });
+
 const errorLink = onError(({ graphQLErrors, networkError }) => {
   if (graphQLErrors)
     graphQLErrors.forEach(({ message, locations, path }) =>
@@ -26,7 +37,7 @@ const errorLink = onError(({ graphQLErrors, networkError }) => {
 });
 
 export const client = new ApolloClient({
-  link: from([errorLink, authLink, httpLink]),
+  link: from([errorLink, authLink, persistedQueryLink, httpLink]),
   cache: new InMemoryCache(),
   defaultOptions: {
     watchQuery: {
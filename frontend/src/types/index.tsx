@@ -43,6 +43,7 @@ export interface Task {
 
 export interface TaskComment {
   id: string;
+  seq?: number;
   content: string;
   author: {
     id: string;